@@ -35,9 +35,29 @@ else:
 
 
 
+import importlib
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import planner, forecast, recommend, geocoding
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .utils.http_client import upstream_clients
+from .utils.route_cache import route_cache
+from .utils.metrics import RequestMetricsMiddleware, registry
+from .utils.warmup import warmup
+from .utils.prefetcher import prefetcher
+
+# Route groups: name -> (module in app.routes, URL prefix). API_ROUTERS picks the
+# groups a worker serves, e.g. API_ROUTERS=geocoding for a light geocoding-only worker;
+# unset or empty serves them all.
+ROUTERS = {
+    "route": ("planner", "/route"),
+    "weather": ("forecast", "/weather"),
+    "recommendation": ("recommend", "/recommendation"),
+    "geocoding": ("geocoding", "/geocoding")
+}
+ENABLED_ROUTERS = [name.strip() for name in os.getenv("API_ROUTERS", "").split(",") if name.strip()] or list(ROUTERS)
+for _name in ENABLED_ROUTERS:
+    if _name not in ROUTERS:
+        raise ValueError(f"Unknown router '{_name}' in API_ROUTERS. Choose from: {', '.join(ROUTERS)}")
 
 app = FastAPI(title="PathPredict API", version="1.0.0")
 
@@ -47,12 +67,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "ETag", "X-Cache"],
 )
+# Outermost, so request latency includes CORS handling and every response carries X-Request-ID
+app.add_middleware(RequestMetricsMiddleware)
+
+for _name in ENABLED_ROUTERS:
+    _module, _prefix = ROUTERS[_name]
+    app.include_router(importlib.import_module(f".routes.{_module}", __package__).router, prefix=_prefix, tags=[_name])
+
+@app.on_event("startup")
+async def startup():
+    await upstream_clients.start()
+    warmup.start()
+    prefetcher.start()
 
-app.include_router(planner.router, prefix="/route", tags=["route"])
-app.include_router(forecast.router, prefix="/weather", tags=["weather"])
-app.include_router(recommend.router, prefix="/recommendation", tags=["recommendation"])
-app.include_router(geocoding.router, prefix="/geocoding", tags=["geocoding"])
+@app.on_event("shutdown")
+async def shutdown():
+    await warmup.stop()
+    await prefetcher.stop()
+    await upstream_clients.close()
+    route_cache.close()
+    # Imported here so geocoding-only workers never load the ML stack
+    from .ml.prediction_pool import prediction_pool
+    prediction_pool.shutdown()
 
 @app.get("/")
 async def root():
@@ -68,4 +106,20 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 until startup (and the WARMUP=1 warmup, if enabled) has finished"""
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/upstreams")
+async def upstreams():
+    """Circuit breaker state, adaptive timeout and recent latency of each upstream API"""
+    return upstream_clients.status()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of request, stage, upstream and cache metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from ..utils.metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+Cell = Tuple[float, float]
+
+
+class ProphetModelCache:
+    """
+    Cache of fitted Prophet models, stored serialized (model_to_json).
+
+    Entries are keyed on (grid cell, metric, hash of the input series), so a
+    repeat prediction for the same cell and forecast run skips model.fit.
+    The most recent fit per (cell, metric) is also remembered so the next
+    forecast run can warm-start from its parameters. Fits run in pool worker
+    processes, each with its own cache; with a disk_dir the models and the
+    latest-fit index are shared between them through files. The directory is
+    an LRU too: a disk hit refreshes the file's mtime, and at startup and
+    every few minutes of writes the least recently used files are deleted
+    until it fits disk_max_bytes.
+    """
+
+    COUNTERS = ("hits", "disk_hits", "misses", "warm_starts", "evictions", "disk_evictions", "errors")
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 256 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, disk_max_bytes: int = 1024 * 1024 * 1024,
+                 sweep_interval: float = 300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._size_bytes = 0
+        # (cell, metric) -> (first timestamp, series length, key) of the latest fit
+        self._latest: Dict[Tuple[Cell, str], Tuple[str, int, str]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.warm_starts = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.errors = 0
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._sweep_disk(time.time())
+
+    @classmethod
+    def from_env(cls) -> "ProphetModelCache":
+        """Build a cache from PROPHET_CACHE_* environment variables"""
+        return cls(
+            max_entries=int(os.getenv("PROPHET_CACHE_MAX_ENTRIES", "2048")),
+            max_bytes=int(float(os.getenv("PROPHET_CACHE_MAX_MB", "256")) * 1024 * 1024),
+            disk_dir=os.getenv("PROPHET_CACHE_DIR") or None,
+            disk_max_bytes=int(float(os.getenv("PROPHET_CACHE_DISK_MAX_MB", "1024")) * 1024 * 1024)
+        )
+
+    @staticmethod
+    def series_hash(times: List[str], values: List[float]) -> str:
+        """Stable hash of an input series"""
+        encoded = json.dumps([times, values], separators=(",", ":")).encode("utf-8")
+        return hashlib.sha1(encoded).hexdigest()
+
+    @staticmethod
+    def key_for(cell: Cell, metric: str, series_hash: str) -> str:
+        return f"{cell[0]:.4f}_{cell[1]:.4f}_{metric}_{series_hash}"
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a serialized model, checking memory then disk"""
+        with self._lock:
+            serialized = self._entries.get(key)
+            if serialized is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return serialized
+
+        serialized = self._read_disk(key)
+        if serialized is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._store(key, serialized)
+            return serialized
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, serialized: str, cell: Cell, metric: str, first_time: str, length: int) -> None:
+        """Store a serialized model and record it as the latest fit for its cell and metric"""
+        self._store(key, serialized)
+        with self._lock:
+            self._latest[(cell, metric)] = (first_time, length, key)
+        if self.disk_dir:
+            self._write_disk(key, serialized)
+            self._write_disk(self.latest_key(cell, metric), json.dumps([first_time, length, key]))
+
+    @staticmethod
+    def latest_key(cell: Cell, metric: str) -> str:
+        return f"latest_{cell[0]:.4f}_{cell[1]:.4f}_{metric}"
+
+    def previous_run(self, cell: Cell, metric: str) -> Optional[Tuple[str, int, str]]:
+        """
+        (first timestamp, series length, key) of the latest fit for a cell and
+        metric, by any worker when the index is on disk
+        """
+        encoded = self._read_disk(self.latest_key(cell, metric))
+        if encoded is not None:
+            try:
+                first_time, length, key = json.loads(encoded)
+                return first_time, int(length), key
+            except (ValueError, TypeError) as e:
+                self._error("Prophet model cache index read error: %r", e)
+        with self._lock:
+            return self._latest.get((cell, metric))
+
+    def record_warm_start(self) -> None:
+        with self._lock:
+            self.warm_starts += 1
+
+    def counters(self) -> Dict[str, int]:
+        """Current hit/miss counters, for a worker to report what one task added"""
+        with self._lock:
+            return {name: getattr(self, name) for name in self.COUNTERS}
+
+    def add_counters(self, counts: Dict[str, int]) -> None:
+        """Add counters reported by a pool worker, so stats() covers fits in every process"""
+        with self._lock:
+            for name, count in counts.items():
+                if name in self.COUNTERS:
+                    setattr(self, name, getattr(self, name) + count)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters (including those reported by pool workers) and this process's occupancy"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "warm_starts": self.warm_starts,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "errors": self.errors,
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes
+            }
+
+    def _store(self, key: str, serialized: str) -> None:
+        size = len(serialized)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size_bytes -= len(previous)
+            self._entries[key] = serialized
+            self._size_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._size_bytes -= len(evicted)
+                self.evictions += 1
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        path = self.disk_dir / f"{key}.json"
+        try:
+            serialized = path.read_text(encoding="utf-8")
+            # Mark it recently used for the sweep
+            os.utime(path)
+            return serialized
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self._error("Prophet model cache disk read error: %r", e)
+            return None
+
+    def _write_disk(self, key: str, serialized: str) -> None:
+        path = self.disk_dir / f"{key}.json"
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(serialized, encoding="utf-8")
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self._error("Prophet model cache disk write error: %r", e)
+            return
+        now = time.time()
+        if now >= self._next_sweep:
+            self._sweep_disk(now)
+
+    def _error(self, message: str, error: Exception) -> None:
+        with self._lock:
+            self.errors += 1
+        logger.warning(message, error)
+
+    def _sweep_disk(self, now: float) -> None:
+        """Delete the least recently used files while the directory is over disk_max_bytes"""
+        self._next_sweep = now + self.sweep_interval
+        files = []
+        removed = 0
+        try:
+            for path in self.disk_dir.iterdir():
+                try:
+                    info = path.stat()
+                except FileNotFoundError:
+                    continue
+                if path.suffix == ".tmp" and now - info.st_mtime > 3600:
+                    # Left behind by a worker that died mid-write
+                    path.unlink(missing_ok=True)
+                elif path.suffix == ".json":
+                    files.append((info.st_mtime, info.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files, key=lambda item: item[0]):
+                if total <= self.disk_max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+        except Exception as e:
+            self._error("Prophet model cache disk sweep error: %r", e)
+        with self._lock:
+            self.disk_evictions += removed
+
+
+model_cache = ProphetModelCache.from_env()
+
+register_cache("prophet_model", model_cache.stats)
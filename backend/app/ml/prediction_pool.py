@@ -0,0 +1,209 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from ..utils.metrics import PROPHET_FALLBACKS
+from .model_cache import model_cache
+
+logger = logging.getLogger(__name__)
+
+# (hourly_data, target_time, metric, location)
+MetricTask = Tuple[Dict, datetime, str, Optional[Tuple[float, float]]]
+
+
+def _warm_worker() -> None:
+    """Worker initializer: load Prophet/Stan once per process instead of per task"""
+    from . import prophet_model  # noqa: F401
+
+
+def _predict_metric(task: MetricTask) -> Tuple[Optional[float], Dict[str, float], Dict[str, int]]:
+    """
+    Run a single Prophet metric prediction inside a worker process
+    Returns the value, the fallbacks it caused and the model cache counters it
+    moved, which the parent adds to its own metrics
+    """
+    from .prophet_model import WeatherPredictor
+
+    before = {labels["reason"]: value for _, labels, value in PROPHET_FALLBACKS.samples()}
+    cache_before = model_cache.counters()
+    hourly_data, target_time, metric, location = task
+    value = WeatherPredictor.predict_weather_with_prophet(hourly_data, target_time, metric, location)
+    fallbacks = {
+        labels["reason"]: count - before.get(labels["reason"], 0)
+        for _, labels, count in PROPHET_FALLBACKS.samples()
+        if count > before.get(labels["reason"], 0)
+    }
+    cache_counts = {name: count - cache_before[name] for name, count in model_cache.counters().items()}
+    return (None if value is None else float(value)), fallbacks, cache_counts
+
+
+def _warm_fit() -> None:
+    """Warmup task: one tiny fit so the worker has Stan loaded before real tasks arrive"""
+    from .prophet_model import WeatherPredictor
+
+    WeatherPredictor.warm_up()
+
+
+class PredictionPool:
+    """
+    Managed process pool for CPU-bound Prophet fits.
+
+    Keeps model fitting off the event loop and spreads the segment/metric fits
+    of a request across cores. At most max_pending tasks are queued or running
+    at once; a task that does not finish within task_timeout falls back to the
+    raw hourly forecast value. A fit that has already started cannot be
+    stopped, so it keeps its slot until the worker finishes it. If a worker
+    dies (e.g. killed for memory), the broken pool is shut down and the next
+    task starts a fresh one.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 task_timeout: float = 20):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.task_timeout = task_timeout
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+        self.completed = 0
+        self.fallbacks = 0
+        self.restarts = 0
+        # Timed-out fits still running in a worker, each holding a slot
+        self.orphaned = 0
+
+    @classmethod
+    def from_env(cls) -> "PredictionPool":
+        """Build a pool from PROPHET_POOL_* environment variables"""
+        workers = os.getenv("PROPHET_POOL_WORKERS")
+        max_pending = os.getenv("PROPHET_POOL_MAX_PENDING")
+        return cls(
+            workers=int(workers) if workers else None,
+            max_pending=int(max_pending) if max_pending else None,
+            task_timeout=float(os.getenv("PROPHET_TASK_TIMEOUT", "20"))
+        )
+
+    def _ensure_started(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn rather than fork: the parent runs threads (uvicorn, HTTP clients)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker
+                )
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_pending)
+            return self._executor
+
+    async def warm(self) -> None:
+        """Start every worker and run one small fit in each (startup warmup)"""
+        executor = self._ensure_started()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(executor, _warm_fit) for _ in range(self.workers)))
+
+    async def predict_metrics(self, tasks: List[MetricTask]) -> List[Optional[float]]:
+        """Fan all metric predictions of a request out across the pool"""
+        if not tasks:
+            return []
+        executor = self._ensure_started()
+        return await asyncio.gather(*(self._run(executor, task) for task in tasks))
+
+    async def _run(self, executor: ProcessPoolExecutor, task: MetricTask) -> Optional[float]:
+        loop = asyncio.get_running_loop()
+        try:
+            await self._semaphore.acquire()
+            future = self._submit(loop, executor, task)
+            try:
+                # Timing out cancels the task if it is still queued
+                value, fallbacks, cache_counts = await asyncio.wait_for(
+                    asyncio.wrap_future(future), timeout=self.task_timeout
+                )
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                if not future.done():
+                    # Already running: the fit goes on, holding its slot until it finishes
+                    self.orphaned += 1
+                    future.add_done_callback(lambda _: self._call_soon(loop, self._orphan_done))
+                raise
+            for reason, count in fallbacks.items():
+                PROPHET_FALLBACKS.inc(count, reason=reason)
+            model_cache.add_counters(cache_counts)
+            self.completed += 1
+            return value
+        except Exception as e:
+            hourly_data, target_time, metric, _ = task
+            logger.warning("Prophet task for %s fell back to hourly forecast: %r", metric, e)
+            self.fallbacks += 1
+            if isinstance(e, BrokenProcessPool):
+                self._discard(executor)
+                reason = "pool_broken"
+            elif isinstance(e, asyncio.TimeoutError):
+                reason = "timeout"
+            else:
+                reason = "pool_error"
+            PROPHET_FALLBACKS.inc(reason=reason)
+            from .prophet_model import WeatherPredictor
+            return WeatherPredictor.raw_value(hourly_data, target_time, metric)
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """Shut down a broken executor so _ensure_started spawns a new one (once, however many tasks saw it)"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, loop: asyncio.AbstractEventLoop, executor: ProcessPoolExecutor,
+                task: MetricTask) -> concurrent.futures.Future:
+        """Submit a task holding an acquired slot, which is released when the worker is done with it"""
+        semaphore = self._semaphore
+        try:
+            future = executor.submit(_predict_metric, task)
+        except Exception:
+            semaphore.release()
+            raise
+
+        future.add_done_callback(lambda _: self._call_soon(loop, semaphore.release))
+        return future
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback) -> None:
+        """Run callback on the event loop from a worker-result thread"""
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            # The loop has closed (shutdown); nothing waits on it any more
+            pass
+
+    def _orphan_done(self) -> None:
+        self.orphaned -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "started": self._executor is not None,
+            "completed": self.completed,
+            "fallbacks": self.fallbacks,
+            "restarts": self.restarts,
+            "orphaned": self.orphaned
+        }
+
+    def shutdown(self) -> None:
+        """Stop worker processes (called at app shutdown)"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self._semaphore = None
+
+
+prediction_pool = PredictionPool.from_env()
@@ -0,0 +1,188 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+import os
+import numpy as np
+
+# Response field names -> Open-Meteo hourly variable names
+CONTINUOUS_METRICS = {
+    "temperature": "temperature_2m",
+    "precipitation": "precipitation",
+    "windspeed": "windspeed_10m"
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class InterpolationPredictor:
+    """
+    Fast default backend: linear interpolation of the hourly forecast at each
+    target time, plus an optional additive bias correction per metric.
+    All segments and metrics are evaluated in one array operation.
+    """
+    name = "interpolation"
+
+    def __init__(self, bias: Optional[Dict[str, float]] = None):
+        self.bias = {metric: 0.0 for metric in CONTINUOUS_METRICS}
+        self.bias.update(bias or {})
+
+    @classmethod
+    def from_env(cls) -> "InterpolationPredictor":
+        """Read PREDICTOR_BIAS_<METRIC> corrections from the environment"""
+        return cls({
+            metric: float(os.getenv(f"PREDICTOR_BIAS_{metric.upper()}", "0"))
+            for metric in CONTINUOUS_METRICS
+        })
+
+    def predict_batch(self, weather_batch: List[Optional[Dict]], target_times: List[datetime]) -> List[Optional[Dict]]:
+        """
+        Predict conditions for many locations at once
+        weather_batch: One Open-Meteo payload per location
+        target_times: Arrival time at each location
+        Returns one prediction per location (None where the payload has no hourly data)
+        """
+        count = len(weather_batch)
+        usable = [
+            i for i, weather_data in enumerate(weather_batch)
+            if weather_data and weather_data.get("hourly", {}).get("time")
+        ]
+        results: List[Optional[Dict]] = [None] * count
+        if not usable:
+            return results
+
+        hours = max(len(weather_batch[i]["hourly"]["time"]) for i in usable)
+        rows = len(usable)
+
+        # (rows x hours) time axis and (metrics x rows x hours) values, NaN padded
+        hour_minutes = np.full((rows, hours), np.iinfo(np.int64).max, dtype=np.int64)
+        values = np.full((len(CONTINUOUS_METRICS) + 1, rows, hours), np.nan)
+        lengths = np.zeros(rows, dtype=np.int64)
+        targets = np.empty(rows, dtype=float)
+
+        for row, i in enumerate(usable):
+            hourly = weather_batch[i]["hourly"]
+            times = hourly["time"]
+            lengths[row] = len(times)
+            hour_minutes[row, :len(times)] = np.array(times, dtype="datetime64[m]").astype(np.int64)
+            for m, hourly_key in enumerate(list(CONTINUOUS_METRICS.values()) + ["weathercode"]):
+                series = np.array(hourly.get(hourly_key, []), dtype=float)[:len(times)]
+                values[m, row, :len(series)] = series
+            # Open-Meteo hours are wall-clock times, so compare against the wall clock
+            targets[row] = (target_times[i].replace(tzinfo=None) - _EPOCH).total_seconds() / 60
+
+        # Bracketing hours for every target, clamped to the forecast horizon
+        lower = np.empty(rows, dtype=np.int64)
+        for row in range(rows):
+            lower[row] = np.searchsorted(hour_minutes[row, :lengths[row]], targets[row], side="right") - 1
+        lower = np.clip(lower, 0, lengths - 1)
+        upper = np.minimum(lower + 1, lengths - 1)
+
+        row_idx = np.arange(rows)
+        t0 = hour_minutes[row_idx, lower].astype(float)
+        t1 = hour_minutes[row_idx, upper].astype(float)
+        span = np.where(t1 > t0, t1 - t0, 1.0)
+        frac = np.clip((targets - t0) / span, 0.0, 1.0)
+
+        v0 = values[:, row_idx, lower]
+        v1 = values[:, row_idx, upper]
+        # Fall back to the bracketing neighbour when one side is missing
+        v0 = np.where(np.isnan(v0), v1, v0)
+        v1 = np.where(np.isnan(v1), v0, v1)
+        interpolated = v0 + (v1 - v0) * frac
+
+        bias = np.array([self.bias[metric] for metric in CONTINUOUS_METRICS])[:, None]
+        continuous = interpolated[:len(CONTINUOUS_METRICS)] + bias
+        # Precipitation and wind cannot be negative
+        continuous[1:] = np.maximum(continuous[1:], 0)
+        weathercodes = v0[len(CONTINUOUS_METRICS)]
+
+        for row, i in enumerate(usable):
+            temperature, precipitation, windspeed = continuous[:, row]
+            weathercode = weathercodes[row]
+            results[i] = {
+                "temperature": None if np.isnan(temperature) else round(float(temperature), 1),
+                "precipitation": 0.0 if np.isnan(precipitation) else round(float(precipitation), 2),
+                "windspeed": None if np.isnan(windspeed) else round(float(windspeed), 1),
+                "weathercode": 0 if np.isnan(weathercode) else int(weathercode),
+                "confidence": 0.8
+            }
+
+        return results
+
+    async def predict_batch_async(self, weather_batch: List[Optional[Dict]],
+                                  target_times: List[datetime]) -> List[Optional[Dict]]:
+        """Async variant of predict_batch (cheap enough to run inline)"""
+        return self.predict_batch(weather_batch, target_times)
+
+
+class ProphetPredictor:
+    """Opt-in model backend: fits Prophet per segment and metric (slow)"""
+    name = "prophet"
+
+    def predict_batch(self, weather_batch: List[Optional[Dict]], target_times: List[datetime]) -> List[Optional[Dict]]:
+        """Predict conditions for many locations, one Prophet fit per location and metric"""
+        # Imported lazily so the default backend never pays for loading Stan
+        from .prophet_model import WeatherPredictor
+
+        return [
+            WeatherPredictor.predict_weather(weather_data, target_time) if weather_data else None
+            for weather_data, target_time in zip(weather_batch, target_times)
+        ]
+
+    async def predict_batch_async(self, weather_batch: List[Optional[Dict]],
+                                  target_times: List[datetime]) -> List[Optional[Dict]]:
+        """Fan every segment/metric fit out across the prediction process pool"""
+        from .prediction_pool import prediction_pool
+        from .prophet_model import WeatherPredictor
+
+        usable = [
+            i for i, weather_data in enumerate(weather_batch)
+            if weather_data and "hourly" in weather_data
+        ]
+        tasks = [
+            (
+                weather_batch[i]["hourly"],
+                target_times[i],
+                hourly_key,
+                (weather_batch[i].get("latitude"), weather_batch[i].get("longitude"))
+            )
+            for i in usable
+            for hourly_key in CONTINUOUS_METRICS.values()
+        ]
+        values = await prediction_pool.predict_metrics(tasks)
+
+        results: List[Optional[Dict]] = [None] * len(weather_batch)
+        per_segment = len(CONTINUOUS_METRICS)
+        for n, i in enumerate(usable):
+            temperature, precipitation, windspeed = values[n * per_segment:(n + 1) * per_segment]
+            results[i] = WeatherPredictor.build_prediction(
+                weather_batch[i]["hourly"], temperature, precipitation, windspeed
+            )
+        return results
+
+
+PREDICTOR_BACKENDS = {
+    "interpolation": InterpolationPredictor.from_env,
+    "prophet": ProphetPredictor
+}
+
+# Friendlier names accepted in requests
+PREDICTOR_ALIASES = {
+    "fast": "interpolation",
+    "model": "prophet"
+}
+
+
+def get_predictor(name: Optional[str] = None):
+    """
+    Resolve a predictor backend by name
+    name: Backend or alias; defaults to PREDICTOR_BACKEND or interpolation
+    Raises ValueError for unknown backends
+    """
+    if not name:
+        name = os.getenv("PREDICTOR_BACKEND", "interpolation")
+    name = name.strip().lower()
+    name = PREDICTOR_ALIASES.get(name, name)
+    if name not in PREDICTOR_BACKENDS:
+        choices = ", ".join(sorted(list(PREDICTOR_BACKENDS) + list(PREDICTOR_ALIASES)))
+        raise ValueError(f"Unknown predictor '{name}'. Choose one of: {choices}")
+    return PREDICTOR_BACKENDS[name]()
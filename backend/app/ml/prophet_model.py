@@ -1,21 +1,27 @@
 from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 import logging
+from .model_cache import model_cache
+from ..utils.weather_cache import weather_cache
+from ..utils.metrics import PROPHET_FALLBACKS
 
 logging.getLogger('prophet').setLevel(logging.WARNING)
 logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
 
 class WeatherPredictor:
     @staticmethod
-    def predict_weather_with_prophet(hourly_data: Dict, target_time: datetime, metric: str) -> float:
+    def predict_weather_with_prophet(hourly_data: Dict, target_time: datetime, metric: str,
+                                     location: Optional[Tuple[float, float]] = None) -> float:
         """
         Use Prophet to predict a specific weather metric at target time
         hourly_data: Dictionary with 'time' and metric arrays from Open-Meteo
         target_time: When to predict
         metric: Which metric to predict (temperature_2m, precipitation, windspeed_10m)
+        location: (latitude, longitude) of the forecast; enables the fitted-model cache
         """
         try:
             if not hourly_data or metric not in hourly_data:
@@ -25,6 +31,7 @@ class WeatherPredictor:
             values = hourly_data.get(metric, [])
             
             if len(times) < 10 or len(values) < 10:
+                PROPHET_FALLBACKS.inc(reason="short_series")
                 return values[0] if values else None
             
             df = pd.DataFrame({
@@ -34,15 +41,13 @@ class WeatherPredictor:
             
             df = df.dropna()
             if len(df) < 10:
+                PROPHET_FALLBACKS.inc(reason="short_series")
                 return values[0] if values else None
             
-            model = Prophet(
-                daily_seasonality=True,
-                weekly_seasonality=False,
-                yearly_seasonality=False,
-                seasonality_mode='additive'
-            )
-            model.fit(df)
+            if location is not None and None not in location:
+                model = WeatherPredictor._fit_cached(df, times, values, metric, location)
+            else:
+                model = WeatherPredictor._new_model().fit(df)
             
             future = pd.DataFrame({'ds': [pd.to_datetime(target_time)]})
             forecast = model.predict(future)
@@ -55,11 +60,76 @@ class WeatherPredictor:
             
         except Exception as e:
             print(f"Prophet prediction error for {metric}: {e}")
+            PROPHET_FALLBACKS.inc(reason="fit_error")
             if hourly_data and metric in hourly_data:
                 values = hourly_data[metric]
                 return values[0] if values else None
             return None
     
+    @staticmethod
+    def warm_up() -> None:
+        """Fit and query a tiny model so Stan is loaded before the first real prediction"""
+        start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        df = pd.DataFrame({
+            'ds': pd.date_range(start, periods=48, freq='h'),
+            'y': [10 + 5 * np.sin(h / 24 * 2 * np.pi) for h in range(48)]
+        })
+        model = WeatherPredictor._new_model().fit(df)
+        model.predict(pd.DataFrame({'ds': [start + timedelta(hours=50)]}))
+    
+    @staticmethod
+    def _new_model() -> Prophet:
+        return Prophet(
+            daily_seasonality=True,
+            weekly_seasonality=False,
+            yearly_seasonality=False,
+            seasonality_mode='additive'
+        )
+    
+    @staticmethod
+    def _fit_cached(df: pd.DataFrame, times: List[str], values: List[float], metric: str,
+                    location: Tuple[float, float]) -> Prophet:
+        """
+        Return a fitted model for this cell, metric and series, reusing a cached fit
+        when the series is unchanged and warm-starting when it has shifted by an hour
+        """
+        cell = weather_cache.cell_for(location[0], location[1])
+        key = model_cache.key_for(cell, metric, model_cache.series_hash(times, values))
+        
+        serialized = model_cache.get(key)
+        if serialized is not None:
+            return model_from_json(serialized)
+        
+        init = None
+        previous = model_cache.previous_run(cell, metric)
+        if previous is not None:
+            previous_first, previous_length, previous_key = previous
+            shift = pd.to_datetime(times[0]) - pd.to_datetime(previous_first)
+            if shift == timedelta(hours=1) and previous_length == len(times):
+                previous_model = model_cache.get(previous_key)
+                if previous_model is not None:
+                    init = WeatherPredictor._warm_start_params(model_from_json(previous_model))
+        
+        model = WeatherPredictor._new_model()
+        if init is not None:
+            model.fit(df, init=init)
+            model_cache.record_warm_start()
+        else:
+            model.fit(df)
+        
+        model_cache.put(key, model_to_json(model), cell, metric, times[0], len(times))
+        return model
+    
+    @staticmethod
+    def _warm_start_params(model: Prophet) -> Dict:
+        """Stan initial values taken from a previously fitted model"""
+        params = {}
+        for name in ['k', 'm', 'sigma_obs']:
+            params[name] = model.params[name][0][0]
+        for name in ['delta', 'beta']:
+            params[name] = model.params[name][0]
+        return params
+    
     @staticmethod
     def predict_weather(weather_data: Dict, target_time: datetime) -> Dict:
         """
@@ -77,30 +147,20 @@ class WeatherPredictor:
             }
         
         hourly = weather_data["hourly"]
+        location = (weather_data.get("latitude"), weather_data.get("longitude"))
         
         try:
             temperature = WeatherPredictor.predict_weather_with_prophet(
-                hourly, target_time, "temperature_2m"
+                hourly, target_time, "temperature_2m", location
             )
             precipitation = WeatherPredictor.predict_weather_with_prophet(
-                hourly, target_time, "precipitation"
+                hourly, target_time, "precipitation", location
             )
             windspeed = WeatherPredictor.predict_weather_with_prophet(
-                hourly, target_time, "windspeed_10m"
+                hourly, target_time, "windspeed_10m", location
             )
             
-            weathercodes = hourly.get("weathercode", [])
-            weathercode = weathercodes[0] if weathercodes else 0
-            
-            confidence = 0.8
-            
-            return {
-                "temperature": round(temperature, 1) if temperature is not None else None,
-                "precipitation": round(precipitation, 2) if precipitation is not None else 0.0,
-                "windspeed": round(windspeed, 1) if windspeed is not None else None,
-                "weathercode": int(weathercode),
-                "confidence": confidence
-            }
+            return WeatherPredictor.build_prediction(hourly, temperature, precipitation, windspeed)
         except Exception as e:
             print(f"Error in weather prediction: {e}")
             times = hourly.get("time", [])
@@ -119,4 +179,34 @@ class WeatherPredictor:
                 "windspeed": hourly.get("windspeed_10m", [None])[0],
                 "weathercode": hourly.get("weathercode", [0])[0],
                 "confidence": 0.5
-            }
\ No newline at end of file
+            }
+    
+    @staticmethod
+    def build_prediction(hourly: Dict, temperature: Optional[float], precipitation: Optional[float],
+                         windspeed: Optional[float]) -> Dict:
+        """Assemble the per-segment prediction dict from predicted metric values"""
+        weathercodes = hourly.get("weathercode", [])
+        weathercode = weathercodes[0] if weathercodes else 0
+        
+        confidence = 0.8
+        
+        return {
+            "temperature": round(temperature, 1) if temperature is not None else None,
+            "precipitation": round(precipitation, 2) if precipitation is not None else 0.0,
+            "windspeed": round(windspeed, 1) if windspeed is not None else None,
+            "weathercode": int(weathercode),
+            "confidence": confidence
+        }
+    
+    @staticmethod
+    def raw_value(hourly_data: Dict, target_time: datetime, metric: str) -> Optional[float]:
+        """Hourly forecast value at (or just after) target time, used when a fit is unavailable"""
+        if not hourly_data or metric not in hourly_data:
+            return None
+        times = hourly_data.get("time", [])
+        values = hourly_data[metric]
+        target_time_str = target_time.strftime("%Y-%m-%dT%H:00")
+        for i, time_str in enumerate(times):
+            if time_str >= target_time_str and i < len(values):
+                return values[i]
+        return values[0] if values else None
@@ -1,6 +1,37 @@
 from typing import Dict
+import numpy as np
 
 class SeverityScorer:
+    # WMO code -> human-readable description
+    WEATHER_CODES = {
+        0: "Clear sky",
+        1: "Mainly clear",
+        2: "Partly cloudy",
+        3: "Overcast",
+        45: "Foggy",
+        48: "Depositing rime fog",
+        51: "Light drizzle",
+        53: "Moderate drizzle",
+        55: "Dense drizzle",
+        61: "Slight rain",
+        63: "Moderate rain",
+        65: "Heavy rain",
+        66: "Light freezing rain",
+        67: "Heavy freezing rain",
+        71: "Slight snow",
+        73: "Moderate snow",
+        75: "Heavy snow",
+        77: "Snow grains",
+        80: "Slight rain showers",
+        81: "Moderate rain showers",
+        82: "Violent rain showers",
+        85: "Slight snow showers",
+        86: "Heavy snow showers",
+        95: "Thunderstorm",
+        96: "Thunderstorm with slight hail",
+        99: "Thunderstorm with heavy hail"
+    }
+    
     @staticmethod
     def calculate_risk_score(weather: Dict, distance: float) -> Dict:
         """
@@ -59,6 +90,71 @@ class SeverityScorer:
             }
         }
     
+    @staticmethod
+    def calculate_risk_score_batch(temperature: np.ndarray, precipitation: np.ndarray, windspeed: np.ndarray,
+                                   weathercode: np.ndarray, distance: np.ndarray) -> Dict:
+        """
+        Columnar calculate_risk_score over arrays of conditions (inputs broadcast against each other)
+        Returns arrays for severity_score, risk_level, description and each factor,
+        equal element for element to calculate_risk_score. Cells with no weather
+        (NaN temperature or weathercode) score 0 with risk level "unknown"; a NaN
+        precipitation or windspeed alone counts as 0, like the dict defaults.
+        """
+        temperature = np.asarray(temperature, dtype=float)
+        precipitation = np.nan_to_num(np.asarray(precipitation, dtype=float), nan=0.0)
+        windspeed = np.nan_to_num(np.asarray(windspeed, dtype=float), nan=0.0)
+        weathercode = np.asarray(weathercode, dtype=float)
+        distance = np.asarray(distance, dtype=float)
+        
+        precipitation_score = np.minimum(precipitation * 10, 100)
+        wind_score = np.minimum(windspeed * 2, 100)
+        temp_score = np.where(temperature < 0, 30.0, np.where(temperature > 35, 20.0, 0.0))
+        
+        # Table lookups; codes outside 0-99 or non-integral fall back like the dict lookups do
+        codes = np.nan_to_num(weathercode, nan=-1)
+        table_index = np.clip(codes, 0, len(_WEATHERCODE_SEVERITY) - 1).astype(np.int64)
+        in_table = (codes >= 0) & (codes < len(_WEATHERCODE_SEVERITY)) & (codes == np.floor(codes))
+        weather_condition_score = np.where(in_table, _WEATHERCODE_SEVERITY[table_index], 20.0)
+        description = np.where(in_table, _WEATHER_DESCRIPTIONS[table_index], "Unknown")
+        
+        distance_factor = np.minimum(distance / 1000, 5) / 5
+        
+        total_score = (
+            precipitation_score * 0.4 +
+            wind_score * 0.3 +
+            temp_score * 0.15 +
+            weather_condition_score * 0.15
+        ) * (1 + distance_factor * 0.2)
+        
+        missing = np.isnan(temperature) | np.isnan(weathercode)
+        level_index = np.searchsorted(_RISK_THRESHOLDS, np.nan_to_num(total_score), side="right")
+        
+        return {
+            "severity_score": np.where(missing, 0.0, round_like_python(np.nan_to_num(total_score))),
+            "risk_level": np.where(missing, "unknown", _RISK_LEVELS[level_index]),
+            "description": description,
+            "factors": {
+                "precipitation": round_like_python(precipitation_score),
+                "wind": round_like_python(wind_score),
+                # Integral in calculate_risk_score, so they serialize as ints there too
+                "temperature": temp_score.astype(np.int64),
+                "weather_condition": weather_condition_score.astype(np.int64)
+            },
+            "missing": missing
+        }
+    
+    @staticmethod
+    def calculate_risk_scores(temperature: np.ndarray, precipitation: np.ndarray, windspeed: np.ndarray,
+                              weathercode: np.ndarray, distance: np.ndarray) -> np.ndarray:
+        """
+        Vectorized severity scores for arrays of weather conditions
+        Returns rounded scores (NaN where temperature or weathercode is missing)
+        """
+        batch = SeverityScorer.calculate_risk_score_batch(
+            temperature, precipitation, windspeed, weathercode, distance
+        )
+        return np.where(batch["missing"], np.nan, batch["severity_score"])
+    
     @staticmethod
     def get_weathercode_severity(code: int) -> float:
         """Map WMO weather codes to severity scores"""
@@ -90,32 +186,26 @@ class SeverityScorer:
     @staticmethod
     def get_weather_description(code: int) -> str:
         """Get human-readable weather description from WMO code"""
-        weather_codes = {
-            0: "Clear sky",
-            1: "Mainly clear",
-            2: "Partly cloudy",
-            3: "Overcast",
-            45: "Foggy",
-            48: "Depositing rime fog",
-            51: "Light drizzle",
-            53: "Moderate drizzle",
-            55: "Dense drizzle",
-            61: "Slight rain",
-            63: "Moderate rain",
-            65: "Heavy rain",
-            66: "Light freezing rain",
-            67: "Heavy freezing rain",
-            71: "Slight snow",
-            73: "Moderate snow",
-            75: "Heavy snow",
-            77: "Snow grains",
-            80: "Slight rain showers",
-            81: "Moderate rain showers",
-            82: "Violent rain showers",
-            85: "Slight snow showers",
-            86: "Heavy snow showers",
-            95: "Thunderstorm",
-            96: "Thunderstorm with slight hail",
-            99: "Thunderstorm with heavy hail"
-        }
-        return weather_codes.get(code, "Unknown")
\ No newline at end of file
+        return SeverityScorer.WEATHER_CODES.get(code, "Unknown")
+
+
+# Lookup tables indexed by WMO code (0-99), precomputed for the vectorized scorer
+_WEATHERCODE_SEVERITY = np.array(
+    [SeverityScorer.get_weathercode_severity(code) for code in range(100)], dtype=float
+)
+_WEATHER_DESCRIPTIONS = np.array(
+    [SeverityScorer.get_weather_description(code) for code in range(100)], dtype=object
+)
+_RISK_THRESHOLDS = np.array([20.0, 50.0, 75.0])
+_RISK_LEVELS = np.array(["safe", "moderate", "risky", "dangerous"], dtype=object)
+
+
+def round_like_python(values: np.ndarray, digits: int = 2) -> np.ndarray:
+    """np.round, with values sitting on a rounding tie re-rounded by Python's round() so results match it exactly"""
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, digits)
+    scaled = values * 10 ** digits
+    ties = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    if np.any(ties):
+        rounded[ties] = [round(float(value), digits) for value in values[ties]]
+    return rounded
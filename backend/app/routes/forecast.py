@@ -1,48 +1,103 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Dict, Literal, Optional
 from datetime import datetime, timedelta
+import os
 from ..utils.openmeteo_api import OpenMeteoAPI
-from ..ml.prophet_model import WeatherPredictor
+from ..utils.metrics import stage
+from ..utils.response_cache import response_cache
 
 router = APIRouter()
 
-class ForecastRequest(BaseModel):
+# Longest horizon a caller may ask for, and most points in one call
+FORECAST_MAX_HOURS = int(os.getenv("FORECAST_MAX_HOURS", "168"))
+FORECAST_MAX_POINTS = int(os.getenv("FORECAST_MAX_POINTS", "100"))
+
+class ForecastPoint(BaseModel):
     latitude: float
     longitude: float
+
+class ForecastRequest(BaseModel):
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    points: Optional[List[ForecastPoint]] = Field(None, min_length=1, max_length=FORECAST_MAX_POINTS)
     start_time: str
+    hours: int = Field(48, ge=1, le=FORECAST_MAX_HOURS)
+    format: Literal["rows", "columnar"] = "rows"
+    
+    @model_validator(mode="after")
+    def check_location(self):
+        if self.points is None and (self.latitude is None or self.longitude is None):
+            raise ValueError("Provide latitude and longitude, or points")
+        return self
 
-@router.post("/forecast")
-async def get_forecast(request: ForecastRequest):
-    """Get weather forecast for a specific location and time"""
-    try:
-        start_time = datetime.fromisoformat(request.start_time.replace('Z', '+00:00'))
-        
-        weather_data = OpenMeteoAPI.fetch_weather(request.latitude, request.longitude, start_time)
-        
-        if not weather_data:
+def format_forecast(weather_data: Dict, columnar: bool) -> Dict:
+    """
+    Shape one windowed Open-Meteo payload for the response
+    weather_data: Payload from OpenMeteoAPI.fetch_forecast_window
+    columnar: Parallel arrays with unix-second times instead of one dict per hour
+    """
+    hourly = weather_data.get("hourly", {})
+    location = {
+        "latitude": weather_data.get("latitude"),
+        "longitude": weather_data.get("longitude")
+    }
+    series = {name: hourly.get(key, []) for name, key in OpenMeteoAPI.METRIC_KEYS.items()}
+    
+    if columnar:
+        location["utc_offset_seconds"] = weather_data.get("utc_offset_seconds") or 0
+        return {"location": location, "forecasts": {"time": hourly.get("time", []), **series}}
+    
+    # Rows keep the local wall-clock time strings clients already parse
+    offset = weather_data.get("utc_offset_seconds") or 0
+    epoch = datetime(1970, 1, 1)
+    times = [(epoch + timedelta(seconds=t + offset)).strftime("%Y-%m-%dT%H:%M") for t in hourly.get("time", [])]
+    forecasts = [
+        {"time": time_str, **dict(zip(series, values))}
+        for time_str, *values in zip(times, *series.values())
+    ]
+    return {"location": location, "forecasts": forecasts}
+
+async def forecast_for(request: ForecastRequest) -> Dict:
+    """
+    Get weather forecast for one location, or several with points, over the
+    next hours from start_time. Only that window is requested upstream.
+    """
+    start_time = datetime.fromisoformat(request.start_time.replace('Z', '+00:00'))
+    columnar = request.format == "columnar"
+    points = request.points or [ForecastPoint(latitude=request.latitude, longitude=request.longitude)]
+    
+    with stage("weather"):
+        weather_batch = await OpenMeteoAPI.fetch_forecast_window(
+            [(point.latitude, point.longitude) for point in points], start_time, request.hours
+        )
+    
+    if request.points is None:
+        if not weather_batch[0]:
             raise HTTPException(status_code=400, detail="Could not fetch weather data")
-        
-        hourly = weather_data.get("hourly", {})
-        times = hourly.get("time", [])
-        
-        forecasts = []
-        for i, time_str in enumerate(times[:48]):
-            forecasts.append({
-                "time": time_str,
-                "temperature": hourly.get("temperature_2m", [])[i],
-                "precipitation": hourly.get("precipitation", [])[i],
-                "windspeed": hourly.get("windspeed_10m", [])[i],
-                "weathercode": hourly.get("weathercode", [])[i]
+        return format_forecast(weather_batch[0], columnar)
+    
+    # Several points: a failed location is reported in place, not for the whole call
+    results = []
+    for point, weather_data in zip(points, weather_batch):
+        if weather_data:
+            results.append(format_forecast(weather_data, columnar))
+        else:
+            results.append({
+                "location": {"latitude": point.latitude, "longitude": point.longitude},
+                "error": "Could not fetch weather data"
             })
-        
-        return {
-            "location": {
-                "latitude": weather_data.get("latitude"),
-                "longitude": weather_data.get("longitude")
-            },
-            "forecasts": forecasts
-        }
-        
+    return {"results": results}
+
+@router.post("/forecast")
+async def get_forecast(request: ForecastRequest, http_request: Request):
+    """Forecast for one or several locations (cached, see ResponseCache)"""
+    try:
+        # Retry points that failed on the next call rather than caching their error
+        return await response_cache.serve(
+            http_request, "forecast", request.model_dump(), lambda: forecast_for(request),
+            cacheable=lambda body: not any("error" in result for result in body.get("results", []))
+        )
+    
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -9,7 +9,7 @@ router = APIRouter()
 async def search_locations(q: str = Query(..., min_length=2)):
     """Search for locations by name with autocomplete suggestions"""
     try:
-        locations = NominatimGeocoding.search_location(q, limit=5)
+        locations = await NominatimGeocoding.search_location(q, limit=5)
         return {"results": locations}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -18,7 +18,7 @@ async def search_locations(q: str = Query(..., min_length=2)):
 async def reverse_geocode(lat: float, lon: float):
     """Convert coordinates to location name"""
     try:
-        location_name = NominatimGeocoding.reverse_geocode(lat, lon)
+        location_name = await NominatimGeocoding.reverse_geocode(lat, lon)
         if location_name:
             return {"location": location_name}
         raise HTTPException(status_code=404, detail="Location not found")
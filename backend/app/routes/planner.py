@@ -1,14 +1,33 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional, List, Dict
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Literal
 from datetime import datetime
+import asyncio
+import json
+import logging
+import os
+import numpy as np
 from ..utils.osmnx_wrapper import OpenRouteServiceAPI
-from ..utils.segmenter import RouteSegmenter
+from ..utils.segmenter import RouteSegmenter, SegmentTable
+from ..utils.geometry import RouteGeometry
 from ..utils.openmeteo_api import OpenMeteoAPI
-from ..ml.prophet_model import WeatherPredictor
+from ..utils.weather_cache import weather_cache
+from ..utils.response_cache import response_cache
+from ..utils.wire_format import columnar_plan
+from ..ml.predictor import get_predictor
 from ..ml.severity_score import SeverityScorer
+from ..utils.metrics import STAGE_ERRORS, stage
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Segments scored per concurrent task on /plan/stream
+STREAM_CHUNK_SEGMENTS = max(1, int(os.getenv("ROUTE_STREAM_CHUNK_SEGMENTS", "8")))
+# /plan/batch: most routes per call, and route fetches / scoring runs in flight across all batches
+BATCH_MAX_ROUTES = int(os.getenv("ROUTE_BATCH_MAX_ROUTES", "100"))
+BATCH_CONCURRENCY = asyncio.Semaphore(max(1, int(os.getenv("ROUTE_BATCH_CONCURRENCY", "8"))))
 
 class RouteRequest(BaseModel):
     start_lat: float
@@ -16,76 +35,393 @@ class RouteRequest(BaseModel):
     end_lat: float
     end_lon: float
     departure_time: Optional[str] = None
+    predictor: Optional[str] = None
+    # Response geometry: simplify to a tolerance in meters, or to what is visible at a map zoom
+    simplify_tolerance: Optional[float] = None
+    zoom: Optional[float] = None
+    geometry_format: Literal["coordinates", "polyline"] = "coordinates"
+    # /plan only: also plan up to this many ORS alternative routes and rank them all
+    alternatives: int = Field(0, ge=0, le=OpenRouteServiceAPI.MAX_ALTERNATIVES)
 
-@router.post("/plan")
-async def plan_route(request: RouteRequest):
-    """Plan route with weather predictions and risk assessment"""
-    try:
-        if request.departure_time:
-            departure_time = datetime.fromisoformat(request.departure_time.replace('Z', '+00:00'))
-        else:
-            departure_time = datetime.now()
-        
-        route_data = OpenRouteServiceAPI.get_route(
+class BatchRouteRequest(BaseModel):
+    routes: List[RouteRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ROUTES)
+
+def build_route_geometry(request: RouteRequest, coordinates: List[List[float]], segments: SegmentTable) -> Dict:
+    """
+    Simplify and encode the response geometry, re-pointing segment
+    start_idx/end_idx at vertices of the returned geometry
+    """
+    tolerance = request.simplify_tolerance
+    if tolerance is None and request.zoom is not None:
+        mid_lat = coordinates[len(coordinates) // 2][1]
+        tolerance = RouteGeometry.tolerance_for_zoom(request.zoom, mid_lat)
+    
+    if tolerance:
+        boundaries = np.concatenate((segments.start_vertex, segments.end_vertex)).tolist()
+        kept = RouteGeometry.simplify_indices(coordinates, tolerance, keep=boundaries)
+        segments.start_idx = RouteGeometry.remap_indices(segments.start_vertex, kept)
+        segments.end_idx = RouteGeometry.remap_indices(segments.end_vertex, kept)
+        coordinates = [coordinates[i] for i in kept.tolist()]
+    
+    if request.geometry_format == "polyline":
+        # Standard polyline order is (lat, lon)
+        return {
+            "geometry_format": "polyline",
+            "polyline": OpenRouteServiceAPI.encode_polyline([[c[1], c[0]] for c in coordinates])
+        }
+    return {
+        "geometry_format": "coordinates",
+        "coordinates": coordinates
+    }
+
+def departure_time_of(request: RouteRequest) -> datetime:
+    if request.departure_time:
+        return datetime.fromisoformat(request.departure_time.replace('Z', '+00:00'))
+    return datetime.now()
+
+async def load_route_segments(request: RouteRequest):
+    """Fetch the route and split it into segments; returns (departure_time, route_data, segments)"""
+    departure_time = departure_time_of(request)
+    
+    with stage("route"):
+        route_data = await OpenRouteServiceAPI.get_route(
             (request.start_lon, request.start_lat),
             (request.end_lon, request.end_lat)
         )
-        
-        if not route_data:
-            raise HTTPException(status_code=400, detail="Could not find route")
-        
-        coordinates = route_data["coordinates"]
-        total_duration = route_data["duration"]
-        total_distance = route_data["distance"]
-        
-        segments = RouteSegmenter.segment_route(
-            coordinates, 
-            total_duration, 
+    
+    if not route_data:
+        raise HTTPException(status_code=400, detail="Could not find route")
+    
+    return departure_time, route_data, split_route(route_data, departure_time)
+
+def split_route(route_data: Dict, departure_time: datetime) -> SegmentTable:
+    with stage("segment"):
+        return RouteSegmenter.segment_table(
+            route_data["coordinates"], 
+            route_data["duration"], 
             segment_distance=5000,
             departure_time=departure_time
         )
+
+async def enrich_segments(predictor, segments: SegmentTable, departure_time: datetime,
+                          weather_batch: Optional[List[Optional[Dict]]] = None) -> SegmentTable:
+    """
+    Fetch weather for the segments, predict conditions at each ETA and score the
+    risk; the conditions and risk columns are attached to the table, which is returned
+    weather_batch: Weather per segment when the caller already fetched it
+    """
+    if weather_batch is None:
+        with stage("weather"):
+            weather_batch = await OpenMeteoAPI.fetch_weather_batch(segments.points(), departure_time)
+    
+    with stage("predict"):
+        predictions = await predictor.predict_batch_async(weather_batch, segments.eta_times())
+    
+    fallback = {
+        "temperature": None,
+        "precipitation": 0,
+        "windspeed": 0,
+        "weathercode": 0
+    }
+    conditions = [
+        prediction if weather_data and prediction else fallback
+        for weather_data, prediction in zip(weather_batch, predictions)
+    ]
+    
+    def column(metric: str, default: float) -> np.ndarray:
+        values = [condition.get(metric, default) for condition in conditions]
+        return np.array([np.nan if value is None else value for value in values], dtype=float)
+    
+    with stage("score"):
+        risks = SeverityScorer.calculate_risk_score_batch(
+            column("temperature", 15),
+            column("precipitation", 0),
+            column("windspeed", 0),
+            column("weathercode", 0),
+            segments.distance
+        )
+    
+    segments.conditions = conditions
+    segments.risks = risks
+    return segments
+
+def overall_risk_of(severity_scores: List[float]) -> float:
+    overall_risk = sum(severity_scores) / len(severity_scores) if severity_scores else 0
+    return round(overall_risk, 2)
+
+@router.post("/plan")
+async def plan_route(request: RouteRequest, http_request: Request):
+    """
+    Plan route with weather predictions and risk assessment. Responses are
+    cached per normalized request and carry an ETag (see ResponseCache);
+    Accept: application/x-msgpack gets the columnar MessagePack form.
+    """
+    try:
+        predictor = get_predictor(request.predictor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def build():
+        if request.alternatives:
+            return await plan_alternatives(request, predictor)
+        departure_time, route_data, segments = await load_route_segments(request)
+        enriched_segments = await enrich_segments(predictor, segments, departure_time)
         
-        enriched_segments = []
-        for segment in segments:
-            center_lat = segment["center_coord"][1]
-            center_lon = segment["center_coord"][0]
-            segment_eta = datetime.fromisoformat(segment["eta"])
-            
-            weather_data = OpenMeteoAPI.fetch_weather(center_lat, center_lon, segment_eta)
-            
-            if weather_data:
-                predicted = WeatherPredictor.predict_weather(weather_data, segment_eta)
-            else:
-                predicted = {
-                    "temperature": None,
-                    "precipitation": 0,
-                    "windspeed": 0,
-                    "weathercode": 0
-                }
-            
-            risk = SeverityScorer.calculate_risk_score(predicted, segment["distance"])
-            
-            enriched_segments.append({
-                **segment,
-                "weather": {
-                    **predicted,
-                    "description": SeverityScorer.get_weather_description(predicted.get("weathercode", 0))
-                },
-                "risk": risk
-            })
-        
-        overall_risk = sum(s["risk"]["severity_score"] for s in enriched_segments) / len(enriched_segments) if enriched_segments else 0
+        with stage("geometry"):
+            geometry = build_route_geometry(request, route_data["coordinates"], enriched_segments)
+        return plan_response(predictor, departure_time, route_data, geometry, enriched_segments)
+    
+    try:
+        # A plan built while Open-Meteo was failing is served but not cached
+        return await response_cache.serve(http_request, "plan", request.model_dump(), build,
+                                          cacheable=plan_complete, columnar=columnar_plan)
         
-        return {
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def plan_complete(plan: Dict) -> bool:
+    """Whether every segment of a plan (and of its alternatives) has weather and a known risk"""
+    for candidate in [plan, *plan.get("alternatives", [])]:
+        for segment in candidate["segments"]:
+            if segment["risk"]["risk_level"] == "unknown" or segment["weather"].get("temperature") is None:
+                return False
+    return True
+
+def plan_response(predictor, departure_time: datetime, route_data: Dict, geometry: Dict,
+                  enriched_segments: SegmentTable) -> Dict:
+    """Body of a /plan response; segments take their public JSON shape here"""
+    return {
+        "route": {
+            "total_distance": route_data["distance"],
+            "total_duration": route_data["duration"],
+            "departure_time": departure_time.isoformat(),
+            **geometry
+        },
+        "segments": enriched_segments.to_dicts(),
+        "overall_risk": overall_risk_of(enriched_segments.severity_scores),
+        "predictor": predictor.name
+    }
+
+async def plan_alternatives(request: RouteRequest, predictor) -> Dict:
+    """
+    Plan the route and its ORS alternatives and rank them by overall risk, then
+    travel time. Alternatives mostly overlap, so weather is fetched once for the
+    union of their grid cells and each distinct cell is fetched and parsed once;
+    an extra alternative costs its segmentation, predictions and scoring.
+    The best-ranked plan is the response body, with the others under alternatives.
+    """
+    departure_time = departure_time_of(request)
+    
+    with stage("route"):
+        routes = await OpenRouteServiceAPI.get_routes(
+            (request.start_lon, request.start_lat),
+            (request.end_lon, request.end_lat),
+            request.alternatives
+        )
+    
+    if not routes:
+        raise HTTPException(status_code=400, detail="Could not find route")
+    
+    tables = [split_route(route_data, departure_time) for route_data in routes]
+    points = [point for segments in tables for point in segments.points()]
+    with stage("weather"):
+        weather = await OpenMeteoAPI.fetch_weather_batch(points, departure_time)
+    
+    plans, offset = [], 0
+    for index, (route_data, segments) in enumerate(zip(routes, tables)):
+        enriched_segments = await enrich_segments(
+            predictor, segments, departure_time, weather[offset:offset + len(segments)]
+        )
+        offset += len(segments)
+        with stage("geometry"):
+            geometry = build_route_geometry(request, route_data["coordinates"], enriched_segments)
+        plans.append({
+            **plan_response(predictor, departure_time, route_data, geometry, enriched_segments),
+            "route_index": index
+        })
+    
+    plans.sort(key=lambda plan: (plan["overall_risk"], plan["route"]["total_duration"]))
+    fastest = min(plan["route"]["total_duration"] for plan in plans)
+    for rank, plan in enumerate(plans, start=1):
+        plan["rank"] = rank
+        plan["extra_duration"] = plan["route"]["total_duration"] - fastest
+    
+    return {
+        **plans[0],
+        "alternatives": plans[1:],
+        "evaluation": {
+            "routes": len(plans),
+            "segments": len(points),
+            "unique_weather_cells": len({weather_cache.cell_for(lat, lon) for lat, lon in points})
+        }
+    }
+
+@router.post("/plan/batch")
+async def plan_route_batch(request: BatchRouteRequest):
+    """
+    Plan many routes in one call (e.g. a dispatch run). Identical routes are
+    fetched once and the weather for every segment of every route is fetched
+    in one pass over the union of their grid cells, then each route is scored
+    with its own predictor. Route fetches and scoring share the
+    ROUTE_BATCH_CONCURRENCY cap. results[i] answers routes[i]: either
+    {"status": "ok", "plan": <same body as /plan>} or {"status": "error", "error": ...}.
+    """
+    items = request.routes
+    results: List[Optional[Dict]] = [None] * len(items)
+    
+    def fail(index: int, detail: str) -> None:
+        results[index] = {"index": index, "status": "error", "error": detail}
+    
+    predictors = {}
+    for index, item in enumerate(items):
+        try:
+            predictors[index] = get_predictor(item.predictor)
+        except ValueError as e:
+            fail(index, str(e))
+    
+    # One lookup per distinct route (as the route cache sees it)
+    route_keys = {
+        index: OpenRouteServiceAPI.cache_key((items[index].start_lon, items[index].start_lat),
+                                             (items[index].end_lon, items[index].end_lat))
+        for index in predictors
+    }
+    first_item = {}
+    for index, key in route_keys.items():
+        first_item.setdefault(key, index)
+    
+    async def fetch_route(index: int):
+        async with BATCH_CONCURRENCY:
+            return await OpenRouteServiceAPI.get_route(
+                (items[index].start_lon, items[index].start_lat),
+                (items[index].end_lon, items[index].end_lat)
+            )
+    
+    with stage("route"):
+        fetched = await asyncio.gather(*(fetch_route(index) for index in first_item.values()), return_exceptions=True)
+    routes = dict(zip(first_item, fetched))
+    
+    planned = {}
+    for index, key in route_keys.items():
+        route_data = routes[key]
+        if isinstance(route_data, Exception):
+            fail(index, str(route_data))
+        elif not route_data:
+            fail(index, "Could not find route")
+        else:
+            try:
+                departure_time = departure_time_of(items[index])
+                planned[index] = (departure_time, route_data, split_route(route_data, departure_time))
+            except Exception as e:
+                fail(index, str(e))
+    
+    # Weather for the union of all segments; shared cells are fetched once
+    points = [point for index in planned for point in planned[index][2].points()]
+    try:
+        with stage("weather"):
+            weather = await OpenMeteoAPI.fetch_weather_batch(points)
+    except Exception as e:
+        weather = [None] * len(points)
+        STAGE_ERRORS.inc(stage="weather")
+        logger.warning("Batch weather fetch failed, planning without weather: %r", e)
+    
+    async def plan_one(index: int, weather_batch: List[Optional[Dict]]):
+        departure_time, route_data, segments = planned[index]
+        async with BATCH_CONCURRENCY:
+            enriched_segments = await enrich_segments(predictors[index], segments, departure_time, weather_batch)
+        with stage("geometry"):
+            geometry = build_route_geometry(items[index], route_data["coordinates"], enriched_segments)
+        return plan_response(predictors[index], departure_time, route_data, geometry, enriched_segments)
+    
+    jobs, offset = [], 0
+    for index, (_, _, segments) in planned.items():
+        jobs.append(plan_one(index, weather[offset:offset + len(segments)]))
+        offset += len(segments)
+    
+    for index, outcome in zip(planned, await asyncio.gather(*jobs, return_exceptions=True)):
+        if isinstance(outcome, Exception):
+            fail(index, str(outcome))
+        else:
+            results[index] = {"index": index, "status": "ok", "plan": outcome}
+    
+    failed = sum(1 for result in results if result["status"] == "error")
+    with stage("serialize"):
+        return JSONResponse(jsonable_encoder({
+            "results": results,
+            "summary": {
+                "routes": len(items),
+                "succeeded": len(items) - failed,
+                "failed": failed,
+                "unique_routes": len(first_item),
+                "unique_weather_cells": len({weather_cache.cell_for(lat, lon) for lat, lon in points})
+            }
+        }))
+
+def format_event(event: str, data: Dict, sse: bool) -> str:
+    """One stream message: an SSE event block or an NDJSON line"""
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=float)}\n\n"
+    return json.dumps({"event": event, "data": data}, separators=(",", ":"), default=float) + "\n"
+
+@router.post("/plan/stream")
+async def plan_route_stream(request: RouteRequest, http_request: Request):
+    """
+    Streaming /plan: sends the route geometry as soon as it is known, then each
+    segment (in route order) as its weather and risk are ready, then a summary.
+    Responds with Server-Sent Events when the client accepts text/event-stream,
+    otherwise with NDJSON ({"event": ..., "data": ...} per line).
+    Segments are scored concurrently in chunks of STREAM_CHUNK_SEGMENTS.
+    """
+    try:
+        predictor = get_predictor(request.predictor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        departure_time, route_data, segments = await load_route_segments(request)
+        # Remaps segment start_idx/end_idx onto the returned geometry before any segment is sent
+        with stage("geometry"):
+            geometry = build_route_geometry(request, route_data["coordinates"], segments)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    
+    async def events():
+        yield format_event("route", {
             "route": {
-                "total_distance": total_distance,
-                "total_duration": total_duration,
+                "total_distance": route_data["distance"],
+                "total_duration": route_data["duration"],
                 "departure_time": departure_time.isoformat(),
-                "coordinates": coordinates
+                **geometry
             },
-            "segments": enriched_segments,
-            "overall_risk": round(overall_risk, 2)
-        }
+            "segment_count": len(segments),
+            "predictor": predictor.name
+        }, sse)
         
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        chunks = [segments.slice(i, i + STREAM_CHUNK_SEGMENTS) for i in range(0, len(segments), STREAM_CHUNK_SEGMENTS)]
+        tasks = [asyncio.create_task(enrich_segments(predictor, chunk, departure_time)) for chunk in chunks]
+        severity_scores = []
+        try:
+            for task in tasks:
+                chunk = await task
+                severity_scores.extend(chunk.severity_scores)
+                for segment in chunk.to_dicts():
+                    yield format_event("segment", segment, sse)
+            
+            yield format_event("summary", {
+                "overall_risk": overall_risk_of(severity_scores),
+                "predictor": predictor.name
+            }, sse)
+        except Exception as e:
+            yield format_event("error", {"detail": str(e)}, sse)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
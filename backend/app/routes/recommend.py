@@ -1,83 +1,121 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
 from typing import List, Dict
 from datetime import datetime, timedelta
+import numpy as np
 from ..utils.osmnx_wrapper import OpenRouteServiceAPI
 from ..utils.segmenter import RouteSegmenter
 from ..utils.openmeteo_api import OpenMeteoAPI
 from ..ml.severity_score import SeverityScorer
+from ..utils.metrics import stage
+from ..utils.response_cache import response_cache
+from ..utils.wire_format import columnar_recommendation
 
 router = APIRouter()
 
+# Open-Meteo payloads cover 7 days of hourly data
+MAX_WINDOW_HOURS = 7 * 24
+# Finest departure resolution; bounds one request to 4 x 168 departures
+MIN_STEP_MINUTES = 15
+
 class RecommendationRequest(BaseModel):
     start_lat: float
     start_lon: float
     end_lat: float
     end_lon: float
-    time_window_hours: int = 12
+    time_window_hours: int = Field(12, ge=1, le=MAX_WINDOW_HOURS)
+    step_minutes: int = Field(60, ge=MIN_STEP_MINUTES)
 
-@router.post("/departure")
-async def recommend_departure(request: RecommendationRequest):
-    """Recommend best departure time to minimize weather risk"""
-    try:
-        route_data = OpenRouteServiceAPI.get_route(
+async def recommendation_for(request: RecommendationRequest) -> Dict:
+    """Score departures over the request's time window, best first"""
+    with stage("route"):
+        route_data = await OpenRouteServiceAPI.get_route(
             (request.start_lon, request.start_lat),
             (request.end_lon, request.end_lat)
         )
-        
-        if not route_data:
-            raise HTTPException(status_code=400, detail="Could not find route")
-        
-        coordinates = route_data["coordinates"]
-        total_duration = route_data["duration"]
-        
-        recommendations = []
-        current_time = datetime.now()
-        
-        for hour_offset in range(request.time_window_hours):
-            departure_time = current_time + timedelta(hours=hour_offset)
-            
-            segments = RouteSegmenter.segment_route(
-                coordinates,
-                total_duration,
-                segment_distance=5000,
-                departure_time=departure_time
-            )
-            
-            total_risk = 0
-            segment_count = 0
-            
-            for segment in segments:
-                center_lat = segment["center_coord"][1]
-                center_lon = segment["center_coord"][0]
-                segment_eta = datetime.fromisoformat(segment["eta"])
-                
-                weather_data = OpenMeteoAPI.fetch_weather(center_lat, center_lon, segment_eta)
-                weather = OpenMeteoAPI.get_weather_at_time(weather_data, segment_eta)
-                
-                if weather:
-                    risk = SeverityScorer.calculate_risk_score(weather, segment["distance"])
-                    total_risk += risk["severity_score"]
-                    segment_count += 1
-            
-            avg_risk = total_risk / segment_count if segment_count > 0 else 0
-            
-            recommendations.append({
-                "departure_time": departure_time.isoformat(),
-                "average_risk": round(avg_risk, 2),
-                "risk_level": "safe" if avg_risk < 20 else "moderate" if avg_risk < 50 else "risky" if avg_risk < 75 else "dangerous"
-            })
-        
-        recommendations.sort(key=lambda x: x["average_risk"])
-        
-        return {
-            "route_info": {
-                "distance": route_data["distance"],
-                "duration": route_data["duration"]
-            },
-            "best_departure": recommendations[0],
-            "all_recommendations": recommendations
-        }
-        
+    
+    if not route_data:
+        raise HTTPException(status_code=400, detail="Could not find route")
+    
+    coordinates = route_data["coordinates"]
+    total_duration = route_data["duration"]
+    
+    current_time = datetime.now()
+    
+    # Segment geometry and travel offsets do not depend on the departure
+    # time, so segment once and fetch each segment location once
+    with stage("segment"):
+        segments = RouteSegmenter.segment_table(
+            coordinates,
+            total_duration,
+            segment_distance=5000,
+            departure_time=current_time
+        )
+    
+    with stage("weather"):
+        weather_batch = await OpenMeteoAPI.fetch_weather_batch(segments.points(), current_time)
+    
+    window_minutes = request.time_window_hours * 60
+    departure_offsets = np.arange(0, window_minutes, request.step_minutes, dtype=float) * 60
+    segment_offsets = segments.eta_offset
+    distances = segments.distance
+    
+    # departures x segments matrix of arrival times (naive epoch seconds)
+    base_seconds = (current_time - datetime(1970, 1, 1)).total_seconds()
+    eta_seconds = base_seconds + departure_offsets[:, None] + segment_offsets[None, :]
+    
+    with stage("score"):
+        weather = OpenMeteoAPI.get_weather_matrix(weather_batch, eta_seconds)
+        scores = SeverityScorer.calculate_risk_scores(
+            weather["temperature"],
+            weather["precipitation"],
+            weather["windspeed"],
+            weather["weathercode"],
+            distances[None, :]
+        )
+    
+    covered = ~np.isnan(scores)
+    segment_counts = covered.sum(axis=1)
+    total_risk = np.where(covered, scores, 0).sum(axis=1)
+    avg_risks = np.divide(total_risk, segment_counts, out=np.zeros_like(total_risk), where=segment_counts > 0)
+    
+    recommendations = []
+    for offset, avg_risk, segment_count in zip(departure_offsets, avg_risks, segment_counts):
+        # Departures whose arrivals all fall past the forecast horizon have nothing to rank on
+        if segments and segment_count == 0:
+            continue
+        avg_risk = round(float(avg_risk), 2)
+        recommendations.append({
+            "departure_time": (current_time + timedelta(seconds=float(offset))).isoformat(),
+            "average_risk": avg_risk,
+            "risk_level": "safe" if avg_risk < 20 else "moderate" if avg_risk < 50 else "risky" if avg_risk < 75 else "dangerous"
+        })
+    
+    if not recommendations:
+        raise HTTPException(status_code=400, detail="Could not fetch weather data")
+    
+    recommendations.sort(key=lambda x: x["average_risk"])
+    
+    return {
+        "route_info": {
+            "distance": route_data["distance"],
+            "duration": route_data["duration"]
+        },
+        "best_departure": recommendations[0],
+        "all_recommendations": recommendations
+    }
+
+@router.post("/departure")
+async def recommend_departure(request: RecommendationRequest, http_request: Request):
+    """
+    Recommend best departure time to minimize weather risk (cached, see
+    ResponseCache; Accept: application/x-msgpack gets the columnar form)
+    """
+    try:
+        return await response_cache.serve(
+            http_request, "recommendation", request.model_dump(), lambda: recommendation_for(request),
+            columnar=columnar_recommendation
+        )
+    
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,19 +1,42 @@
-import requests
+import os
 from typing import List, Dict, Optional
+from .http_client import upstream_clients
+from .geocoding_cache import geocoding_cache
 
 class NominatimGeocoding:
     """Free geocoding service using OpenStreetMap Nominatim"""
-    BASE_URL = "https://nominatim.openstreetmap.org"
+    BASE_URL = os.getenv("NOMINATIM_BASE_URL", "https://nominatim.openstreetmap.org")
     
     @staticmethod
-    def search_location(query: str, limit: int = 5) -> List[Dict]:
+    async def search_location(query: str, limit: int = 5) -> List[Dict]:
         """
         Search for locations by name with autocomplete suggestions
         Returns list of matching locations with coordinates
+        Served from the geocoding cache (exact or prefix match) when possible
         """
         if not query or len(query) < 2:
             return []
         
+        normalized = geocoding_cache.normalize(query)
+        cached = geocoding_cache.lookup_search(normalized, limit)
+        if cached is not None:
+            return cached
+        
+        try:
+            locations = await geocoding_cache.single_flight(
+                f"search:{limit}:{normalized}",
+                lambda: NominatimGeocoding._request_search(query, limit)
+            )
+            geocoding_cache.store_search(normalized, limit, locations)
+            return locations
+            
+        except Exception as e:
+            print(f"Geocoding error: {e}")
+            return []
+    
+    @staticmethod
+    async def _request_search(query: str, limit: int) -> List[Dict]:
+        """Query Nominatim /search directly; raises on upstream errors"""
         params = {
             "q": query,
             "format": "json",
@@ -25,37 +48,53 @@ class NominatimGeocoding:
             "User-Agent": "PathPredict/1.0"
         }
         
+        response = await upstream_clients.get(
+            "nominatim",
+            f"{NominatimGeocoding.BASE_URL}/search",
+            params=params,
+            headers=headers
+        )
+        response.raise_for_status()
+        results = response.json()
+        
+        locations = []
+        for result in results:
+            locations.append({
+                "display_name": result.get("display_name", ""),
+                "lat": float(result.get("lat", 0)),
+                "lon": float(result.get("lon", 0)),
+                "type": result.get("type", ""),
+                "importance": result.get("importance", 0)
+            })
+        
+        return locations
+    
+    @staticmethod
+    async def reverse_geocode(lat: float, lon: float) -> Optional[str]:
+        """
+        Convert coordinates to location name (reverse geocoding)
+        Cached per geohash cell, so nearby points share one lookup
+        """
+        key = geocoding_cache.reverse_key(lat, lon)
+        found, cached = geocoding_cache.lookup_reverse(key)
+        if found:
+            return cached
+        
         try:
-            response = requests.get(
-                f"{NominatimGeocoding.BASE_URL}/search",
-                params=params,
-                headers=headers,
-                timeout=5
+            name = await geocoding_cache.single_flight(
+                f"reverse:{key}",
+                lambda: NominatimGeocoding._request_reverse(lat, lon)
             )
-            response.raise_for_status()
-            results = response.json()
-            
-            locations = []
-            for result in results:
-                locations.append({
-                    "display_name": result.get("display_name", ""),
-                    "lat": float(result.get("lat", 0)),
-                    "lon": float(result.get("lon", 0)),
-                    "type": result.get("type", ""),
-                    "importance": result.get("importance", 0)
-                })
-            
-            return locations
+            geocoding_cache.store_reverse(key, name)
+            return name
             
         except Exception as e:
-            print(f"Geocoding error: {e}")
-            return []
+            print(f"Reverse geocoding error: {e}")
+            return None
     
     @staticmethod
-    def reverse_geocode(lat: float, lon: float) -> Optional[str]:
-        """
-        Convert coordinates to location name (reverse geocoding)
-        """
+    async def _request_reverse(lat: float, lon: float) -> Optional[str]:
+        """Query Nominatim /reverse directly; raises on upstream errors"""
         params = {
             "lat": lat,
             "lon": lon,
@@ -66,18 +105,13 @@ class NominatimGeocoding:
             "User-Agent": "PathPredict/1.0"
         }
         
-        try:
-            response = requests.get(
-                f"{NominatimGeocoding.BASE_URL}/reverse",
-                params=params,
-                headers=headers,
-                timeout=5
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            return result.get("display_name", None)
-            
-        except Exception as e:
-            print(f"Reverse geocoding error: {e}")
-            return None
\ No newline at end of file
+        response = await upstream_clients.get(
+            "nominatim",
+            f"{NominatimGeocoding.BASE_URL}/reverse",
+            params=params,
+            headers=headers
+        )
+        response.raise_for_status()
+        result = response.json()
+        
+        return result.get("display_name", None)
\ No newline at end of file
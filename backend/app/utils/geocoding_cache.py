@@ -0,0 +1,241 @@
+import asyncio
+import bisect
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from .metrics import register_cache
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 7) -> str:
+    """Standard base32 geohash; precision 7 is a ~150m cell"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value_range, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            value_range[0] = mid
+        else:
+            bits <<= 1
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self, max_wait: float) -> bool:
+        """Take one token, waiting up to max_wait seconds; False if none became available"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        deadline = time.monotonic() + max_wait
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+                if now + wait > deadline:
+                    return False
+                await asyncio.sleep(wait)
+
+
+class GeocodingCache:
+    """
+    Server-side tier in front of Nominatim.
+
+    Search results are kept in a TTL+LRU cache with a sorted prefix index, so
+    a query such as "lond" can be answered by filtering cached "london"
+    results when they are at least as many as requested. Reverse lookups are
+    cached per geohash cell. Identical in-flight lookups share one upstream
+    call, and upstream calls pass through a token bucket that enforces
+    Nominatim's usage policy (about 1 request/second).
+
+    The cache and the bucket live in one process. With several uvicorn
+    workers each gets rate / workers, so together they stay within the
+    policy.
+    """
+
+    def __init__(self, ttl_seconds: float = 24 * 3600, max_entries: int = 10000,
+                 rate: float = 1.0, burst: float = 1, max_wait: float = 3.0,
+                 geohash_precision: int = 7, workers: int = 1):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_wait = max_wait
+        self.geohash_precision = geohash_precision
+        self.limiter = TokenBucket(rate / max(workers, 1), burst)
+
+        # query -> (expires_at, limit requested upstream, results)
+        self._search: "OrderedDict[str, Tuple[float, int, List[Dict]]]" = OrderedDict()
+        self._sorted_queries: List[str] = []
+        # geohash -> (expires_at, display name)
+        self._reverse: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.throttled = 0
+
+    @classmethod
+    def from_env(cls) -> "GeocodingCache":
+        """
+        Build a cache from GEOCODING_* / NOMINATIM_* environment variables
+        (NOMINATIM_RATE is shared by the WEB_CONCURRENCY uvicorn workers)
+        """
+        return cls(
+            ttl_seconds=float(os.getenv("GEOCODING_CACHE_TTL", str(24 * 3600))),
+            max_entries=int(os.getenv("GEOCODING_CACHE_MAX_ENTRIES", "10000")),
+            rate=float(os.getenv("NOMINATIM_RATE", "1.0")),
+            burst=float(os.getenv("NOMINATIM_BURST", "1")),
+            max_wait=float(os.getenv("NOMINATIM_MAX_WAIT", "3")),
+            geohash_precision=int(os.getenv("REVERSE_GEOHASH_PRECISION", "7")),
+            workers=int(os.getenv("WEB_CONCURRENCY") or "1")
+        )
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def matches(query: str, result: Dict) -> bool:
+        """True if every word of query prefixes some word of the result's name"""
+        words = GeocodingCache.normalize(result.get("display_name", "").replace(",", " ")).split()
+        return all(any(word.startswith(token) for word in words) for token in query.split())
+
+    def lookup_search(self, query: str, limit: int) -> Optional[List[Dict]]:
+        """
+        Exact cache hit, else results of cached longer queries that this one
+        prefixes. A longer query narrows the results, so they answer the
+        shorter one only when they fill limit; otherwise the shorter query
+        goes upstream
+        """
+        now = time.time()
+        entry = self._search.get(query)
+        if entry is not None and entry[0] > now and (entry[1] >= limit or len(entry[2]) < entry[1]):
+            self._search.move_to_end(query)
+            self.hits += 1
+            return entry[2][:limit]
+
+        position = bisect.bisect_left(self._sorted_queries, query)
+        candidates: List[Dict] = []
+        seen = set()
+        while position < len(self._sorted_queries) and self._sorted_queries[position].startswith(query):
+            cached_query = self._sorted_queries[position]
+            position += 1
+            cached = self._search.get(cached_query)
+            if cached_query == query or cached is None or cached[0] <= now:
+                continue
+            for result in cached[2]:
+                name = result.get("display_name")
+                if name not in seen and self.matches(query, result):
+                    seen.add(name)
+                    candidates.append(result)
+
+        if len(candidates) >= limit:
+            self.prefix_hits += 1
+            candidates.sort(key=lambda r: r.get("importance", 0) or 0, reverse=True)
+            return candidates[:limit]
+
+        self.misses += 1
+        return None
+
+    def store_search(self, query: str, limit: int, results: List[Dict]) -> None:
+        if query not in self._search:
+            bisect.insort(self._sorted_queries, query)
+        self._search[query] = (time.time() + self.ttl_seconds, limit, results)
+        self._search.move_to_end(query)
+        while len(self._search) > self.max_entries:
+            evicted, _ = self._search.popitem(last=False)
+            index = bisect.bisect_left(self._sorted_queries, evicted)
+            if index < len(self._sorted_queries) and self._sorted_queries[index] == evicted:
+                del self._sorted_queries[index]
+
+    def reverse_key(self, latitude: float, longitude: float) -> str:
+        return geohash_encode(latitude, longitude, self.geohash_precision)
+
+    def lookup_reverse(self, key: str) -> Tuple[bool, Optional[str]]:
+        entry = self._reverse.get(key)
+        if entry is not None and entry[0] > time.time():
+            self._reverse.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+        self.misses += 1
+        return False, None
+
+    def store_reverse(self, key: str, name: Optional[str]) -> None:
+        self._reverse[key] = (time.time() + self.ttl_seconds, name)
+        self._reverse.move_to_end(key)
+        while len(self._reverse) > self.max_entries:
+            self._reverse.popitem(last=False)
+
+    async def single_flight(self, key: str, fetcher: Callable[[], Awaitable]):
+        """
+        Run fetcher once per key at a time; concurrent callers await the same result.
+        The upstream call waits for a rate-limit token and raises if none arrives in time.
+        """
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            if not await self.limiter.acquire(self.max_wait):
+                self.throttled += 1
+                raise RuntimeError("Nominatim rate limit reached, try again shortly")
+            result = await fetcher()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged as "never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "prefix_hits": self.prefix_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "throttled": self.throttled,
+            "search_entries": len(self._search),
+            "reverse_entries": len(self._reverse)
+        }
+
+
+geocoding_cache = GeocodingCache.from_env()
+
+register_cache("geocoding", geocoding_cache.stats)
@@ -0,0 +1,67 @@
+from typing import Iterable, Optional
+import math
+import numpy as np
+
+# Meters per pixel at zoom 0 on the equator for 256px Web Mercator tiles
+_METERS_PER_PIXEL_Z0 = 156543.03392
+
+
+class RouteGeometry:
+    @staticmethod
+    def tolerance_for_zoom(zoom: float, latitude: float = 0.0, pixels: float = 1.0) -> float:
+        """Simplification tolerance in meters that is invisible at the given map zoom"""
+        return pixels * _METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+    @staticmethod
+    def simplify_indices(coordinates, tolerance: float, keep: Optional[Iterable[int]] = None) -> np.ndarray:
+        """
+        Douglas-Peucker simplification of a [lon, lat] line
+        tolerance: Maximum deviation in meters
+        keep: Vertex indices that must survive (e.g. segment boundaries)
+        Returns the sorted indices of the vertices to keep
+        """
+        coords = np.asarray(coordinates, dtype=float)
+        count = len(coords)
+        if count <= 2 or tolerance <= 0:
+            return np.arange(count)
+
+        # Local equirectangular projection to meters is plenty for a pixel-level tolerance
+        mean_lat = math.radians(float(np.mean(coords[:, 1])))
+        x = coords[:, 0] * 111320.0 * math.cos(mean_lat)
+        y = coords[:, 1] * 110540.0
+
+        anchors = {0, count - 1}
+        if keep is not None:
+            anchors.update(int(i) for i in keep if 0 <= int(i) < count)
+        anchors = sorted(anchors)
+
+        kept = np.zeros(count, dtype=bool)
+        kept[anchors] = True
+
+        stack = list(zip(anchors[:-1], anchors[1:]))
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+            dx = x[last] - x[first]
+            dy = y[last] - y[first]
+            px = x[first + 1:last] - x[first]
+            py = y[first + 1:last] - y[first]
+            length = math.hypot(dx, dy)
+            if length == 0:
+                distances = np.hypot(px, py)
+            else:
+                distances = np.abs(px * dy - py * dx) / length
+            furthest = int(np.argmax(distances))
+            if distances[furthest] > tolerance:
+                split = first + 1 + furthest
+                kept[split] = True
+                stack.append((first, split))
+                stack.append((split, last))
+
+        return np.flatnonzero(kept)
+
+    @staticmethod
+    def remap_indices(indices: np.ndarray, kept: np.ndarray) -> np.ndarray:
+        """Translate kept vertex indices of the full line into indices of the simplified line"""
+        return np.searchsorted(kept, np.asarray(indices, dtype=np.int64))
@@ -0,0 +1,256 @@
+import asyncio
+import os
+import time
+from typing import Dict
+import httpx
+from .metrics import (UPSTREAM_ERRORS, UPSTREAM_HEDGES, UPSTREAM_RETRIES, UPSTREAM_SECONDS,
+                      UPSTREAM_SHORT_CIRCUITS, current_request_id, registry)
+from .resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, backoff_delay
+
+# Resilience defaults shared by all upstreams:
+#   timeout_percentile/timeout_multiplier/min_timeout: once enough calls have been
+#     seen, a call is abandoned after multiplier x that latency percentile (never
+#     below min_timeout, never above the upstream's timeout)
+#   hedge/hedge_percentile/hedge_max_ratio: GETs still running after that latency
+#     percentile get a duplicate request, for at most that fraction of calls
+#   retries/retry_base/retry_cap: GETs that fail with a transport error, timeout,
+#     or one of the upstream's retry_statuses are retried after a jittered
+#     exponential backoff
+#   breaker_failures/breaker_reset: consecutive failures that open the circuit,
+#     and seconds before a probe call is let through
+RESILIENCE = {
+    "timeout_percentile": 99.0, "timeout_multiplier": 3.0, "min_timeout": 1.0,
+    "hedge": 0, "hedge_percentile": 95.0, "hedge_max_ratio": 0.1,
+    "retries": 2, "retry_base": 0.1, "retry_cap": 2.0,
+    "breaker_failures": 5, "breaker_reset": 30.0
+}
+
+# Per-upstream defaults; each can be overridden with UPSTREAM_<NAME>_<KEY>
+# environment variables, e.g. UPSTREAM_OPENMETEO_TIMEOUT or UPSTREAM_NOMINATIM_RETRIES.
+# Hedging is off for OpenRouteService (POST, metered) and Nominatim (1 request/s policy).
+# Nominatim is not retried on 429: a quick retry would bypass the geocoding rate limiter.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+UPSTREAMS = {
+    "openmeteo": {**RESILIENCE, "timeout": 10.0, "concurrency": 8, "hedge": 1},
+    "openroute": {**RESILIENCE, "timeout": 15.0, "concurrency": 4},
+    "nominatim": {**RESILIENCE, "timeout": 5.0, "concurrency": 2, "retries": 1,
+                  "retry_statuses": RETRY_STATUSES - {429}}
+}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class UpstreamClients:
+    """
+    Shared async HTTP clients, one keep-alive pool per upstream.
+
+    Clients are created at app startup (or lazily on first use) and closed at
+    shutdown. Every call goes through a per-upstream semaphore so fan-out over
+    segments stays within a bounded number of concurrent upstream requests,
+    and through the upstream's circuit breaker, adaptive timeout, hedging and
+    retry policy (see RESILIENCE).
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.latency = {name: LatencyTracker() for name in UPSTREAMS}
+        self.breakers = {
+            name: CircuitBreaker(name, int(self.setting(name, "breaker_failures")), self.setting(name, "breaker_reset"))
+            for name in UPSTREAMS
+        }
+        self._calls = {name: 0 for name in UPSTREAMS}
+        self._hedge_counts = {name: 0 for name in UPSTREAMS}
+
+    @staticmethod
+    def setting(name: str, key: str) -> float:
+        default = UPSTREAMS[name][key]
+        return float(os.getenv(f"UPSTREAM_{name.upper()}_{key.upper()}", default))
+
+    def client(self, name: str) -> httpx.AsyncClient:
+        """Return the pooled client for an upstream, creating it if needed"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            use_http2 = os.getenv("HTTP2", "1") != "0" and _http2_available()
+            client = httpx.AsyncClient(
+                http2=use_http2,
+                timeout=httpx.Timeout(self.setting(name, "timeout")),
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "20")),
+                    max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "10")),
+                    keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+                ),
+                headers={"User-Agent": "PathPredict/1.0"}
+            )
+            self._clients[name] = client
+        return client
+
+    def limit(self, name: str) -> asyncio.Semaphore:
+        """Concurrency limit for an upstream"""
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, int(self.setting(name, "concurrency"))))
+            self._semaphores[name] = semaphore
+        return semaphore
+
+    def timeout(self, name: str) -> float:
+        """Adaptive per-attempt timeout: a multiple of recent tail latency, capped by the configured timeout"""
+        configured = self.setting(name, "timeout")
+        tail = self.latency[name].percentile(self.setting(name, "timeout_percentile"))
+        if tail is None:
+            return configured
+        return min(configured, max(self.setting(name, "min_timeout"), tail * self.setting(name, "timeout_multiplier")))
+
+    async def request(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Call an upstream within its concurrency limit, forwarding the current
+        request ID and recording latency and errors. Raises CircuitOpenError
+        without calling when the upstream's breaker is open; GETs are hedged
+        and retried per the upstream's settings.
+        """
+        request_id = current_request_id()
+        if request_id:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "X-Request-ID": request_id}
+
+        breaker = self.breakers[name]
+        idempotent = method == "GET"
+        retries = int(self.setting(name, "retries")) if idempotent else 0
+        retry_statuses = UPSTREAMS[name].get("retry_statuses", RETRY_STATUSES)
+        self._calls[name] += 1
+
+        for attempt in range(retries + 1):
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                UPSTREAM_SHORT_CIRCUITS.inc(upstream=name)
+                raise
+
+            last = attempt == retries
+            try:
+                if idempotent and self.setting(name, "hedge"):
+                    response = await self._hedged(name, method, url, **kwargs)
+                else:
+                    response = await self._attempt(name, method, url, **kwargs)
+            except (httpx.TransportError, asyncio.TimeoutError):
+                breaker.record(False)
+                if last:
+                    raise
+            except asyncio.CancelledError:
+                # Says nothing about the upstream, but must not leave a half-open probe outstanding
+                breaker.abandon()
+                raise
+            except Exception:
+                breaker.record(False)
+                raise
+            else:
+                failed = response.status_code in RETRY_STATUSES
+                breaker.record(not failed)
+                if response.status_code not in retry_statuses or last:
+                    return response
+
+            UPSTREAM_RETRIES.inc(upstream=name)
+            await asyncio.sleep(backoff_delay(attempt, self.setting(name, "retry_base"), self.setting(name, "retry_cap")))
+
+    async def _attempt(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """One upstream call under the concurrency limit and the adaptive timeout"""
+        async with self.limit(name):
+            start = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    self.client(name).request(method, url, **kwargs), timeout=self.timeout(name)
+                )
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(upstream=name, reason=type(e).__name__)
+                raise
+            finally:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - start, upstream=name, method=method)
+
+        if response.status_code >= 400:
+            UPSTREAM_ERRORS.inc(upstream=name, reason=f"http_{response.status_code}")
+        if response.status_code < 500:
+            self.latency[name].observe(time.perf_counter() - start)
+        return response
+
+    async def _hedged(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a second, identical request if the first is slower than the hedge
+        percentile, and return whichever answers first
+        """
+        delay = self.latency[name].percentile(self.setting(name, "hedge_percentile"))
+        within_budget = self._hedge_counts[name] < self._calls[name] * self.setting(name, "hedge_max_ratio")
+        if delay is None or not within_budget:
+            return await self._attempt(name, method, url, **kwargs)
+
+        primary = asyncio.create_task(self._attempt(name, method, url, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self._hedge_counts[name] += 1
+        hedge = asyncio.create_task(self._attempt(name, method, url, **kwargs))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # A failed attempt only counts if the other one fails too
+                for task in sorted(done, key=lambda task: task.exception() is not None):
+                    if task.exception() is None or not pending:
+                        UPSTREAM_HEDGES.inc(upstream=name, winner="hedge" if task is hedge else "primary")
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def status(self) -> Dict:
+        """Breaker state, adaptive timeout and recent latency per upstream"""
+        status = {}
+        for name in UPSTREAMS:
+            tracker = self.latency[name]
+            p50, p95 = tracker.percentile(50), tracker.percentile(95)
+            status[name] = {
+                "breaker": self.breakers[name].status(),
+                "timeout": round(self.timeout(name), 3),
+                "latency_samples": len(tracker),
+                "p50": None if p50 is None else round(p50, 3),
+                "p95": None if p95 is None else round(p95, 3),
+                "calls": self._calls[name],
+                "hedged": self._hedge_counts[name]
+            }
+        return status
+
+    async def get(self, name: str, url: str, **kwargs) -> httpx.Response:
+        return await self.request(name, "GET", url, **kwargs)
+
+    async def post(self, name: str, url: str, **kwargs) -> httpx.Response:
+        return await self.request(name, "POST", url, **kwargs)
+
+    async def start(self) -> None:
+        """Open a client per upstream (called at app startup)"""
+        for name in UPSTREAMS:
+            self.client(name)
+
+    async def close(self) -> None:
+        """Close all pooled connections (called at app shutdown)"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._semaphores.clear()
+        for client in clients:
+            await client.aclose()
+
+
+upstream_clients = UpstreamClients()
+
+_BREAKER_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+registry.add_collector(lambda: [
+    ("upstream_circuit_state", "gauge", "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)",
+     [({"upstream": name}, _BREAKER_STATES[breaker.state]) for name, breaker in upstream_clients.breakers.items()]),
+    ("upstream_timeout_seconds", "gauge", "Current adaptive per-attempt timeout per upstream",
+     [({"upstream": name}, upstream_clients.timeout(name)) for name in UPSTREAMS])
+])
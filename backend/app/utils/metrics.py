@@ -0,0 +1,311 @@
+import bisect
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cache hit to a slow Prophet fit
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+def current_request_id() -> Optional[str]:
+    """ID of the request being served on this task, if any"""
+    return request_id_var.get()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels; observe() is a bisect and three additions"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block (also around awaits)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        samples = []
+        for key, counts, total, count in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+# A collector returns (name, type, help, [(labels, value), ...]) families at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text exposition format.
+
+    Hot paths only touch counters and histograms owned here. Components that
+    already keep their own counters (the caches) are read by collectors when
+    /metrics is scraped, so they cost nothing per request.
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Collector] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        # Several collectors may report the same family (e.g. one per cache)
+        families: Dict[str, Tuple[str, str, List]] = {}
+        for collector in self._collectors:
+            try:
+                for name, kind, help_text, samples in collector():
+                    families.setdefault(name, (kind, help_text, []))[2].extend(samples)
+            except Exception as e:
+                logger.exception("Metrics collector failed: %r", e)
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time to serve an API request", ("method", "route", "status")
+)
+STAGE_SECONDS = registry.histogram(
+    "pipeline_stage_duration_seconds", "Time spent in each stage of a route plan or forecast", ("stage",)
+)
+STAGE_ERRORS = registry.counter(
+    "pipeline_stage_errors_total", "Pipeline stages that failed and were answered with fallbacks", ("stage",)
+)
+UPSTREAM_SECONDS = registry.histogram(
+    "upstream_request_duration_seconds", "Latency of calls to external APIs", ("upstream", "method")
+)
+UPSTREAM_ERRORS = registry.counter(
+    "upstream_errors_total", "Failed calls to external APIs by reason", ("upstream", "reason")
+)
+UPSTREAM_RETRIES = registry.counter(
+    "upstream_retries_total", "Upstream GETs retried after a failure", ("upstream",)
+)
+UPSTREAM_HEDGES = registry.counter(
+    "upstream_hedged_requests_total", "Slow upstream GETs duplicated, by which attempt answered", ("upstream", "winner")
+)
+UPSTREAM_SHORT_CIRCUITS = registry.counter(
+    "upstream_short_circuits_total", "Upstream calls refused because the circuit breaker was open", ("upstream",)
+)
+STALE_SERVED = registry.counter(
+    "stale_cache_served_total", "Expired cache entries served because the upstream failed", ("cache",)
+)
+RESPONSE_NOT_MODIFIED = registry.counter(
+    "response_not_modified_total", "Conditional requests answered with 304 Not Modified", ("endpoint",)
+)
+PROPHET_FALLBACKS = registry.counter(
+    "prophet_fallbacks_total", "Prophet predictions replaced by the raw hourly forecast", ("reason",)
+)
+
+PREFETCH_ITEMS = registry.counter(
+    "prefetch_items_total", "Popular cells, routes and model fits refreshed in the background", ("kind", "outcome")
+)
+
+
+def stage(name: str):
+    """Time a pipeline stage: with stage("weather"): ..."""
+    return STAGE_SECONDS.time(stage=name)
+
+
+# Cache stats() keys -> (family, extra labels)
+_CACHE_STAT_FAMILIES = {
+    "hits": ("cache_hits_total", {"tier": "memory"}),
+    "disk_hits": ("cache_hits_total", {"tier": "disk"}),
+    "db_hits": ("cache_hits_total", {"tier": "disk"}),
+    "previous_run_hits": ("cache_hits_total", {"tier": "previous_run"}),
+    "prefix_hits": ("cache_hits_total", {"tier": "prefix"}),
+    "misses": ("cache_misses_total", {}),
+    "evictions": ("cache_evictions_total", {}),
+    "disk_evictions": ("cache_evictions_total", {"tier": "disk"}),
+    "errors": ("cache_errors_total", {}),
+    "coalesced": ("cache_coalesced_total", {}),
+    "entries": ("cache_entries", {}),
+    "hot_entries": ("cache_entries", {}),
+    "search_entries": ("cache_entries", {"kind": "search"}),
+    "reverse_entries": ("cache_entries", {"kind": "reverse"})
+}
+_CACHE_FAMILY_HELP = {
+    "cache_hits_total": ("counter", "Cache lookups answered from the cache"),
+    "cache_misses_total": ("counter", "Cache lookups that went upstream"),
+    "cache_evictions_total": ("counter", "Entries evicted to stay within size limits"),
+    "cache_errors_total": ("counter", "Failed reads and writes of a cache's storage"),
+    "cache_coalesced_total": ("counter", "Lookups that joined an identical in-flight upstream call"),
+    "cache_entries": ("gauge", "Entries currently held")
+}
+
+
+def register_cache(name: str, stats: Callable[[], Dict]) -> None:
+    """Expose a cache's stats() counters as cache_* metrics labelled cache=name"""
+    def collect():
+        families: Dict[str, List] = {}
+        for key, value in stats().items():
+            if key in _CACHE_STAT_FAMILIES:
+                family, labels = _CACHE_STAT_FAMILIES[key]
+                families.setdefault(family, []).append(({"cache": name, **labels}, value))
+        return [(family, *_CACHE_FAMILY_HELP[family], samples) for family, samples in families.items()]
+
+    registry.add_collector(collect)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: assigns each request an ID (taken from X-Request-ID when
+    the caller sends a sane one), echoes it on the response, makes it
+    available to upstream calls, and records request latency per route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[Callable, str] = {}
+
+    def _route_label(self, scope) -> str:
+        # Label by route template, not raw path, to keep cardinality bounded
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            app = scope.get("app")
+            path = next(
+                (route.path for route in getattr(app, "routes", []) if getattr(route, "endpoint", None) is endpoint),
+                getattr(endpoint, "__name__", "unknown")
+            )
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming if _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        status = [500]
+        start = time.perf_counter()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"], route=self._route_label(scope), status=str(status[0])
+            )
+            request_id_var.reset(token)
@@ -1,39 +1,195 @@
-import requests
-from datetime import datetime, timedelta
-from typing import List, Dict
+import asyncio
+import logging
+import os
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
+from .http_client import upstream_clients
+from .weather_cache import weather_cache
+from .prefetcher import prefetcher
+from .metrics import STALE_SERVED, UPSTREAM_ERRORS
+
+logger = logging.getLogger(__name__)
 
 class OpenMeteoAPI:
-    BASE_URL = "https://api.open-meteo.com/v1/forecast"
+    BASE_URL = os.getenv("OPENMETEO_BASE_URL", "https://api.open-meteo.com/v1/forecast")
+    HOURLY_VARIABLES = "temperature_2m,precipitation,windspeed_10m,weathercode"
+    # Open-Meteo accepts comma-separated coordinate lists; keep each batch small
+    # enough that the query string stays well under common URL length limits.
+    MAX_BATCH_SIZE = 100
+    # Widest UTC offsets a location can have (hours behind, hours ahead)
+    UTC_OFFSET_RANGE = (12, 14)
+    # Response field names -> Open-Meteo hourly variable names
+    METRIC_KEYS = {
+        "temperature": "temperature_2m",
+        "precipitation": "precipitation",
+        "windspeed": "windspeed_10m",
+        "weathercode": "weathercode"
+    }
+    
+    @staticmethod
+    async def fetch_weather(latitude: float, longitude: float, start_time: datetime = None) -> Dict:
+        """Fetch weather forecast from Open-Meteo API (served from the weather cache when warm)"""
+        return (await OpenMeteoAPI.fetch_weather_batch([(latitude, longitude)], start_time))[0]
+    
+    @staticmethod
+    async def fetch_weather_batch(points: List[Tuple[float, float]], start_time: datetime = None,
+                                  use_cache: bool = True) -> List[Optional[Dict]]:
+        """
+        Fetch weather forecasts for many locations in as few requests as possible
+        points: List of (latitude, longitude) pairs
+        use_cache: Snap points to weather cache cells and only fetch the cold ones
+        Returns one entry per input point, in the same order (None where a fetch failed)
+        """
+        if not points:
+            return []
+        
+        if not use_cache:
+            return await OpenMeteoAPI._request_locations(points)
+        
+        cells = [weather_cache.cell_for(lat, lon) for lat, lon in points]
+        prefetcher.record_cells(cells)
+        resolved = await weather_cache.get_or_fetch_many(cells, OpenMeteoAPI._request_locations)
+        return OpenMeteoAPI._fill_stale(cells, resolved)
+    
+    @staticmethod
+    async def fetch_forecast_window(points: List[Tuple[float, float]], start_time: datetime,
+                                    hours: int) -> List[Optional[Dict]]:
+        """
+        Fetch only the hours [start_time, start_time + hours) for many locations
+        points: List of (latitude, longitude) pairs
+        start_time: Naive local wall-clock time at each location, or an aware
+        time (the same instant everywhere); rounded down to the hour
+        hours: Number of hourly steps to return
+        Returns one entry per input point (None where a fetch failed). Hourly
+        times are unix seconds; add utc_offset_seconds for local wall-clock time.
+        """
+        if not points:
+            return []
+        
+        if start_time.tzinfo is None:
+            start_hour = start_time.replace(minute=0, second=0, microsecond=0)
+            end_hour = start_hour + timedelta(hours=hours - 1)
+            window_key = (int((start_hour - datetime(1970, 1, 1)).total_seconds() // 3600), hours)
+        else:
+            # Open-Meteo reads start_hour/end_hour in each location's own time (timezone=auto),
+            # whose offset is only known from the payload: ask for the window padded by the
+            # widest offsets and trim it to the instant range once the payload is back
+            utc_hour = start_time.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+            behind, ahead = OpenMeteoAPI.UTC_OFFSET_RANGE
+            start_hour = utc_hour - timedelta(hours=behind)
+            end_hour = utc_hour + timedelta(hours=hours - 1 + ahead)
+            window_key = (int((utc_hour - datetime(1970, 1, 1)).total_seconds() // 3600), hours, "utc")
+        window = {
+            "start_hour": start_hour.strftime("%Y-%m-%dT%H:%M"),
+            "end_hour": end_hour.strftime("%Y-%m-%dT%H:%M"),
+            "timeformat": "unixtime"
+        }
+        
+        # Windowed payloads share the weather cache, qualified by their window
+        cells = [weather_cache.cell_for(lat, lon) + window_key for lat, lon in points]
+        
+        async def fetch(missing):
+            return await OpenMeteoAPI._request_locations([cell[:2] for cell in missing], window)
+        
+        resolved = await weather_cache.get_or_fetch_many(cells, fetch)
+        payloads = OpenMeteoAPI._fill_stale(cells, resolved)
+        if start_time.tzinfo is None:
+            return payloads
+        start_epoch = window_key[0] * 3600
+        return [OpenMeteoAPI._trim_window(payload, start_epoch, start_epoch + hours * 3600) for payload in payloads]
+    
+    @staticmethod
+    def _trim_window(weather_data: Optional[Dict], start_epoch: int, end_epoch: int) -> Optional[Dict]:
+        """A unixtime payload cut down to the hours in [start_epoch, end_epoch)"""
+        if not weather_data:
+            return weather_data
+        hourly = weather_data.get("hourly", {})
+        times = hourly.get("time", [])
+        keep = [i for i, t in enumerate(times) if start_epoch <= t < end_epoch]
+        if not keep:
+            return {**weather_data, "hourly": {name: [] for name in hourly}}
+        first, last = keep[0], keep[-1] + 1
+        trimmed = {name: values[first:last] if isinstance(values, list) else values for name, values in hourly.items()}
+        return {**weather_data, "hourly": trimmed}
+    
+    @staticmethod
+    def _fill_stale(cells: List[Tuple], resolved: Dict) -> List[Optional[Dict]]:
+        """Payloads in cell order, falling back to an older cached run where the fetch failed"""
+        payloads = []
+        for cell in cells:
+            payload = resolved.get(cell)
+            if payload is None:
+                payload = weather_cache.stale(cell)
+                if payload is not None:
+                    STALE_SERVED.inc(cache="weather")
+            payloads.append(payload)
+        return payloads
     
     @staticmethod
-    def fetch_weather(latitude: float, longitude: float, start_time: datetime = None) -> Dict:
-        """Fetch weather forecast from Open-Meteo API"""
-        if start_time is None:
-            start_time = datetime.now()
+    async def _request_locations(points: List[Tuple[float, float]],
+                                 extra_params: Optional[Dict] = None) -> List[Optional[Dict]]:
+        """Request hourly forecasts for the given points straight from Open-Meteo"""
+        # Identical points (e.g. repeated segment centers) are only requested once
+        unique_points = list(dict.fromkeys((float(lat), float(lon)) for lat, lon in points))
+        chunks = [
+            unique_points[i:i + OpenMeteoAPI.MAX_BATCH_SIZE]
+            for i in range(0, len(unique_points), OpenMeteoAPI.MAX_BATCH_SIZE)
+        ]
         
-        end_time = start_time + timedelta(days=7)
+        fetched = {}
+        for chunk, locations in zip(chunks, await asyncio.gather(
+            *(OpenMeteoAPI._request_chunk(c, extra_params) for c in chunks)
+        )):
+            for point, location in zip(chunk, locations):
+                fetched[point] = location
         
+        return [fetched[(float(lat), float(lon))] for lat, lon in points]
+    
+    @staticmethod
+    async def _request_chunk(chunk: List[Tuple[float, float]], extra_params: Optional[Dict] = None) -> List[Optional[Dict]]:
+        """One multi-location Open-Meteo request"""
         params = {
-            "latitude": latitude,
-            "longitude": longitude,
-            "hourly": "temperature_2m,precipitation,windspeed_10m,weathercode",
-            "timezone": "auto"
+            "latitude": ",".join(str(lat) for lat, _ in chunk),
+            "longitude": ",".join(str(lon) for _, lon in chunk),
+            "hourly": OpenMeteoAPI.HOURLY_VARIABLES,
+            "timezone": "auto",
+            **(extra_params or {})
         }
         
         try:
-            response = requests.get(OpenMeteoAPI.BASE_URL, params=params, timeout=10)
+            response = await upstream_clients.get("openmeteo", OpenMeteoAPI.BASE_URL, params=params)
             response.raise_for_status()
+        except Exception as e:
+            # Already counted in upstream_errors_total by the client
+            logger.warning("Error fetching weather data for %d locations: %r", len(chunk), e)
+            return [None] * len(chunk)
+        
+        try:
             data = response.json()
             
-            return {
-                "hourly": data.get("hourly", {}),
-                "latitude": data.get("latitude"),
-                "longitude": data.get("longitude"),
-                "timezone": data.get("timezone")
-            }
+            # A single location comes back as an object, several as a list
+            if isinstance(data, dict):
+                data = [data]
+            if len(data) != len(chunk):
+                raise ValueError(f"expected {len(chunk)} locations, got {len(data)}")
+            
+            return [OpenMeteoAPI._parse_location(location) for location in data]
         except Exception as e:
-            print(f"Error fetching weather data: {e}")
-            return None
+            UPSTREAM_ERRORS.inc(upstream="openmeteo", reason="invalid_response")
+            logger.warning("Unusable Open-Meteo response for %d locations: %r", len(chunk), e)
+            return [None] * len(chunk)
+    
+    @staticmethod
+    def _parse_location(data: Dict) -> Dict:
+        """Reduce a single-location Open-Meteo response to the fields we use"""
+        return {
+            "hourly": data.get("hourly", {}),
+            "latitude": data.get("latitude"),
+            "longitude": data.get("longitude"),
+            "timezone": data.get("timezone"),
+            "utc_offset_seconds": data.get("utc_offset_seconds")
+        }
     
     @staticmethod
     def get_weather_at_time(weather_data: Dict, target_time: datetime) -> Dict:
@@ -66,4 +222,38 @@ class OpenMeteoAPI:
                     "weathercode": hourly.get("weathercode", [None])[i]
                 }
         
-        return None
\ No newline at end of file
+        return None
+    
+    @staticmethod
+    def get_weather_matrix(weather_batch: List[Optional[Dict]], eta_seconds: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Vectorized get_weather_at_time over many arrival times per location
+        weather_batch: One Open-Meteo payload per location (column)
+        eta_seconds: (departures x locations) array of naive epoch seconds
+        Returns (departures x locations) float arrays per metric, NaN where no hour matches
+        """
+        eta_seconds = np.asarray(eta_seconds, dtype=float)
+        rows, cols = eta_seconds.shape
+        # Hour the conditions are read from, in minutes since the epoch
+        target_minutes = (np.floor(eta_seconds / 3600) * 60).astype(np.int64)
+        
+        matrix = {name: np.full((rows, cols), np.nan) for name in OpenMeteoAPI.METRIC_KEYS}
+        
+        for col, weather_data in enumerate(weather_batch):
+            if not weather_data or "hourly" not in weather_data:
+                continue
+            hourly = weather_data["hourly"]
+            times = hourly.get("time", [])
+            if not times:
+                continue
+            
+            hour_minutes = np.array(times, dtype="datetime64[m]").astype(np.int64)
+            idx = np.searchsorted(hour_minutes, target_minutes[:, col], side="left")
+            found = idx < len(hour_minutes)
+            
+            for name, hourly_key in OpenMeteoAPI.METRIC_KEYS.items():
+                series = np.array(hourly.get(hourly_key, []), dtype=float)
+                usable = found & (idx < len(series))
+                matrix[name][usable, col] = series[idx[usable]]
+        
+        return matrix
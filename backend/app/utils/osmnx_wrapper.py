@@ -1,17 +1,109 @@
-import requests
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
+import asyncio
 import os
+import numpy as np
+from .http_client import upstream_clients
+from .route_cache import route_cache
+from .prefetcher import prefetcher
+from .metrics import STALE_SERVED
 
 class OpenRouteServiceAPI:
-    BASE_URL = "https://api.openrouteservice.org/v2/directions/driving-car"
+    BASE_URL = os.getenv("OPENROUTE_BASE_URL", "https://api.openrouteservice.org/v2/directions/driving-car")
+    # "geojson" (coordinate arrays) or "polyline" (ORS /json with an encoded geometry, much smaller)
+    ROUTE_FORMAT = os.getenv("OPENROUTE_FORMAT", "geojson")
+    # Ask ORS for a third, elevation (meters) coordinate
+    ELEVATION = os.getenv("OPENROUTE_ELEVATION", "0") == "1"
+    # ORS encodes elevation with two decimals
+    ELEVATION_PRECISION = 2
+    # ORS returns at most three routes: the best one plus two alternatives. Alternatives
+    # may be up to WEIGHT_FACTOR times the best route's cost and share at most SHARE_FACTOR of it
+    MAX_ALTERNATIVES = 2
+    ALTERNATIVE_WEIGHT_FACTOR = float(os.getenv("OPENROUTE_ALTERNATIVE_WEIGHT_FACTOR", "1.4"))
+    ALTERNATIVE_SHARE_FACTOR = float(os.getenv("OPENROUTE_ALTERNATIVE_SHARE_FACTOR", "0.6"))
     
     @staticmethod
-    def get_route(start_coords: Tuple[float, float], end_coords: Tuple[float, float], api_key: str = None) -> Dict:
+    def profile() -> str:
+        """Routing profile, taken from the last path component of BASE_URL"""
+        return OpenRouteServiceAPI.BASE_URL.rstrip("/").rsplit("/", 1)[-1]
+    
+    @staticmethod
+    def cache_key(start_coords: Tuple[float, float], end_coords: Tuple[float, float]) -> str:
+        """Route cache key; routes with elevation are cached apart from 2D ones"""
+        profile = OpenRouteServiceAPI.profile()
+        if OpenRouteServiceAPI.ELEVATION:
+            profile += "+elevation"
+        return route_cache.key_for(start_coords, end_coords, profile)
+    
+    @staticmethod
+    async def get_route(start_coords: Tuple[float, float], end_coords: Tuple[float, float], api_key: str = None,
+                        use_cache: bool = True) -> Dict:
         """
         Get route from OpenRouteService using GeoJSON format
         start_coords: (longitude, latitude)
         end_coords: (longitude, latitude)
+        use_cache: Serve from / store into the persistent route cache
+        """
+        if not use_cache:
+            return await OpenRouteServiceAPI._request_route(start_coords, end_coords, api_key)
+        
+        key = OpenRouteServiceAPI.cache_key(start_coords, end_coords)
+        prefetcher.record_route(key, start_coords, end_coords)
+        cached = await asyncio.to_thread(route_cache.get, key)
+        if cached is not None:
+            return cached
+        
+        route = await OpenRouteServiceAPI._request_route(start_coords, end_coords, api_key)
+        if route:
+            await asyncio.to_thread(route_cache.put, key, route)
+        else:
+            # Upstream failed (or breaker open): an expired copy beats no route
+            route = await asyncio.to_thread(route_cache.get_stale, key)
+            if route is not None:
+                STALE_SERVED.inc(cache="route")
+        return route
+    
+    @staticmethod
+    async def get_routes(start_coords: Tuple[float, float], end_coords: Tuple[float, float], alternatives: int,
+                         api_key: str = None, use_cache: bool = True) -> Optional[List[Dict]]:
+        """
+        Get the route plus up to `alternatives` alternative routes (ORS may find fewer)
+        start_coords: (longitude, latitude)
+        end_coords: (longitude, latitude)
+        alternatives: Extra routes wanted, at most MAX_ALTERNATIVES
+        Returns routes in ORS order (the best first), or None
         """
+        alternatives = max(0, min(alternatives, OpenRouteServiceAPI.MAX_ALTERNATIVES))
+        if alternatives == 0:
+            route = await OpenRouteServiceAPI.get_route(start_coords, end_coords, api_key, use_cache)
+            return [route] if route else None
+        if not use_cache:
+            return await OpenRouteServiceAPI._request_routes(start_coords, end_coords, api_key, alternatives)
+        
+        key = f"{OpenRouteServiceAPI.cache_key(start_coords, end_coords)}+alternatives{alternatives}"
+        cached = await asyncio.to_thread(route_cache.get, key)
+        if cached is not None:
+            return cached["routes"]
+        
+        routes = await OpenRouteServiceAPI._request_routes(start_coords, end_coords, api_key, alternatives)
+        if routes:
+            await asyncio.to_thread(route_cache.put, key, {"routes": routes})
+        else:
+            cached = await asyncio.to_thread(route_cache.get_stale, key)
+            if cached is not None:
+                STALE_SERVED.inc(cache="route")
+                routes = cached["routes"]
+        return routes
+    
+    @staticmethod
+    async def _request_route(start_coords: Tuple[float, float], end_coords: Tuple[float, float], api_key: str = None) -> Dict:
+        """Request a route straight from OpenRouteService"""
+        routes = await OpenRouteServiceAPI._request_routes(start_coords, end_coords, api_key)
+        return routes[0] if routes else None
+    
+    @staticmethod
+    async def _request_routes(start_coords: Tuple[float, float], end_coords: Tuple[float, float], api_key: str = None,
+                              alternatives: int = 0) -> Optional[List[Dict]]:
+        """Request a route, and with alternatives > 0 its alternatives, straight from OpenRouteService"""
         if api_key is None:
             api_key = os.getenv("OPENROUTE_API_KEY")
             if api_key:
@@ -34,14 +126,27 @@ class OpenRouteServiceAPI:
                 [end_coords[0], end_coords[1]]
             ]
         }
+        if OpenRouteServiceAPI.ELEVATION:
+            body["elevation"] = True
+        if alternatives > 0:
+            body["alternative_routes"] = {
+                "target_count": alternatives + 1,
+                "weight_factor": OpenRouteServiceAPI.ALTERNATIVE_WEIGHT_FACTOR,
+                "share_factor": OpenRouteServiceAPI.ALTERNATIVE_SHARE_FACTOR
+            }
+        
+        if OpenRouteServiceAPI.ROUTE_FORMAT == "polyline":
+            return await OpenRouteServiceAPI._request_route_polyline(body, headers)
         
         try:
-            response = requests.post(OpenRouteServiceAPI.BASE_URL + "/geojson", json=body, headers=headers, timeout=15)
+            response = await upstream_clients.post(
+                "openroute", OpenRouteServiceAPI.BASE_URL + "/geojson", json=body, headers=headers
+            )
             response.raise_for_status()
             data = response.json()
             
-            if "features" in data and len(data["features"]) > 0:
-                feature = data["features"][0]
+            routes = []
+            for feature in data.get("features") or []:
                 geometry = feature.get("geometry", {})
                 properties = feature.get("properties", {})
                 summary = properties.get("summary", {})
@@ -49,39 +154,110 @@ class OpenRouteServiceAPI:
                 coordinates = geometry.get("coordinates", [])
                 if not coordinates:
                     print("No coordinates in response")
-                    return None
+                    continue
                 
-                return {
+                routes.append({
                     "geometry": geometry,
                     "distance": summary.get("distance", 0),
                     "duration": summary.get("duration", 0),
                     "coordinates": coordinates
-                }
+                })
+            return routes or None
+        except Exception as e:
+            print(f"Error fetching route: {e}")
             return None
+    
+    @staticmethod
+    async def _request_route_polyline(body: Dict, headers: Dict) -> Optional[List[Dict]]:
+        """Request routes from the ORS /json endpoint, whose geometries are encoded polylines"""
+        try:
+            response = await upstream_clients.post(
+                "openroute", OpenRouteServiceAPI.BASE_URL + "/json", json=body, headers=headers
+            )
+            response.raise_for_status()
+            
+            routes = []
+            for route in response.json().get("routes") or []:
+                if not route.get("geometry"):
+                    continue
+                summary = route.get("summary", {})
+                decoded = OpenRouteServiceAPI.decode_polyline_array(
+                    route["geometry"], dimensions=3 if body.get("elevation") else 2
+                )
+                # Polylines are [lat, lon(, elevation)]; the rest of the app uses GeoJSON order
+                decoded[:, [0, 1]] = decoded[:, [1, 0]]
+                coordinates = decoded.tolist()
+                
+                routes.append({
+                    "geometry": {"type": "LineString", "coordinates": coordinates},
+                    "distance": summary.get("distance", 0),
+                    "duration": summary.get("duration", 0),
+                    "coordinates": coordinates
+                })
+            return routes or None
         except Exception as e:
             print(f"Error fetching route: {e}")
             return None
     
     @staticmethod
     def decode_polyline(encoded: str) -> List[List[float]]:
-        """Decode polyline to coordinates"""
-        inv = 1.0 / 1e5
-        decoded = []
-        previous = [0, 0]
-        i = 0
+        """Decode polyline to [lat, lon] coordinates"""
+        return np.round(OpenRouteServiceAPI.decode_polyline_array(encoded), 6).tolist()
+    
+    @staticmethod
+    def decode_polyline_array(encoded: str, dimensions: int = 2, precision: int = 5,
+                              elevation_precision: int = ELEVATION_PRECISION) -> np.ndarray:
+        """
+        Decode a polyline in bulk into an (n, dimensions) float array
+        dimensions: 2 for [lat, lon], 3 for ORS polylines with [lat, lon, elevation]
+        precision: Decimal places of lat/lon (5 for standard polylines)
+        elevation_precision: Decimal places of the elevation
+        Raises ValueError for a truncated polyline
+        """
+        chars = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+        if chars.size == 0:
+            return np.empty((0, dimensions))
+        
+        # Each value is little-endian 5-bit chunks; a chunk below 0x20 ends it
+        ends = chars < 0x20
+        if not ends[-1]:
+            raise ValueError("Truncated polyline")
+        starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+        value_index = np.cumsum(np.concatenate(([0], ends[:-1].astype(np.int64))))
+        shifts = 5 * (np.arange(chars.size) - starts[value_index])
+        values = np.add.reduceat((chars & 0x1f) << shifts, starts)
+        # Zigzag-decode the deltas, then accumulate them per dimension
+        deltas = (values >> 1) ^ -(values & 1)
+        if deltas.size % dimensions:
+            raise ValueError("Truncated polyline")
         
-        while i < len(encoded):
-            ll = [0, 0]
-            for j in [0, 1]:
-                shift = 0
-                byte = 0x20
-                while byte >= 0x20:
-                    byte = ord(encoded[i]) - 63
-                    i += 1
-                    ll[j] |= (byte & 0x1f) << shift
-                    shift += 5
-                ll[j] = previous[j] + (~(ll[j] >> 1) if ll[j] & 1 else (ll[j] >> 1))
-                previous[j] = ll[j]
-            decoded.append([float('%.6f' % (ll[0] * inv)), float('%.6f' % (ll[1] * inv))])
+        coordinates = np.cumsum(deltas.reshape(-1, dimensions), axis=0).astype(float)
+        coordinates[:, :2] /= 10 ** precision
+        coordinates[:, 2:] /= 10 ** elevation_precision
+        return coordinates
+    
+    @staticmethod
+    def encode_polyline(coordinates, precision: int = 5, elevation_precision: Optional[int] = None) -> str:
+        """
+        Encode coordinate pairs as a polyline string (inverse of decode_polyline)
+        Pairs are encoded in the order given; use [lat, lon] for standard polylines
+        elevation_precision: Also encode a third (elevation) column, as ORS does
+        """
+        array = np.asarray(coordinates, dtype=float)
+        if len(array) == 0:
+            return ""
+        if elevation_precision is None:
+            values = np.round(array[:, :2] * (10 ** precision)).astype(np.int64)
+        else:
+            scale = np.array([10 ** precision, 10 ** precision, 10 ** elevation_precision], dtype=float)
+            values = np.round(array[:, :3] * scale).astype(np.int64)
+        deltas = np.diff(values, axis=0, prepend=np.zeros((1, values.shape[1]), dtype=np.int64))
         
-        return decoded
\ No newline at end of file
+        chunks = []
+        for value in deltas.ravel().tolist():
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        return "".join(chunks)
@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Hashable, List, Optional, Tuple
+from .metrics import PREFETCH_ITEMS, registry
+from .weather_cache import Cell, weather_cache
+
+logger = logging.getLogger(__name__)
+
+
+class DecayingCounter:
+    """
+    Popularity scores that halve every half_life seconds.
+
+    Scores decay lazily, when a key is touched or ranked. At most max_keys
+    are tracked; when full, the least recently touched key is forgotten.
+    """
+
+    def __init__(self, half_life: float = 3600, max_keys: int = 10000):
+        self.half_life = half_life
+        self.max_keys = max_keys
+        # key -> (score, last update)
+        self._scores: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, updated: float, now: float) -> float:
+        if self.half_life <= 0:
+            return score
+        return score * math.pow(0.5, max(0.0, now - updated) / self.half_life)
+
+    def add(self, key: Hashable, amount: float = 1.0, now: float = None) -> None:
+        if now is None:
+            now = time.time()
+        with self._lock:
+            entry = self._scores.pop(key, None)
+            score = self._decayed(*entry, now) if entry is not None else 0.0
+            self._scores[key] = (score + amount, now)
+            while len(self._scores) > self.max_keys:
+                self._scores.popitem(last=False)
+
+    def top(self, limit: int, min_score: float = 0.0, now: float = None) -> List[Tuple[Hashable, float]]:
+        """The highest-scoring keys at or above min_score, best first"""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            ranked = [(key, self._decayed(score, updated, now)) for key, (score, updated) in self._scores.items()]
+        ranked = [(key, score) for key, score in ranked if score >= min_score]
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+class Prefetcher:
+    """
+    Background refresh of popular weather cells and routes.
+
+    Weather cache entries belong to a model-run hour, and Open-Meteo publishes
+    a new run at the top of the hour. Requests record the cells and routes
+    they use in decayed popularity counters. Just before each hour boundary
+    the admitted cells (score >= min_score, up to max_cells, plus the cells
+    along admitted routes) are marked for revalidation, so requests after
+    the boundary are still served warm from the previous run's entries.
+    delay_seconds after the boundary, once the new run is out, the admitted
+    keys are refetched into the new hour's entries, at most `concurrency`
+    upstream calls at a time, and each refreshed cell switches to the new run
+    as it is stored. A cell whose refresh fails falls back to a normal fetch
+    after revalidate_seconds. With predictions enabled, Prophet models for
+    the refreshed cells are fitted too. Counters are per worker.
+    """
+
+    def __init__(self, enabled: bool = False, delay_seconds: float = 60, revalidate_seconds: float = 600,
+                 half_life: float = 3600, min_score: float = 3.0, max_cells: int = 500, max_routes: int = 100,
+                 concurrency: int = 2, predictions: bool = False, max_tracked: int = 10000):
+        self.enabled = enabled
+        self.delay_seconds = min(max(delay_seconds, 0.0), 3000.0)
+        self.revalidate_seconds = max(revalidate_seconds, 0.0)
+        self.min_score = min_score
+        self.max_cells = max_cells
+        self.max_routes = max_routes
+        self.concurrency = max(1, concurrency)
+        self.predictions = predictions
+
+        self.cells = DecayingCounter(half_life, max_tracked)
+        self.routes = DecayingCounter(half_life, max_tracked)
+        # route key -> cells along it, filled when the route is first refreshed
+        self._route_cells: Dict[str, List[Cell]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.last_run: Dict = {}
+
+    @classmethod
+    def from_env(cls) -> "Prefetcher":
+        """Build from PREFETCH_* environment variables (PREFETCH=1 enables it)"""
+        return cls(
+            enabled=os.getenv("PREFETCH", "0") == "1",
+            delay_seconds=float(os.getenv("PREFETCH_DELAY_SECONDS", "60")),
+            revalidate_seconds=float(os.getenv("PREFETCH_REVALIDATE_SECONDS", "600")),
+            half_life=float(os.getenv("PREFETCH_HALF_LIFE", "3600")),
+            min_score=float(os.getenv("PREFETCH_MIN_SCORE", "3")),
+            max_cells=int(os.getenv("PREFETCH_MAX_CELLS", "500")),
+            max_routes=int(os.getenv("PREFETCH_MAX_ROUTES", "100")),
+            concurrency=int(os.getenv("PREFETCH_CONCURRENCY", "2")),
+            predictions=os.getenv("PREFETCH_PREDICTIONS", "0") == "1",
+            max_tracked=int(os.getenv("PREFETCH_MAX_TRACKED", "10000"))
+        )
+
+    def record_cells(self, cells: List[Cell]) -> None:
+        """Count a request's weather cells (each distinct cell once)"""
+        if not self.enabled:
+            return
+        now = time.time()
+        for cell in dict.fromkeys(cells):
+            self.cells.add(cell, now=now)
+
+    def record_route(self, key: str, start_coords: Tuple[float, float], end_coords: Tuple[float, float]) -> None:
+        """Count a route lookup; key is its route cache key, coordinates are (lon, lat)"""
+        if not self.enabled:
+            return
+        self.routes.add((key, tuple(start_coords), tuple(end_coords)))
+
+    def start(self) -> None:
+        """Start the refresh loop (app startup)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Cancel the refresh loop (app shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            next_run = (time.time() // 3600 + 1) * 3600
+            # Mark a little early so no request lands between the rollover and the marking
+            await asyncio.sleep(max(0.0, next_run - 5 - time.time()))
+            weather_cache.revalidate(self.admitted_cells(), next_run + self.delay_seconds + self.revalidate_seconds)
+            await asyncio.sleep(max(0.0, next_run + self.delay_seconds - time.time()))
+            try:
+                await self.refresh(next_run)
+            except Exception as e:
+                PREFETCH_ITEMS.inc(kind="refresh", outcome="failed")
+                logger.exception("Prefetch failed: %r", e)
+
+    async def refresh(self, run_time: float) -> Dict:
+        """
+        Refetch the admitted cells and routes into the cache entries of the
+        model-run hour containing run_time
+        Returns counts of what was refreshed
+        """
+        started = time.perf_counter()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        summary = {"routes": 0, "cells": 0, "cells_failed": 0, "fits": 0}
+
+        route_cells: List[Cell] = []
+        admitted_routes = self.routes.top(self.max_routes, self.min_score)
+        for cells in await asyncio.gather(*(self._refresh_route(*key) for key, _ in admitted_routes)):
+            if cells is not None:
+                summary["routes"] += 1
+                route_cells.extend(cells)
+
+        wanted = self.admitted_cells(route_cells)
+        stale = [cell for cell in wanted if not weather_cache.contains(cell, run_time)]
+
+        from .openmeteo_api import OpenMeteoAPI
+        batch = OpenMeteoAPI.MAX_BATCH_SIZE
+        chunks = [stale[i:i + batch] for i in range(0, len(stale), batch)]
+        refreshed: List[Tuple[Cell, Dict]] = []
+        for chunk, payloads in zip(chunks, await asyncio.gather(*(self._fetch_cells(c) for c in chunks))):
+            for cell, payload in zip(chunk, payloads):
+                if payload is None:
+                    summary["cells_failed"] += 1
+                    continue
+                weather_cache.put(cell, payload, run_time)
+                refreshed.append((cell, payload))
+        summary["cells"] = len(refreshed)
+        PREFETCH_ITEMS.inc(summary["cells"], kind="cell", outcome="refreshed")
+        PREFETCH_ITEMS.inc(summary["cells_failed"], kind="cell", outcome="failed")
+
+        if self.predictions and refreshed:
+            summary["fits"] = await self._fit_models([payload for _, payload in refreshed], run_time)
+
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        summary["run_hour"] = datetime.fromtimestamp(run_time, timezone.utc).strftime("%Y-%m-%dT%H:00Z")
+        self.last_run = summary
+        return summary
+
+    def admitted_cells(self, route_cells: Optional[List[Cell]] = None) -> List[Cell]:
+        """
+        Popular cells first, then the corridors of popular routes, within the budget
+        route_cells: Cells along the admitted routes; by default those known from earlier refreshes
+        """
+        if route_cells is None:
+            route_cells = [
+                cell for (key, _, _), _ in self.routes.top(self.max_routes, self.min_score)
+                for cell in self._route_cells.get(key, [])
+            ]
+        wanted = [cell for cell, _ in self.cells.top(self.max_cells, self.min_score)]
+        return list(dict.fromkeys(wanted + route_cells))[:self.max_cells]
+
+    async def _fetch_cells(self, cells: List[Cell]) -> List[Optional[Dict]]:
+        from .openmeteo_api import OpenMeteoAPI
+        async with self._semaphore:
+            return await OpenMeteoAPI._request_locations(cells)
+
+    async def _refresh_route(self, key: str, start_coords: Tuple[float, float],
+                             end_coords: Tuple[float, float]) -> Optional[List[Cell]]:
+        """Make sure a popular route is cached; returns the weather cells along it"""
+        from .osmnx_wrapper import OpenRouteServiceAPI
+        from .route_cache import route_cache
+        from .segmenter import RouteSegmenter
+
+        try:
+            route = await asyncio.to_thread(route_cache.get, key)
+            if route is None:
+                async with self._semaphore:
+                    route = await OpenRouteServiceAPI._request_route(start_coords, end_coords)
+                if not route:
+                    PREFETCH_ITEMS.inc(kind="route", outcome="failed")
+                    return None
+                await asyncio.to_thread(route_cache.put, key, route)
+                self._route_cells.pop(key, None)
+                PREFETCH_ITEMS.inc(kind="route", outcome="refreshed")
+
+            cells = self._route_cells.get(key)
+            if cells is None:
+                coordinates = route["coordinates"]
+                bounds = RouteSegmenter.segment_bounds(coordinates, route["duration"], 5000)
+                cells = list(dict.fromkeys(
+                    weather_cache.cell_for(coordinates[i][1], coordinates[i][0])
+                    for i in bounds["center_idx"].tolist()
+                ))
+                if len(self._route_cells) >= self.max_routes * 2:
+                    self._route_cells.clear()
+                self._route_cells[key] = cells
+            return cells
+        except Exception as e:
+            logger.warning("Prefetch of route %s failed: %r", key, e)
+            PREFETCH_ITEMS.inc(kind="route", outcome="failed")
+            return None
+
+    async def _fit_models(self, payloads: List[Dict], run_time: float) -> int:
+        """Fit (and so cache) the Prophet models for refreshed forecasts"""
+        from ..ml.prediction_pool import prediction_pool
+        from ..ml.predictor import CONTINUOUS_METRICS
+
+        # The fit depends only on the series; the target time just has to be valid (and naive, for Prophet)
+        target_time = datetime.fromtimestamp(run_time, timezone.utc).replace(tzinfo=None)
+        tasks = [
+            (payload["hourly"], target_time, hourly_key, (payload.get("latitude"), payload.get("longitude")))
+            for payload in payloads if payload.get("hourly")
+            for hourly_key in CONTINUOUS_METRICS.values()
+        ]
+        # A few fits at a time, so the pool stays free for interactive requests
+        fitted = 0
+        for i in range(0, len(tasks), self.concurrency):
+            chunk = tasks[i:i + self.concurrency]
+            try:
+                await prediction_pool.predict_metrics(chunk)
+                fitted += len(chunk)
+                PREFETCH_ITEMS.inc(len(chunk), kind="fit", outcome="refreshed")
+            except Exception as e:
+                logger.warning("Prefetch model fits failed: %r", e)
+                PREFETCH_ITEMS.inc(len(chunk), kind="fit", outcome="failed")
+        return fitted
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "tracked_cells": len(self.cells),
+            "tracked_routes": len(self.routes),
+            "admitted_cells": len(self.cells.top(self.max_cells, self.min_score)),
+            "admitted_routes": len(self.routes.top(self.max_routes, self.min_score)),
+            "last_run": self.last_run
+        }
+
+
+prefetcher = Prefetcher.from_env()
+registry.add_collector(lambda: [(
+    "prefetch_tracked_keys", "gauge", "Cells and routes with a popularity score",
+    [({"kind": "cell"}, len(prefetcher.cells)), ({"kind": "route"}, len(prefetcher.routes))]
+)])
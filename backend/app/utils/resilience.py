@@ -0,0 +1,124 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit open, retrying in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class LatencyTracker:
+    """
+    Recent successful call latencies of one upstream, for adaptive timeouts
+    and hedging delays. Percentiles are recomputed every few samples rather
+    than on every call.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20, refresh_every: int = 10):
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self._samples = deque(maxlen=window)
+        self._sorted = []
+        self._since_refresh = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_refresh += 1
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Latency at a percentile of the window, None until min_samples are in"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            if self._since_refresh >= self.refresh_every or not self._sorted:
+                self._sorted = sorted(self._samples)
+                self._since_refresh = 0
+            index = min(len(self._sorted) - 1, int(len(self._sorted) * percent / 100))
+            return self._sorted[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: calls go through. After failure_threshold failures in a row it
+    opens and calls fail fast with CircuitOpenError. After reset_seconds one
+    probe call is let through (half-open); its success closes the breaker,
+    its failure opens it again, and a cancelled probe lets the next call probe.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(self.name, max(0.0, self.reset_seconds - (now - self.opened_at)))
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if success:
+                self.state = self.CLOSED
+                self.failures = 0
+                self._probing = False
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def abandon(self) -> None:
+        """A call that was let through ended without an outcome (cancelled); a half-open breaker may probe again"""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != self.CLOSED
+
+    def status(self) -> Dict:
+        with self._lock:
+            status = {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.times_opened}
+            if self.state == self.OPEN:
+                status["retry_in"] = round(max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at)), 1)
+            return status
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff before retry number attempt (0-based)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
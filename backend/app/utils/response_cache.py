@@ -0,0 +1,299 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from .metrics import RESPONSE_NOT_MODIFIED, register_cache, stage
+from .wire_format import MSGPACK_MEDIA_TYPES, msgpack_available, packb, wants_msgpack
+
+# Request fields that hold coordinates (rounded) and times (bucketed) when keying
+COORD_FIELDS = {"lat", "lon", "latitude", "longitude", "start_lat", "start_lon", "end_lat", "end_lon"}
+TIME_FIELDS = {"departure_time", "start_time"}
+
+
+def _brotli():
+    """The brotli module, or None when it is not installed"""
+    try:
+        import brotli  # type: ignore[import]
+        return brotli
+    except ImportError:
+        return None
+
+
+class CachedResponse:
+    """One rendered body with its media type, ETag, expiry and precompressed variants"""
+    __slots__ = ("body", "media_type", "etag", "expires_at", "encoded")
+
+    def __init__(self, body: bytes, media_type: str, etag: str, expires_at: float, encoded: Dict[str, bytes]):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+        self.expires_at = expires_at
+        self.encoded = encoded
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(data) for data in self.encoded.values())
+
+
+class ResponseCache:
+    """
+    LRU cache of rendered JSON responses for the plan, recommendation and
+    forecast endpoints.
+
+    Requests are keyed after normalizing them: coordinates are rounded to
+    coord_decimals and times bucketed to time_bucket_seconds (a request
+    without a time is relative to now, so it is keyed on the current bucket).
+    Each body is rendered once and given a strong ETag; bodies of at least
+    compress_min_bytes are also gzip- and, if the brotli module is installed,
+    brotli-compressed once when stored. An entry lives until the weather
+    behind it is due for a refresh (the next model-run hour, at most
+    ttl_seconds), and that remainder is sent as max-age. A request whose
+    If-None-Match matches gets a 304 without a body. Endpoints with a
+    columnar form answer Accept: application/x-msgpack with it, cached
+    apart from the JSON body.
+    """
+
+    def __init__(self, enabled: bool = True, ttl_seconds: float = 3600, max_entries: int = 1024,
+                 max_bytes: int = 64 * 1024 * 1024, coord_decimals: int = 3,
+                 time_bucket_seconds: float = 900, compress_min_bytes: int = 1024):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.coord_decimals = coord_decimals
+        self.time_bucket_seconds = max(1.0, time_bucket_seconds)
+        self.compress_min_bytes = compress_min_bytes
+        self.brotli = _brotli()
+
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """Build a cache from RESPONSE_CACHE_* environment variables (RESPONSE_CACHE=0 disables it)"""
+        return cls(
+            enabled=os.getenv("RESPONSE_CACHE", "1") == "1",
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+            max_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            coord_decimals=int(os.getenv("RESPONSE_CACHE_COORD_DECIMALS", "3")),
+            time_bucket_seconds=float(os.getenv("RESPONSE_CACHE_TIME_BUCKET", "15")) * 60,
+            compress_min_bytes=int(os.getenv("RESPONSE_CACHE_COMPRESS_MIN_BYTES", "1024"))
+        )
+
+    def _bucket(self, epoch_seconds: float) -> int:
+        return int(epoch_seconds // self.time_bucket_seconds)
+
+    def _normalize(self, value, field: str = None):
+        if isinstance(value, dict):
+            return {key: self._normalize(item, key) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._normalize(item, field) for item in value]
+        if field in COORD_FIELDS and isinstance(value, (int, float)):
+            return round(float(value), self.coord_decimals)
+        if field in TIME_FIELDS and isinstance(value, str):
+            try:
+                parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                return value
+            return self._bucket(parsed.timestamp())
+        return value
+
+    def key_for(self, endpoint: str, params: Dict, now: float = None) -> str:
+        """Cache key for a request body (a model_dump()) sent to endpoint"""
+        if now is None:
+            now = time.time()
+        normalized = self._normalize(params)
+        if not any(params.get(field) for field in TIME_FIELDS):
+            normalized["_now"] = self._bucket(now)
+        canonical = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+        return endpoint + ":" + hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+    def fresh_until(self, now: float = None) -> float:
+        """When responses built now go stale: the next weather model-run hour, at most ttl away"""
+        if now is None:
+            now = time.time()
+        return min(now + self.ttl_seconds, (now // 3600 + 1) * 3600)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def render(self, content, now: float = None, columnar: Callable[[Dict], Dict] = None) -> CachedResponse:
+        """
+        Render a body once: JSON (or, given columnar, MessagePack) bytes, strong
+        ETag and precompressed variants
+        """
+        if columnar is None:
+            body, media_type = JSONResponse(jsonable_encoder(content)).body, "application/json"
+        else:
+            body, media_type = packb(columnar(content)), MSGPACK_MEDIA_TYPES[0]
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        encoded = {}
+        if len(body) >= self.compress_min_bytes:
+            encoded["gzip"] = gzip.compress(body, 6)
+            if self.brotli is not None:
+                encoded["br"] = self.brotli.compress(body, quality=5)
+        return CachedResponse(body, media_type, etag, self.fresh_until(now), encoded)
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self._size_bytes += entry.size
+            while self._entries and (len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    async def serve(self, http_request: Request, endpoint: str, params: Dict,
+                    build: Callable[[], Awaitable[Dict]],
+                    cacheable: Callable[[Dict], bool] = None,
+                    columnar: Callable[[Dict], Dict] = None) -> Response:
+        """
+        Answer a request from the cache, or build, render and cache its body
+        endpoint: Cache namespace and metrics label
+        params: The request body (model_dump()), normalized into the key
+        build: Computes the response content on a miss
+        cacheable: Whether built content may be stored (e.g. not when partly failed)
+        columnar: Converts content to the columnar form sent as MessagePack when
+        the request accepts it; without it the endpoint always answers JSON
+        """
+        vary = "Accept, Accept-Encoding" if columnar is not None else "Accept-Encoding"
+        if columnar is not None and not (wants_msgpack(http_request.headers.get("accept", "")) and msgpack_available()):
+            columnar = None
+
+        if not self.enabled:
+            content = await build()
+            with stage("serialize"):
+                if columnar is not None:
+                    return Response(packb(columnar(content)), media_type=MSGPACK_MEDIA_TYPES[0], headers={"Vary": vary})
+                return JSONResponse(jsonable_encoder(content))
+
+        key = self.key_for(endpoint if columnar is None else endpoint + ".msgpack", params)
+        # Cache-Control: no-cache asks for a fresh body (which then replaces the cached one)
+        revalidate = "no-cache" in http_request.headers.get("cache-control", "")
+        entry = None if revalidate else self.get(key)
+        status = "HIT"
+        if entry is None:
+            content = await build()
+            with stage("serialize"):
+                entry = self.render(content, columnar=columnar)
+            status = "MISS"
+            if cacheable is None or cacheable(content):
+                self.put(key, entry)
+            else:
+                status = "BYPASS"
+        return self.respond(http_request, endpoint, entry, status, vary)
+
+    def respond(self, http_request: Request, endpoint: str, entry: CachedResponse, status: str,
+                vary: str = "Accept-Encoding") -> Response:
+        """
+        A 304 for a matching If-None-Match, otherwise the body in the best accepted
+        encoding. A BYPASS body (not cached, e.g. partly failed) is sent with
+        no-store and without an ETag, so clients do not keep or revalidate it.
+        """
+        bypass = status == "BYPASS"
+        max_age = max(0, int(entry.expires_at - time.time()))
+        headers = {
+            "Cache-Control": "no-store" if bypass else f"private, max-age={max_age}",
+            "Vary": vary,
+            "X-Cache": status
+        }
+        encoding = self._choose_encoding(http_request.headers.get("accept-encoding", ""), entry)
+        if bypass:
+            if encoding is not None:
+                headers["Content-Encoding"] = encoding
+            return Response(entry.encoded.get(encoding, entry.body), media_type=entry.media_type, headers=headers)
+
+        if_none_match = http_request.headers.get("if-none-match")
+        if if_none_match and self._matches(if_none_match, entry.etag):
+            RESPONSE_NOT_MODIFIED.inc(endpoint=endpoint)
+            return Response(status_code=304, headers={**headers, "ETag": entry.etag})
+
+        if encoding is None:
+            return Response(entry.body, media_type=entry.media_type, headers={**headers, "ETag": entry.etag})
+        # Each encoding is its own representation, so its strong ETag differs
+        return Response(entry.encoded[encoding], media_type=entry.media_type, headers={
+            **headers, "ETag": entry.etag[:-1] + "-" + encoding + '"', "Content-Encoding": encoding
+        })
+
+    @staticmethod
+    def _matches(if_none_match: str, etag: str) -> bool:
+        """Whether If-None-Match names this body in any of its encodings"""
+        base = etag.strip('"')
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate == "*":
+                return True
+            candidate = candidate.removeprefix("W/").strip('"')
+            if candidate == base or candidate.rsplit("-", 1)[0] == base:
+                return True
+        return False
+
+    @staticmethod
+    def _choose_encoding(accept_encoding: str, entry: CachedResponse) -> Optional[str]:
+        accepted = {}
+        for part in accept_encoding.lower().split(","):
+            name, _, params = part.strip().partition(";")
+            quality = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            if name:
+                accepted[name] = quality
+        for encoding in ("br", "gzip"):
+            if encoding in entry.encoded and accepted.get(encoding, 0) > 0:
+                return encoding
+        return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "brotli": self.brotli is not None,
+                "msgpack": msgpack_available()
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size_bytes -= entry.size
+
+
+response_cache = ResponseCache.from_env()
+register_cache("response", response_cache.stats)
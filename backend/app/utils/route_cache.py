@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from .metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parents[2] / ".cache" / "routes.sqlite3"
+
+
+class RouteCache:
+    """
+    Two-tier cache of OpenRouteService directions.
+
+    Keys are snapped start/end coordinates plus the routing profile. A small
+    in-memory LRU serves hot commuter routes; behind it a SQLite file holds
+    zlib-compressed geometry with a long TTL and is trimmed by total size
+    (least recently used first). Expired rows stay available to get_stale()
+    for stale_seconds more before they are purged. WAL mode lets several
+    workers share it.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, ttl_seconds: float = 7 * 24 * 3600,
+                 max_db_bytes: int = 256 * 1024 * 1024, hot_entries: int = 256,
+                 resolution: float = 0.001, stale_seconds: float = 30 * 24 * 3600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_db_bytes = max_db_bytes
+        self.hot_entries = hot_entries
+        self.resolution = resolution
+
+        self._hot: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "RouteCache":
+        """Build a cache from ROUTE_CACHE_* environment variables (ROUTE_CACHE_PATH=off disables SQLite)"""
+        db_path = os.getenv("ROUTE_CACHE_PATH", str(DEFAULT_DB_PATH))
+        return cls(
+            db_path=None if db_path.lower() in ("", "off", "none") else db_path,
+            ttl_seconds=float(os.getenv("ROUTE_CACHE_TTL", str(7 * 24 * 3600))),
+            max_db_bytes=int(float(os.getenv("ROUTE_CACHE_MAX_MB", "256")) * 1024 * 1024),
+            hot_entries=int(os.getenv("ROUTE_CACHE_HOT_ENTRIES", "256")),
+            resolution=float(os.getenv("ROUTE_CACHE_RESOLUTION", "0.001")),
+            stale_seconds=float(os.getenv("ROUTE_CACHE_STALE_DAYS", "30")) * 24 * 3600
+        )
+
+    def key_for(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float], profile: str) -> str:
+        """Cache key from (lon, lat) endpoints snapped to the cache resolution"""
+        def snap(value: float) -> str:
+            if self.resolution <= 0:
+                return f"{value:.6f}"
+            return f"{round(value / self.resolution) * self.resolution:.6f}"
+
+        return f"{profile}:{snap(start_coords[0])},{snap(start_coords[1])}:{snap(end_coords[0])},{snap(end_coords[1])}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return a cached route, checking the hot tier then SQLite"""
+        now = time.time()
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._hot.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._hot[key]
+
+            route = self._db_get(key, now)
+            if route is not None:
+                self.db_hits += 1
+                self._remember(key, route, now + self.ttl_seconds)
+                return route
+
+            self.misses += 1
+            return None
+
+    def get_stale(self, key: str) -> Optional[Dict]:
+        """Return a route even if it has expired (still in memory, or in SQLite within stale_seconds)"""
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                return entry[1]
+            conn = self._connection()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute("SELECT payload FROM routes WHERE key = ?", (key,)).fetchone()
+                return self.decompress(row[0]) if row is not None else None
+            except Exception as e:
+                self.errors += 1
+                logger.warning("Route cache read error: %r", e)
+                return None
+
+    def put(self, key: str, route: Dict) -> None:
+        """Store a route in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, route, now + self.ttl_seconds)
+            self._db_put(key, route, now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "hot_entries": len(self._hot)
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def compress(route: Dict) -> bytes:
+        """A route, or {"routes": [...]} for a route with its alternatives, as a zlib blob"""
+        if "routes" in route:
+            compact = {"routes": [RouteCache._compact(item) for item in route["routes"]]}
+        else:
+            compact = RouteCache._compact(route)
+        return zlib.compress(json.dumps(compact, separators=(",", ":")).encode("utf-8"), 6)
+
+    @staticmethod
+    def decompress(blob: bytes) -> Dict:
+        compact = json.loads(zlib.decompress(blob).decode("utf-8"))
+        if "routes" in compact:
+            return {"routes": [RouteCache._expand(item) for item in compact["routes"]]}
+        return RouteCache._expand(compact)
+
+    @staticmethod
+    def _compact(route: Dict) -> Dict:
+        # geometry.coordinates duplicates coordinates; only store the latter
+        return {
+            "distance": route.get("distance", 0),
+            "duration": route.get("duration", 0),
+            "coordinates": route.get("coordinates", [])
+        }
+
+    @staticmethod
+    def _expand(compact: Dict) -> Dict:
+        return {
+            "geometry": {"type": "LineString", "coordinates": compact["coordinates"]},
+            "distance": compact["distance"],
+            "duration": compact["duration"],
+            "coordinates": compact["coordinates"]
+        }
+
+    def _remember(self, key: str, route: Dict, expires_at: float) -> None:
+        # Caller must hold self._lock
+        self._hot[key] = (expires_at, route)
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_entries:
+            self._hot.popitem(last=False)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # Caller must hold self._lock
+        if self.db_path is None:
+            return None
+        if self._conn is None:
+            try:
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS routes ("
+                    "key TEXT PRIMARY KEY, payload BLOB NOT NULL, size INTEGER NOT NULL, "
+                    "created_at REAL NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS routes_last_used ON routes (last_used)")
+                conn.commit()
+                self._conn = conn
+            except Exception as e:
+                self.errors += 1
+                logger.warning("Route cache unavailable, using memory only: %r", e)
+                self.db_path = None
+                return None
+        return self._conn
+
+    def _db_get(self, key: str, now: float) -> Optional[Dict]:
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT payload FROM routes WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE routes SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return self.decompress(row[0])
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Route cache read error: %r", e)
+            return None
+
+    def _db_put(self, key: str, route: Dict, now: float) -> None:
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            blob = self.compress(route)
+            conn.execute(
+                "INSERT OR REPLACE INTO routes (key, payload, size, created_at, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now + self.ttl_seconds, now)
+            )
+            # Expired rows are kept for get_stale() until the stale horizon
+            conn.execute("DELETE FROM routes WHERE expires_at <= ?", (now - self.stale_seconds,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM routes").fetchone()[0]
+            while total > self.max_db_bytes:
+                row = conn.execute("SELECT key, size FROM routes ORDER BY last_used LIMIT 1").fetchone()
+                if row is None:
+                    break
+                conn.execute("DELETE FROM routes WHERE key = ?", (row[0],))
+                total -= row[1]
+                self.evictions += 1
+            conn.commit()
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Route cache write error: %r", e)
+
+
+route_cache = RouteCache.from_env()
+
+register_cache("route", route_cache.stats)
@@ -1,6 +1,7 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 import math
+import numpy as np
 
 class RouteSegmenter:
     @staticmethod
@@ -18,6 +19,102 @@ class RouteSegmenter:
         radius = 6371000
         return radius * c
     
+    @staticmethod
+    def haversine_array(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+        """Vectorized calculate_distance over arrays of coordinates (degrees in, meters out)"""
+        lat1, lon1, lat2, lon2 = (np.radians(a) for a in (lat1, lon1, lat2, lon2))
+        
+        dlat = lat2 - lat1
+        dlon = lon2 - lon1
+        
+        a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+        c = 2 * np.arcsin(np.sqrt(a))
+        
+        radius = 6371000
+        return radius * c
+    
+    @staticmethod
+    def segment_bounds(coordinates, total_duration: float, segment_distance: float = 5000) -> Dict[str, np.ndarray]:
+        """
+        Compute segment boundaries as index ranges into the shared coordinate array
+        coordinates: Sequence or (n, 2+) array of [lon, lat(, elevation)]
+        Returns parallel arrays: start_idx, end_idx (inclusive vertex), center_idx,
+        distance (meters) and eta_offset (seconds after departure)
+        """
+        coords = np.asarray(coordinates, dtype=float)
+        count = len(coords)
+        if count < 2:
+            empty = np.empty(0, dtype=np.int64)
+            return {
+                "start_idx": empty,
+                "end_idx": empty,
+                "center_idx": empty,
+                "distance": np.empty(0),
+                "eta_offset": np.empty(0)
+            }
+        
+        lon = coords[:, 0]
+        lat = coords[:, 1]
+        steps = RouteSegmenter.haversine_array(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        # cumulative[k] = distance travelled when reaching vertex k
+        cumulative = np.concatenate(([0.0], np.cumsum(steps)))
+        
+        ends = []
+        start = 0
+        last = count - 1
+        while True:
+            end = int(np.searchsorted(cumulative, cumulative[start] + segment_distance, side="left"))
+            end = max(end, start + 1)
+            if end >= last:
+                ends.append(last)
+                break
+            ends.append(end)
+            start = end
+        
+        end_idx = np.array(ends, dtype=np.int64)
+        start_idx = np.concatenate(([0], end_idx[:-1]))
+        
+        # Progress along the route: distance so far over distance so far plus the
+        # straight-line remainder from the segment's second-to-last vertex
+        travelled = cumulative[end_idx]
+        remaining = RouteSegmenter.haversine_array(
+            lat[end_idx - 1], lon[end_idx - 1], lat[last], lon[last]
+        )
+        denominator = travelled + remaining
+        progress_ratio = np.divide(travelled, denominator, out=np.zeros_like(travelled), where=denominator > 0)
+        progress_ratio[end_idx == last] = 1.0
+        
+        return {
+            "start_idx": start_idx,
+            "end_idx": end_idx,
+            "center_idx": (start_idx + end_idx) // 2,
+            "distance": cumulative[end_idx] - cumulative[start_idx],
+            "eta_offset": total_duration * progress_ratio
+        }
+    
+    @staticmethod
+    def segment_table(coordinates, total_duration: float, segment_distance: float = 5000,
+                      departure_time: datetime = None) -> "SegmentTable":
+        """
+        Segment route into chunks based on distance, as a compact SegmentTable
+        coordinates: List of [lon, lat] pairs
+        total_duration: Total trip duration in seconds
+        segment_distance: Target distance per segment in meters (default 5km)
+        """
+        if departure_time is None:
+            departure_time = datetime.now()
+        
+        bounds = RouteSegmenter.segment_bounds(coordinates, total_duration, segment_distance)
+        return SegmentTable(
+            coordinates,
+            departure_time,
+            bounds["start_idx"],
+            bounds["end_idx"],
+            bounds["center_idx"],
+            bounds["distance"],
+            bounds["eta_offset"]
+        )
+    
     @staticmethod
     def segment_route(coordinates: List[List[float]], total_duration: float, 
                      segment_distance: float = 5000, departure_time: datetime = None) -> List[Dict]:
@@ -26,48 +123,115 @@ class RouteSegmenter:
         coordinates: List of [lon, lat] pairs
         total_duration: Total trip duration in seconds
         segment_distance: Target distance per segment in meters (default 5km)
+        Segments reference the route geometry through start_idx/end_idx (inclusive)
         """
         if not coordinates or len(coordinates) < 2:
             return []
         
-        if departure_time is None:
-            departure_time = datetime.now()
-        
-        segments = []
-        current_distance = 0
-        segment_start_idx = 0
-        total_route_distance = 0
-        
-        for i in range(len(coordinates) - 1):
-            coord1 = (coordinates[i][1], coordinates[i][0])
-            coord2 = (coordinates[i + 1][1], coordinates[i + 1][0])
-            dist = RouteSegmenter.calculate_distance(coord1, coord2)
-            current_distance += dist
-            total_route_distance += dist
-            
-            if current_distance >= segment_distance or i == len(coordinates) - 2:
-                progress_ratio = total_route_distance / (total_route_distance + RouteSegmenter.calculate_distance(
-                    (coordinates[i][1], coordinates[i][0]), 
-                    (coordinates[-1][1], coordinates[-1][0])
-                )) if i < len(coordinates) - 2 else 1.0
-                
-                time_offset = total_duration * progress_ratio
-                eta = departure_time + timedelta(seconds=time_offset)
-                
-                mid_idx = (segment_start_idx + i + 1) // 2
-                segment_center = coordinates[mid_idx]
-                
-                segments.append({
-                    "id": len(segments),
-                    "start_coord": coordinates[segment_start_idx],
-                    "end_coord": coordinates[i + 1],
-                    "center_coord": segment_center,
-                    "distance": current_distance,
-                    "eta": eta.isoformat(),
-                    "coordinates": coordinates[segment_start_idx:i + 2]
-                })
-                
-                current_distance = 0
-                segment_start_idx = i + 1
+        return RouteSegmenter.segment_table(coordinates, total_duration, segment_distance, departure_time).to_dicts()
+
+
+class SegmentTable:
+    """
+    Route segments as parallel arrays over the shared route geometry.
+    
+    start_vertex/end_vertex/center_vertex index the route coordinates;
+    start_idx/end_idx index the geometry returned to the client (the same
+    until build_route_geometry simplifies it). ETAs are kept as seconds after
+    departure_time. enrich_segments attaches the predicted conditions and the
+    risk columns, and the public per-segment dicts are only built by
+    to_dicts() when the response is assembled.
+    """
+    __slots__ = ("coordinates", "departure_time", "ids", "start_vertex", "end_vertex", "center_vertex",
+                 "start_idx", "end_idx", "distance", "eta_offset", "conditions", "risks")
+    
+    def __init__(self, coordinates, departure_time: datetime, start_vertex: np.ndarray, end_vertex: np.ndarray,
+                 center_vertex: np.ndarray, distance: np.ndarray, eta_offset: np.ndarray, ids: np.ndarray = None):
+        self.coordinates = coordinates
+        self.departure_time = departure_time
+        self.ids = np.arange(len(start_vertex)) if ids is None else ids
+        self.start_vertex = start_vertex
+        self.end_vertex = end_vertex
+        self.center_vertex = center_vertex
+        self.start_idx = start_vertex
+        self.end_idx = end_vertex
+        self.distance = distance
+        self.eta_offset = eta_offset
+        # Set by enrich_segments: predicted weather per segment, and SeverityScorer batch columns
+        self.conditions: Optional[List[Dict]] = None
+        self.risks: Optional[Dict] = None
+    
+    def __len__(self) -> int:
+        return len(self.start_vertex)
+    
+    @property
+    def eta(self) -> np.ndarray:
+        """Arrival at each segment in unix seconds"""
+        return self.departure_time.timestamp() + self.eta_offset
+    
+    def eta_times(self) -> List[datetime]:
+        """Arrival at each segment as datetimes (in departure_time's timezone, if any)"""
+        return [self.departure_time + timedelta(seconds=offset) for offset in self.eta_offset.tolist()]
+    
+    def points(self) -> List[Tuple[float, float]]:
+        """(latitude, longitude) of each segment center, where its weather is read"""
+        coordinates = self.coordinates
+        return [(coordinates[i][1], coordinates[i][0]) for i in self.center_vertex.tolist()]
+    
+    def slice(self, start: int, stop: int) -> "SegmentTable":
+        """Segments start..stop-1 as a new (unenriched) table sharing this one's arrays"""
+        part = SegmentTable(
+            self.coordinates, self.departure_time, self.start_vertex[start:stop], self.end_vertex[start:stop],
+            self.center_vertex[start:stop], self.distance[start:stop], self.eta_offset[start:stop],
+            self.ids[start:stop]
+        )
+        part.start_idx = self.start_idx[start:stop]
+        part.end_idx = self.end_idx[start:stop]
+        return part
+    
+    @property
+    def severity_scores(self) -> List[float]:
+        """Risk score of each enriched segment (0 where weather was missing)"""
+        return self.risks["severity_score"].tolist() if self.risks is not None else [0.0] * len(self)
+    
+    def to_dicts(self) -> List[Dict]:
+        """The public per-segment JSON shape, with weather and risk once enriched"""
+        coordinates = self.coordinates
+        etas = self.eta_times()
+        segments = [
+            {
+                "id": segment_id,
+                "start_idx": start_idx,
+                "end_idx": end_idx,
+                "start_coord": coordinates[start],
+                "end_coord": coordinates[end],
+                "center_coord": coordinates[center],
+                "distance": distance,
+                "eta": eta.isoformat()
+            }
+            for segment_id, start_idx, end_idx, start, end, center, distance, eta in zip(
+                self.ids.tolist(), self.start_idx.tolist(), self.end_idx.tolist(), self.start_vertex.tolist(),
+                self.end_vertex.tolist(), self.center_vertex.tolist(), self.distance.tolist(), etas
+            )
+        ]
+        if self.conditions is None or self.risks is None:
+            return segments
         
-        return segments
\ No newline at end of file
+        risks = self.risks
+        levels = risks["risk_level"].tolist()
+        scores = risks["severity_score"].tolist()
+        descriptions = risks["description"].tolist()
+        missing = risks["missing"].tolist()
+        factors = {name: values.tolist() for name, values in risks["factors"].items()}
+        for index, (segment, predicted) in enumerate(zip(segments, self.conditions)):
+            if missing[index]:
+                risk = {"risk_level": "unknown", "severity_score": 0, "factors": {}}
+            else:
+                risk = {
+                    "risk_level": levels[index],
+                    "severity_score": scores[index],
+                    "factors": {name: values[index] for name, values in factors.items()}
+                }
+            segment["weather"] = {**predicted, "description": descriptions[index]}
+            segment["risk"] = risk
+        return segments
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """
+    Readiness tracking and the opt-in startup warmup.
+
+    The ML stack (pandas, Prophet, Stan) is imported on first use, so a worker
+    starts serving quickly. With WARMUP=1 that cost is paid in the background
+    right after startup instead: Prophet and Stan are loaded, the prediction
+    pool's workers are spawned and each runs a small fit, and the weather
+    cache is primed for WARMUP_POINTS. /ready reports 503 until this is done;
+    /health stays a plain liveness check. A failed step is logged and
+    reported, but does not keep the worker out of rotation.
+    """
+
+    def __init__(self, enabled: bool = False, prophet: bool = True,
+                 points: Optional[List[Tuple[float, float]]] = None):
+        self.enabled = enabled
+        self.prophet = prophet
+        self.points = points or []
+        self.started = False
+        self.done = not enabled
+        self.steps: Dict[str, Dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "Warmup":
+        """Build from WARMUP, WARMUP_PROPHET and WARMUP_POINTS ("lat,lon;lat,lon")"""
+        return cls(
+            enabled=os.getenv("WARMUP", "0") == "1",
+            prophet=os.getenv("WARMUP_PROPHET", "1") == "1",
+            points=cls.parse_points(os.getenv("WARMUP_POINTS", ""))
+        )
+
+    @staticmethod
+    def parse_points(value: str) -> List[Tuple[float, float]]:
+        points = []
+        for pair in value.split(";"):
+            if pair.strip():
+                lat, lon = pair.split(",")
+                points.append((float(lat), float(lon)))
+        return points
+
+    @property
+    def ready(self) -> bool:
+        return self.started and self.done
+
+    def start(self) -> None:
+        """Mark startup complete and kick off the warmup in the background (app startup)"""
+        self.started = True
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Cancel an unfinished warmup (app shutdown)"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self) -> None:
+        if self.prophet:
+            await self._step("prophet", self._load_prophet)
+            await self._step("prediction_pool", self._warm_pool)
+        if self.points:
+            await self._step("weather_cache", self._prime_weather)
+        self.done = True
+
+    async def _step(self, name: str, func) -> None:
+        start = time.perf_counter()
+        try:
+            await func()
+            self.steps[name] = {"ok": True, "seconds": round(time.perf_counter() - start, 3)}
+        except Exception as e:
+            logger.warning("Warmup step %s failed: %r", name, e)
+            self.steps[name] = {"ok": False, "error": str(e), "seconds": round(time.perf_counter() - start, 3)}
+
+    @staticmethod
+    async def _load_prophet() -> None:
+        def load():
+            from ..ml.prophet_model import WeatherPredictor
+            WeatherPredictor.warm_up()
+
+        await asyncio.to_thread(load)
+
+    @staticmethod
+    async def _warm_pool() -> None:
+        from ..ml.prediction_pool import prediction_pool
+        await prediction_pool.warm()
+
+    async def _prime_weather(self) -> None:
+        from .openmeteo_api import OpenMeteoAPI
+        await OpenMeteoAPI.fetch_weather_batch(self.points)
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "warmup": {
+                "enabled": self.enabled,
+                "done": self.done,
+                "steps": self.steps
+            }
+        }
+
+
+warmup = Warmup.from_env()
@@ -0,0 +1,379 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from .metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+# (latitude, longitude), optionally followed by qualifiers such as a forecast window
+Cell = Tuple
+
+
+class WeatherCache:
+    """
+    In-memory LRU cache of Open-Meteo payloads with an optional on-disk tier.
+
+    Entries are keyed on a snapped grid cell plus the model-run hour, so
+    neighbouring points and repeat requests within the same hour share one
+    upstream fetch. The disk tier is a directory of JSON files that several
+    uvicorn workers can point at; at startup and every few minutes of writes,
+    files older than the stale horizon are deleted and the oldest rest
+    trimmed to disk_max_bytes. Payloads from earlier run hours can still be
+    read with stale() while Open-Meteo is failing. Cells marked with
+    revalidate() keep being answered from the previous run hour after the
+    hourly rollover until their refresh is stored (stale-while-revalidate).
+    """
+
+    def __init__(self, resolution: float = 0.05, ttl_seconds: float = 3600,
+                 max_entries: int = 4096, max_bytes: int = 64 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, disk_max_bytes: int = 512 * 1024 * 1024,
+                 wait_timeout: float = 30, stale_seconds: float = 6 * 3600, sweep_interval: float = 300):
+        self.resolution = resolution
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self.wait_timeout = wait_timeout
+        self.stale_seconds = stale_seconds
+
+        # key -> (expires_at, size_bytes, payload)
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict]]" = OrderedDict()
+        self._size_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # cell -> deadline for serving its previous run hour while a refresh is due
+        self._revalidating: Dict[Cell, float] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.previous_run_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.errors = 0
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._sweep_disk(time.time())
+
+    @classmethod
+    def from_env(cls) -> "WeatherCache":
+        """Build a cache from WEATHER_CACHE_* environment variables"""
+        return cls(
+            resolution=float(os.getenv("WEATHER_CACHE_RESOLUTION", "0.05")),
+            ttl_seconds=float(os.getenv("WEATHER_CACHE_TTL", "3600")),
+            max_entries=int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "4096")),
+            max_bytes=int(float(os.getenv("WEATHER_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            disk_dir=os.getenv("WEATHER_CACHE_DIR") or None,
+            disk_max_bytes=int(float(os.getenv("WEATHER_CACHE_DISK_MAX_MB", "512")) * 1024 * 1024),
+            stale_seconds=float(os.getenv("WEATHER_CACHE_STALE_HOURS", "6")) * 3600
+        )
+
+    def cell_for(self, latitude: float, longitude: float) -> Cell:
+        """Snap a coordinate to the center of its cache grid cell"""
+        if self.resolution <= 0:
+            return (round(latitude, 4), round(longitude, 4))
+        return (
+            round(round(latitude / self.resolution) * self.resolution, 4),
+            round(round(longitude / self.resolution) * self.resolution, 4)
+        )
+
+    def key_for(self, cell: Cell, now: float = None) -> str:
+        """Cache key for a cell (and any qualifiers after its coordinates) within the current model-run hour"""
+        if now is None:
+            now = time.time()
+        run_hour = int(now // 3600)
+        qualifiers = "".join(f"_{part}" for part in cell[2:])
+        return f"{cell[0]:.4f}_{cell[1]:.4f}{qualifiers}_{run_hour}"
+
+    def get(self, cell: Cell) -> Optional[Dict]:
+        """Return the cached payload for a cell, checking memory then disk"""
+        now = time.time()
+        key = self.key_for(cell, now)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                self._drop(key)
+
+        payload = self._read_disk(key, now)
+        if payload is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._store(key, payload, now, write_disk=False)
+            return payload
+
+        payload = self._previous_run(cell, now)
+        if payload is not None:
+            with self._lock:
+                self.previous_run_hits += 1
+            return payload
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def revalidate(self, cells: List[Cell], until: float) -> None:
+        """
+        After the hourly rollover, answer these cells from the previous run
+        hour's entries until put() stores their refresh, or until `until`
+        """
+        with self._lock:
+            for cell in cells:
+                self._revalidating[cell] = until
+
+    def _previous_run(self, cell: Cell, now: float) -> Optional[Dict]:
+        with self._lock:
+            deadline = self._revalidating.get(cell)
+            if deadline is None:
+                return None
+            if deadline <= now:
+                del self._revalidating[cell]
+                return None
+            key = self.key_for(cell, now - 3600)
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry[2]
+        return self._read_disk(key, now, max_age=2 * 3600)
+
+    def put(self, cell: Cell, payload: Dict, run_time: float = None) -> None:
+        """
+        Store a payload for a cell in memory and, if enabled, on disk
+        run_time: Store it for the model-run hour containing this time (a future
+        hour when refreshing ahead of expiry); it then expires ttl after run_time
+        """
+        now = time.time()
+        if run_time is None or run_time < now:
+            run_time = now
+        self._store(self.key_for(cell, run_time), payload, run_time, write_disk=True)
+        if int(run_time // 3600) == int(now // 3600):
+            with self._lock:
+                self._revalidating.pop(cell, None)
+
+    def contains(self, cell: Cell, run_time: float = None) -> bool:
+        """Whether memory holds a live entry for the cell's model-run hour at run_time (counters untouched)"""
+        now = time.time()
+        if run_time is None or run_time < now:
+            run_time = now
+        with self._lock:
+            entry = self._entries.get(self.key_for(cell, run_time))
+            return entry is not None and entry[0] > now
+
+    async def get_or_fetch_many(self, cells: List[Cell],
+                                fetcher: Callable[[List[Cell]], Awaitable[List[Optional[Dict]]]]) -> Dict[Cell, Optional[Dict]]:
+        """
+        Resolve many cells at once, awaiting fetcher only for cells that are
+        neither cached nor already being fetched by another request.
+        fetcher: Takes a list of cells and returns payloads in the same order
+        """
+        results: Dict[Cell, Optional[Dict]] = {}
+        to_fetch: List[Cell] = []
+        fetch_keys: List[str] = []
+        to_wait: List[Tuple[Cell, asyncio.Future]] = []
+        loop = asyncio.get_running_loop()
+
+        for cell in dict.fromkeys(cells):
+            payload = self.get(cell)
+            if payload is not None:
+                results[cell] = payload
+                continue
+
+            key = self.key_for(cell)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.time():
+                    results[cell] = entry[2]
+                elif key in self._inflight:
+                    to_wait.append((cell, self._inflight[key]))
+                else:
+                    self._inflight[key] = loop.create_future()
+                    to_fetch.append(cell)
+                    fetch_keys.append(key)
+
+        if to_fetch:
+            fetched: List[Optional[Dict]] = [None] * len(to_fetch)
+            try:
+                fetched = await fetcher(to_fetch)
+                for cell, payload in zip(to_fetch, fetched):
+                    if payload is not None:
+                        self.put(cell, payload)
+                    results[cell] = payload
+            finally:
+                with self._lock:
+                    for key, payload in zip(fetch_keys, fetched):
+                        future = self._inflight.pop(key, None)
+                        if future is not None and not future.done():
+                            future.set_result(payload)
+
+        for cell, future in to_wait:
+            try:
+                results[cell] = await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+            except asyncio.TimeoutError:
+                results[cell] = self._peek(cell)
+
+        return results
+
+    def stale(self, cell: Cell) -> Optional[Dict]:
+        """
+        Newest payload for a cell from the last stale_seconds, expired or not
+        (memory, then disk); for when the upstream cannot be reached
+        """
+        now = time.time()
+        run_hour = int(now // 3600)
+        for hours_back in range(int(self.stale_seconds // 3600) + 1):
+            key = self.key_for(cell, (run_hour - hours_back) * 3600)
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                return entry[2]
+            payload = self._read_disk(key, now, max_age=self.stale_seconds)
+            if payload is not None:
+                return payload
+        return None
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.previous_run_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "previous_run_hits": self.previous_run_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "errors": self.errors,
+                "hit_ratio": round((self.hits + self.disk_hits + self.previous_run_hits) / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes
+            }
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (the disk tier is left untouched)"""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def _peek(self, cell: Cell) -> Optional[Dict]:
+        """Memory lookup that does not touch the hit/miss counters"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(self.key_for(cell, now))
+            if entry is not None and entry[0] > now:
+                return entry[2]
+        return None
+
+    def _store(self, key: str, payload: Dict, now: float, write_disk: bool) -> None:
+        encoded = json.dumps(payload, separators=(",", ":"))
+        size = len(encoded)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (now + self.ttl_seconds, size, payload)
+            self._size_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+        if write_disk and self.disk_dir:
+            self._write_disk(key, encoded)
+
+    def _drop(self, key: str) -> None:
+        # Caller must hold self._lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size_bytes -= entry[1]
+
+    def _read_disk(self, key: str, now: float, max_age: float = None) -> Optional[Dict]:
+        if not self.disk_dir:
+            return None
+        path = self.disk_dir / f"{key}.json"
+        try:
+            age = now - path.stat().st_mtime
+            if max_age is not None:
+                if age > max_age:
+                    return None
+            elif age > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self._error("Weather cache disk read error: %r", e)
+            return None
+
+    def _write_disk(self, key: str, encoded: str) -> None:
+        path = self.disk_dir / f"{key}.json"
+        # Write to a per-process temp file and rename so concurrent workers
+        # never observe a partially written entry
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(encoded, encoding="utf-8")
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self._error("Weather cache disk write error: %r", e)
+            return
+        now = time.time()
+        if now >= self._next_sweep:
+            self._sweep_disk(now)
+
+    def _error(self, message: str, error: Exception) -> None:
+        with self._lock:
+            self.errors += 1
+        logger.warning(message, error)
+
+    def _sweep_disk(self, now: float) -> None:
+        """
+        Delete files from run hours past the stale horizon (and abandoned temp
+        files), then the oldest files while the directory is over disk_max_bytes
+        """
+        self._next_sweep = now + self.sweep_interval
+        # The previous run hour stays readable for revalidating cells
+        max_age = max(self.stale_seconds, 2 * 3600)
+        files = []
+        removed = 0
+        try:
+            for path in self.disk_dir.iterdir():
+                try:
+                    info = path.stat()
+                    if now - info.st_mtime > max_age:
+                        path.unlink(missing_ok=True)
+                        removed += 1
+                    elif path.suffix == ".json":
+                        files.append((info.st_mtime, info.st_size, path))
+                except FileNotFoundError:
+                    continue
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files, key=lambda item: item[0]):
+                if total <= self.disk_max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+        except Exception as e:
+            self._error("Weather cache disk sweep error: %r", e)
+        with self._lock:
+            self.disk_evictions += removed
+
+
+weather_cache = WeatherCache.from_env()
+
+register_cache("weather", weather_cache.stats)
@@ -0,0 +1,143 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+
+# Media types accepted for the MessagePack columnar format; the first is sent back
+MSGPACK_MEDIA_TYPES = ("application/x-msgpack", "application/msgpack", "application/vnd.msgpack")
+COLUMNAR_VERSION = 1
+
+
+def msgpack_available() -> bool:
+    try:
+        import msgpack  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def wants_msgpack(accept: str) -> bool:
+    """Whether an Accept header asks for MessagePack (JSON stays the default)"""
+    for part in accept.lower().split(","):
+        media_type, _, params = part.strip().partition(";")
+        if media_type.strip() in MSGPACK_MEDIA_TYPES:
+            params = params.strip()
+            return not (params.startswith("q=") and params[2:].strip() in ("0", "0.0", "0.00", "0.000"))
+    return False
+
+
+def packb(content: Dict) -> bytes:
+    import msgpack
+    return msgpack.packb(content, use_bin_type=True, default=_default)
+
+
+def _default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def column(values, dtype: str) -> Dict:
+    """
+    A typed column: little-endian values packed into one binary buffer
+    dtype: numpy dtype name (float64, float32, int32, int16, uint8, ...)
+    Missing floats are NaN
+    """
+    array = np.ascontiguousarray(np.asarray(values, dtype=dtype), dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": dtype, "shape": list(array.shape), "data": array.tobytes()}
+
+
+def category_column(values: List[Optional[str]]) -> Dict:
+    """A dictionary-encoded string column: distinct values once, one uint8/uint16 code per row"""
+    categories = list(dict.fromkeys(values))
+    index = {value: code for code, value in enumerate(categories)}
+    codes = column([index[value] for value in values], "uint8" if len(categories) <= 256 else "uint16")
+    return {**codes, "dtype": "category", "codes_dtype": codes["dtype"], "categories": categories}
+
+
+def _float_or_nan(value) -> float:
+    return float("nan") if value is None else float(value)
+
+
+def _epoch_seconds(iso: str) -> float:
+    """Unix seconds of an ISO time; naive times are server-local, like datetime.now()"""
+    return datetime.fromisoformat(iso).timestamp()
+
+
+def _record_columns(records: List[Dict], float_dtype: str = "float32") -> Dict[str, Dict]:
+    """Columns for a list of flat records: numbers as typed columns, strings dictionary-encoded"""
+    names = list(dict.fromkeys(name for record in records for name in record))
+    columns = {}
+    for name in names:
+        values = [record.get(name) for record in records]
+        present = [value for value in values if value is not None]
+        if present and all(isinstance(value, str) for value in present):
+            columns[name] = category_column(values)
+        elif present and all(isinstance(value, (int, np.integer)) and not isinstance(value, bool) for value in present) \
+                and len(present) == len(values):
+            columns[name] = column(values, "int32")
+        else:
+            columns[name] = column([_float_or_nan(value) for value in values], float_dtype)
+    return columns
+
+
+def columnar_geometry(route: Dict) -> Dict:
+    """Route geometry with coordinates as one flat float64 buffer of shape (vertices, dimensions)"""
+    if route.get("geometry_format") != "coordinates":
+        return route
+    coordinates = route.get("coordinates") or []
+    dimensions = len(coordinates[0]) if coordinates else 2
+    flat = np.array(coordinates, dtype=float).reshape(-1, dimensions)
+    return {**{key: value for key, value in route.items() if key != "coordinates"}, "coordinates": column(flat, "float64")}
+
+
+def columnar_plan(plan: Dict) -> Dict:
+    """
+    Columnar form of a /route/plan body: segment attributes as typed columns
+    (eta in unix seconds, weather, risk score and factors), strings dictionary
+    encoded, and the geometry as a flat float64 buffer; alternatives are
+    converted the same way
+    """
+    segments = plan["segments"]
+    weather = [segment.get("weather", {}) for segment in segments]
+    risks = [segment.get("risk", {}) for segment in segments]
+    columnar = {
+        "format": "columnar",
+        "version": COLUMNAR_VERSION,
+        # overall_risk, predictor and, for ranked alternatives, rank and the like
+        **{key: value for key, value in plan.items() if key not in ("route", "segments", "alternatives")},
+        "route": columnar_geometry(plan["route"]),
+        "segments": {
+            "count": len(segments),
+            "id": column([segment["id"] for segment in segments], "int32"),
+            "start_idx": column([segment["start_idx"] for segment in segments], "int32"),
+            "end_idx": column([segment["end_idx"] for segment in segments], "int32"),
+            "distance": column([segment["distance"] for segment in segments], "float64"),
+            "eta": column([_epoch_seconds(segment["eta"]) for segment in segments], "float64"),
+            "weather": _record_columns(weather),
+            "risk_level": category_column([risk.get("risk_level") for risk in risks]),
+            "severity_score": column([_float_or_nan(risk.get("severity_score")) for risk in risks], "float32"),
+            "factors": _record_columns([risk.get("factors") or {} for risk in risks])
+        }
+    }
+    if "alternatives" in plan:
+        columnar["alternatives"] = [columnar_plan(alternative) for alternative in plan["alternatives"]]
+    return columnar
+
+
+def columnar_recommendation(recommendation: Dict) -> Dict:
+    """Columnar form of a /recommendation/departure body (departure_time in unix seconds)"""
+    candidates = recommendation["all_recommendations"]
+    return {
+        "format": "columnar",
+        "version": COLUMNAR_VERSION,
+        "route_info": recommendation["route_info"],
+        "best_departure": recommendation["best_departure"],
+        "all_recommendations": {
+            "count": len(candidates),
+            "departure_time": column([_epoch_seconds(item["departure_time"]) for item in candidates], "float64"),
+            "average_risk": column([item["average_risk"] for item in candidates], "float32"),
+            "risk_level": category_column([item["risk_level"] for item in candidates])
+        }
+    }
@@ -0,0 +1,223 @@
+"""
+End-to-end load scenarios against a real uvicorn process whose upstreams
+are the local stubs from benchmarks.stub_upstreams.
+
+Each scenario fires a fixed number of requests with bounded concurrency at
+one endpoint and reports p50/p95/p99 latency, throughput, error count and
+how many calls reached each stubbed upstream. Request parameters are drawn
+from small seeded pools, so repeated routes and places exercise the caches
+the way real traffic does.
+
+Run from the backend directory:
+    python -m benchmarks.bench_load
+    python -m benchmarks.bench_load --scenario plan --requests 200 --concurrency 32
+    python -m benchmarks.bench_load --latency openroute=800:300 --route-vertices 10000 --no-save
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+
+from benchmarks.reporting import report, summarize
+from benchmarks.stub_upstreams import StubServer, StubUpstreams, parse_latency
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+PLACES = [
+    "london", "paris", "berlin", "madrid", "rome", "vienna", "prague", "warsaw",
+    "amsterdam", "brussels", "lisbon", "dublin", "oslo", "stockholm", "helsinki", "zurich"
+]
+
+
+def route_pool(size: int, seed: int) -> List[Dict]:
+    """Origin/destination pairs around a few cities, 30-250 km apart"""
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(size):
+        start_lat, start_lon = rng.uniform(39.5, 42.5), rng.uniform(-76.0, -72.0)
+        bearing = rng.uniform(0, 6.283)
+        reach = rng.uniform(0.3, 2.2)
+        pool.append({
+            "start_lat": round(start_lat, 4),
+            "start_lon": round(start_lon, 4),
+            "end_lat": round(start_lat + reach * 0.8 * math.sin(bearing), 4),
+            "end_lon": round(start_lon + reach * math.cos(bearing), 4)
+        })
+    return pool
+
+
+def scenarios(seed: int) -> Dict[str, Callable[[random.Random], Tuple[str, str, Dict]]]:
+    """name -> request factory returning (method, path, json body or query params)"""
+    routes = route_pool(12, seed)
+
+    def plan(rng):
+        return "POST", "/route/plan", dict(rng.choice(routes))
+
+    def plan_batch(rng):
+        return "POST", "/route/plan/batch", {"routes": [dict(rng.choice(routes)) for _ in range(10)]}
+
+    def recommend(rng):
+        return "POST", "/recommendation/departure", {**rng.choice(routes), "time_window_hours": 6}
+
+    def forecast(rng):
+        return "POST", "/weather/forecast", {
+            "latitude": round(rng.uniform(39.5, 42.5), 3),
+            "longitude": round(rng.uniform(-76.0, -72.0), 3),
+            "start_time": datetime.now().replace(minute=0, second=0, microsecond=0).isoformat()
+        }
+
+    def forecast_points(rng):
+        return "POST", "/weather/forecast", {
+            "points": [
+                {"latitude": round(rng.uniform(39.5, 42.5), 3), "longitude": round(rng.uniform(-76.0, -72.0), 3)}
+                for _ in range(10)
+            ],
+            "start_time": datetime.now().replace(minute=0, second=0, microsecond=0).isoformat(),
+            "hours": 24,
+            "format": "columnar"
+        }
+
+    def geocoding(rng):
+        place = rng.choice(PLACES)
+        return "GET", "/geocoding/search", {"q": place[:rng.randint(2, len(place))]}
+
+    return {"plan": plan, "plan_batch": plan_batch, "recommend": recommend, "forecast": forecast, "forecast_points": forecast_points,
+            "geocoding": geocoding}
+
+
+async def run_scenario(base_url: str, factory, requests: int, concurrency: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    calls = [factory(rng) for _ in range(requests)]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    limit = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one(method: str, path: str, payload: Dict) -> None:
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    if method == "GET":
+                        response = await client.get(path, params=payload)
+                    else:
+                        response = await client.post(path, json=payload)
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - start)
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one(*call) for call in calls))
+        wall = time.perf_counter() - wall_start
+
+    result = summarize(latencies)
+    result["throughput_rps"] = round(requests / wall, 2)
+    result["errors"] = sum(count for status, count in statuses.items() if status != 200)
+    result["statuses"] = {str(status): count for status, count in statuses.items()}
+    return result
+
+
+def start_app(port: int, env: Dict[str, str], log_path: str = None) -> subprocess.Popen:
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited during startup with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not become healthy")
+
+
+def app_env(stub: StubServer, extra: Dict[str, str]) -> Dict[str, str]:
+    env = {
+        **os.environ,
+        **stub.env(),
+        "OPENROUTE_API_KEY": os.getenv("OPENROUTE_API_KEY", "benchmark-key"),
+        # Keep runs independent of each other and of a developer's local caches
+        "ROUTE_CACHE_PATH": "off",
+        "WEATHER_CACHE_DIR": "",
+        "PROPHET_CACHE_DIR": "",
+        # Repeats from the small pools would all be response cache hits; measure the
+        # pipeline by default (--env RESPONSE_CACHE=1 measures the cache instead)
+        "RESPONSE_CACHE": "0",
+        # The stub has no usage policy to respect
+        "NOMINATIM_RATE": "1000",
+        "NOMINATIM_BURST": "1000"
+    }
+    env.update(extra)
+    return env
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent load scenarios against stubbed upstreams")
+    parser.add_argument("--scenario", action="append", choices=["plan", "plan_batch", "recommend", "forecast", "forecast_points", "geocoding"],
+                        help="run only these scenarios (repeatable); default all")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", action="append", help="stub latency name=mean_ms:jitter_ms (repeatable)")
+    parser.add_argument("--fixtures", help="directory of recorded upstream responses to replay")
+    parser.add_argument("--route-vertices", type=int, default=2000)
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the app process")
+    parser.add_argument("--app-log", help="write the app's output to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-save", action="store_true", help="print only; do not store or compare")
+    args = parser.parse_args()
+
+    latency = parse_latency(args.latency)
+    stubs = StubUpstreams(latency, args.fixtures, args.route_vertices, seed=args.seed)
+    stub = StubServer(stubs, port=args.stub_port).start()
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    app = start_app(args.app_port, app_env(stub, extra_env), args.app_log)
+
+    results = {}
+    try:
+        for name, factory in scenarios(args.seed).items():
+            if args.scenario and name not in args.scenario:
+                continue
+            stubs.reset()
+            result = asyncio.run(run_scenario(
+                f"http://127.0.0.1:{args.app_port}", factory, args.requests, args.concurrency, args.seed
+            ))
+            result["upstream_calls"] = dict(stubs.calls)
+            results[name] = result
+    finally:
+        app.terminate()
+        app.wait(timeout=30)
+        stub.stop()
+
+    config = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "latency": {name: list(value) for name, value in stubs.latency.items()},
+        "fixtures": args.fixtures,
+        "route_vertices": args.route_vertices,
+        "env": extra_env
+    }
+    report("load", results, config, save=not args.no_save)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Micro-benchmarks for the CPU-bound pieces of a route plan: segmentation,
+polyline decoding, risk scoring and weather prediction. No network.
+
+Run from the backend directory:
+    python -m benchmarks.bench_micro            # print, store and compare with the last run
+    python -m benchmarks.bench_micro --no-save
+    python -m benchmarks.bench_micro --prophet  # also time the (slow) Prophet backend
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.ml.predictor import InterpolationPredictor, get_predictor
+from app.ml.severity_score import SeverityScorer
+from app.utils.openmeteo_api import OpenMeteoAPI
+from app.utils.osmnx_wrapper import OpenRouteServiceAPI
+from app.utils.segmenter import RouteSegmenter
+from benchmarks.bench_segmenter import synthetic_route
+from benchmarks.reporting import report, sample, summarize
+from benchmarks.stub_upstreams import StubUpstreams
+
+
+def conditions(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    return {
+        "temperature": [rng.uniform(-15, 40) for _ in range(count)],
+        "precipitation": [rng.choice([0.0, rng.uniform(0, 12)]) for _ in range(count)],
+        "windspeed": [rng.uniform(0, 70) for _ in range(count)],
+        "weathercode": [rng.choice([0, 1, 3, 45, 61, 63, 71, 80, 95]) for _ in range(count)],
+        "distance": [rng.uniform(1000, 6000) for _ in range(count)]
+    }
+
+
+def forecasts(count: int):
+    """Parsed Open-Meteo payloads along a line, as the predictor receives them"""
+    stubs = StubUpstreams()
+    return [
+        OpenMeteoAPI._parse_location(stubs._forecast(40.0 + i * 0.05, -100.0 + i * 0.05))
+        for i in range(count)
+    ]
+
+
+def run(include_prophet: bool = False):
+    results = {}
+    departure = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    for vertices, length_km in [(10_000, 400), (100_000, 2_000)]:
+        coordinates = synthetic_route(vertices, length_km)
+        repeat = 30 if vertices <= 10_000 else 5
+        results[f"segment_route[{vertices}]"] = summarize(sample(
+            lambda: RouteSegmenter.segment_route(coordinates, length_km * 45.0, 5000, departure), repeat
+        ))
+
+        encoded = OpenRouteServiceAPI.encode_polyline([[lat, lon] for lon, lat in coordinates])
+        results[f"decode_polyline[{vertices}]"] = summarize(sample(
+            lambda: OpenRouteServiceAPI.decode_polyline(encoded), repeat
+        ))
+
+    for count in (100, 1000):
+        inputs = conditions(count)
+        rows = list(zip(inputs["temperature"], inputs["precipitation"], inputs["windspeed"], inputs["weathercode"]))
+        results[f"risk_score_scalar[{count}]"] = summarize(sample(
+            lambda: [
+                SeverityScorer.calculate_risk_score(
+                    {"temperature": t, "precipitation": p, "windspeed": w, "weathercode": c}, d
+                )
+                for (t, p, w, c), d in zip(rows, inputs["distance"])
+            ],
+            30
+        ))
+        columns = {name: np.asarray(values, dtype=float) for name, values in inputs.items()}
+        results[f"risk_score_batch[{count}]"] = summarize(sample(
+            lambda: SeverityScorer.calculate_risk_score_batch(**columns), 30
+        ))
+
+    weather_batch = forecasts(100)
+    targets = [departure + timedelta(minutes=4 * i) for i in range(len(weather_batch))]
+    predictor = InterpolationPredictor()
+    results["predict_interpolation[100]"] = summarize(sample(
+        lambda: predictor.predict_batch(weather_batch, targets), 30
+    ))
+
+    if include_prophet:
+        prophet = get_predictor("prophet")
+        results["predict_prophet[5]"] = summarize(sample(
+            lambda: prophet.predict_batch(weather_batch[:5], targets[:5]), 3, warmup=0
+        ))
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for segmentation, decoding, scoring and prediction")
+    parser.add_argument("--no-save", action="store_true", help="print only; do not store or compare")
+    parser.add_argument("--prophet", action="store_true", help="include the Prophet predictor (slow)")
+    args = parser.parse_args()
+    report("micro", run(args.prophet), save=not args.no_save)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Route transport: ORS GeoJSON vs encoded-polyline responses on long routes.
+
+For each route size it measures what get_route pays once the response body
+has arrived: payload size (raw and gzip, as sent over the wire) and the time
+to turn the body into the coordinate list the app works with.
+  geojson          json.loads + coordinate arrays (OPENROUTE_FORMAT=geojson)
+  polyline         json.loads + vectorized decode + list (OPENROUTE_FORMAT=polyline)
+  polyline_array   the same, stopping at the NumPy array
+  polyline_legacy  the original per-character decoder, for reference
+Bodies come from the benchmark stubs, so they match what bench_load serves.
+
+Run from the backend directory:
+    python -m benchmarks.bench_route_transport
+    python -m benchmarks.bench_route_transport --vertices 10000 --vertices 200000 --elevation --no-save
+"""
+import argparse
+import gzip
+import json
+from typing import List
+
+from app.utils.osmnx_wrapper import OpenRouteServiceAPI
+from benchmarks.reporting import report, sample, summarize
+from benchmarks.stub_upstreams import StubUpstreams
+
+
+def legacy_decode_polyline(encoded: str) -> List[List[float]]:
+    """The original character-by-character decode_polyline, kept for comparison"""
+    inv = 1.0 / 1e5
+    decoded = []
+    previous = [0, 0]
+    i = 0
+
+    while i < len(encoded):
+        ll = [0, 0]
+        for j in [0, 1]:
+            shift = 0
+            byte = 0x20
+            while byte >= 0x20:
+                byte = ord(encoded[i]) - 63
+                i += 1
+                ll[j] |= (byte & 0x1f) << shift
+                shift += 5
+            ll[j] = previous[j] + (~(ll[j] >> 1) if ll[j] & 1 else (ll[j] >> 1))
+            previous[j] = ll[j]
+        decoded.append([float('%.6f' % (ll[0] * inv)), float('%.6f' % (ll[1] * inv))])
+
+    return decoded
+
+
+def parse_geojson(body: bytes) -> List[List[float]]:
+    data = json.loads(body)
+    return data["features"][0]["geometry"]["coordinates"]
+
+
+def parse_polyline(body: bytes, dimensions: int, as_list: bool = True):
+    route = json.loads(body)["routes"][0]
+    decoded = OpenRouteServiceAPI.decode_polyline_array(route["geometry"], dimensions=dimensions)
+    decoded[:, [0, 1]] = decoded[:, [1, 0]]
+    return decoded.tolist() if as_list else decoded
+
+
+def run(vertex_counts: List[int], elevation: bool, repeat: int) -> dict:
+    results = {}
+    dimensions = 3 if elevation else 2
+    for vertices in vertex_counts:
+        stubs = StubUpstreams(route_vertices=vertices)
+        route = stubs._route([-74.0, 40.7], [-71.0, 42.4])
+        if elevation:
+            route = stubs._with_elevation(route)
+        geojson_body = json.dumps(route, separators=(",", ":")).encode("utf-8")
+        polyline_body = json.dumps(stubs._route_json(route, elevation), separators=(",", ":")).encode("utf-8")
+
+        # Same vertices either way (polylines round to 1e-5 degrees)
+        assert len(parse_geojson(geojson_body)) == len(parse_polyline(polyline_body, dimensions)) == vertices
+
+        runs = {
+            "geojson": (geojson_body, lambda: parse_geojson(geojson_body)),
+            "polyline": (polyline_body, lambda: parse_polyline(polyline_body, dimensions)),
+            "polyline_array": (polyline_body, lambda: parse_polyline(polyline_body, dimensions, as_list=False))
+        }
+        if not elevation:
+            encoded = json.loads(polyline_body)["routes"][0]["geometry"]
+            runs["polyline_legacy"] = (polyline_body, lambda: legacy_decode_polyline(encoded))
+
+        for name, (body, func) in runs.items():
+            result = summarize(sample(func, repeat))
+            result["payload_bytes"] = len(body)
+            result["gzip_bytes"] = len(gzip.compress(body, 6))
+            results[f"{name}[{vertices}{'+ele' if elevation else ''}]"] = result
+    return results
+
+
+def print_transport(results: dict) -> None:
+    print(f"{'benchmark':<34} {'p50 ms':>9} {'p95 ms':>9} {'payload KB':>11} {'gzip KB':>9}")
+    for name, row in results.items():
+        print(f"{name:<34} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+              f"{row['payload_bytes'] / 1024:>11.1f} {row['gzip_bytes'] / 1024:>9.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ORS GeoJSON vs encoded-polyline route transport")
+    parser.add_argument("--vertices", type=int, action="append", help="route size (repeatable); default 10k/50k/100k")
+    parser.add_argument("--elevation", action="store_true", help="3D routes with an elevation per vertex")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--no-save", action="store_true", help="print only; do not store or compare")
+    args = parser.parse_args()
+
+    vertex_counts = args.vertices or [10_000, 50_000, 100_000]
+    results = run(vertex_counts, args.elevation, args.repeat)
+    config = {"vertices": vertex_counts, "elevation": args.elevation, "repeat": args.repeat}
+    report("route_transport", results, config, save=not args.no_save, printer=print_transport)
+
+
+if __name__ == "__main__":
+    main()
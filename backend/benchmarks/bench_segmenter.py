@@ -0,0 +1,120 @@
+"""
+Micro-benchmark: vectorized RouteSegmenter.segment_route vs the original
+per-vertex Python loop, on synthetic routes of increasing length.
+
+Run from the backend directory:
+    python -m benchmarks.bench_segmenter
+"""
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from app.utils.segmenter import RouteSegmenter
+
+
+def legacy_segment_route(coordinates: List[List[float]], total_duration: float,
+                         segment_distance: float = 5000, departure_time: datetime = None) -> List[Dict]:
+    """The original loop-based segment_route, kept for comparison"""
+    if not coordinates or len(coordinates) < 2:
+        return []
+
+    if departure_time is None:
+        departure_time = datetime.now()
+
+    segments = []
+    current_distance = 0
+    segment_start_idx = 0
+    total_route_distance = 0
+
+    for i in range(len(coordinates) - 1):
+        coord1 = (coordinates[i][1], coordinates[i][0])
+        coord2 = (coordinates[i + 1][1], coordinates[i + 1][0])
+        dist = RouteSegmenter.calculate_distance(coord1, coord2)
+        current_distance += dist
+        total_route_distance += dist
+
+        if current_distance >= segment_distance or i == len(coordinates) - 2:
+            progress_ratio = total_route_distance / (total_route_distance + RouteSegmenter.calculate_distance(
+                (coordinates[i][1], coordinates[i][0]),
+                (coordinates[-1][1], coordinates[-1][0])
+            )) if i < len(coordinates) - 2 else 1.0
+
+            time_offset = total_duration * progress_ratio
+            eta = departure_time + timedelta(seconds=time_offset)
+
+            mid_idx = (segment_start_idx + i + 1) // 2
+            segment_center = coordinates[mid_idx]
+
+            segments.append({
+                "id": len(segments),
+                "start_coord": coordinates[segment_start_idx],
+                "end_coord": coordinates[i + 1],
+                "center_coord": segment_center,
+                "distance": current_distance,
+                "eta": eta.isoformat(),
+                "coordinates": coordinates[segment_start_idx:i + 2]
+            })
+
+            current_distance = 0
+            segment_start_idx = i + 1
+
+    return segments
+
+
+def synthetic_route(vertices: int, length_km: float) -> List[List[float]]:
+    """A wiggly route of roughly length_km with the given number of vertices"""
+    step = length_km / 111.0 / vertices
+    return [
+        [round(-100.0 + i * step, 6), round(40.0 + 0.02 * math.sin(i / 50.0), 6)]
+        for i in range(vertices)
+    ]
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def check_equivalent(coordinates: List[List[float]], legacy: List[Dict], vectorized: List[Dict]) -> None:
+    assert len(legacy) == len(vectorized), (len(legacy), len(vectorized))
+    for old, new in zip(legacy, vectorized):
+        assert old["id"] == new["id"]
+        assert old["start_coord"] == new["start_coord"]
+        assert old["end_coord"] == new["end_coord"]
+        assert old["center_coord"] == new["center_coord"]
+        assert old["coordinates"] == coordinates[new["start_idx"]:new["end_idx"] + 1]
+        assert math.isclose(old["distance"], new["distance"], rel_tol=1e-9, abs_tol=1e-6)
+        eta_gap = datetime.fromisoformat(old["eta"]) - datetime.fromisoformat(new["eta"])
+        assert abs(eta_gap.total_seconds()) < 1e-3
+
+
+def main() -> None:
+    departure = datetime(2024, 1, 1, 8, 0)
+    print(f"{'vertices':>9} {'segments':>9} {'legacy ms':>10} {'vector ms':>10} {'speedup':>8} {'bounds ms':>10}")
+    for vertices, length_km in [(1_000, 50), (10_000, 400), (50_000, 2_000), (200_000, 4_500)]:
+        coordinates = synthetic_route(vertices, length_km)
+        duration = length_km * 45.0
+
+        legacy = legacy_segment_route(coordinates, duration, 5000, departure)
+        vectorized = RouteSegmenter.segment_route(coordinates, duration, 5000, departure)
+        check_equivalent(coordinates, legacy, vectorized)
+
+        repeat = 5 if vertices <= 50_000 else 2
+        legacy_time = best_of(lambda: legacy_segment_route(coordinates, duration, 5000, departure), repeat)
+        vector_time = best_of(lambda: RouteSegmenter.segment_route(coordinates, duration, 5000, departure), repeat)
+        # Index ranges only, starting from an array that is already in memory
+        coordinate_array = np.asarray(coordinates, dtype=float)
+        bounds_time = best_of(lambda: RouteSegmenter.segment_bounds(coordinate_array, duration, 5000), repeat)
+        print(f"{vertices:>9} {len(vectorized):>9} {legacy_time * 1000:>10.2f} "
+              f"{vector_time * 1000:>10.2f} {legacy_time / vector_time:>7.1f}x {bounds_time * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
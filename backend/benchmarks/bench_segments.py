@@ -0,0 +1,182 @@
+"""
+Segment representation: the original per-segment dicts vs SegmentTable.
+
+For each route size it runs what plan_route does between the route arriving
+and the response body being assembled (segment, predict, score, build the
+public segment dicts) both ways, from the same route and weather:
+  dicts  segment_route dicts with ISO ETAs, re-parsed for the predictor and
+         copied into enriched dicts (the original pipeline)
+  table  SegmentTable with index and ETA offset arrays, converted to dicts
+         only at the end
+and reports time, the memory the segments hold while a request awaits its
+weather (held_kb), peak traced allocation, and garbage collections run.
+
+Run from the backend directory:
+    python -m benchmarks.bench_segments
+    python -m benchmarks.bench_segments --vertices 400000 --no-save
+"""
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from app.ml.predictor import get_predictor
+from app.ml.severity_score import SeverityScorer
+from app.routes.planner import enrich_segments
+from app.utils.openmeteo_api import OpenMeteoAPI
+from app.utils.segmenter import RouteSegmenter
+from benchmarks.bench_segmenter import synthetic_route
+from benchmarks.reporting import report
+from benchmarks.stub_upstreams import StubUpstreams
+
+
+def legacy_segment_route(coordinates: List[List[float]], total_duration: float, segment_distance: float,
+                         departure_time: datetime) -> List[Dict]:
+    """segment_route as it was before SegmentTable: one dict per segment with an ISO ETA"""
+    bounds = RouteSegmenter.segment_bounds(coordinates, total_duration, segment_distance)
+    segments = []
+    for i, (start, end, center) in enumerate(zip(
+        bounds["start_idx"].tolist(), bounds["end_idx"].tolist(), bounds["center_idx"].tolist()
+    )):
+        eta = departure_time + timedelta(seconds=float(bounds["eta_offset"][i]))
+        segments.append({
+            "id": i,
+            "start_idx": start,
+            "end_idx": end,
+            "start_coord": coordinates[start],
+            "end_coord": coordinates[end],
+            "center_coord": coordinates[center],
+            "distance": float(bounds["distance"][i]),
+            "eta": eta.isoformat()
+        })
+    return segments
+
+
+async def legacy_enrich_segments(predictor, segments: List[Dict], weather_batch: List[Dict]) -> List[Dict]:
+    """enrich_segments as it was before SegmentTable"""
+    predictions = await predictor.predict_batch_async(
+        weather_batch, [datetime.fromisoformat(segment["eta"]) for segment in segments]
+    )
+    fallback = {"temperature": None, "precipitation": 0, "windspeed": 0, "weathercode": 0}
+    conditions = [prediction if weather_data and prediction else fallback
+                  for weather_data, prediction in zip(weather_batch, predictions)]
+
+    def column(metric: str, default: float) -> np.ndarray:
+        values = [condition.get(metric, default) for condition in conditions]
+        return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+    risks = SeverityScorer.calculate_risk_score_batch(
+        column("temperature", 15), column("precipitation", 0), column("windspeed", 0), column("weathercode", 0),
+        np.array([segment["distance"] for segment in segments], dtype=float)
+    )
+    enriched_segments = []
+    for index, (segment, predicted) in enumerate(zip(segments, conditions)):
+        if risks["missing"][index]:
+            risk = {"risk_level": "unknown", "severity_score": 0, "factors": {}}
+        else:
+            risk = {
+                "risk_level": risks["risk_level"][index],
+                "severity_score": float(risks["severity_score"][index]),
+                "factors": {name: float(values[index]) for name, values in risks["factors"].items()}
+            }
+        enriched_segments.append({**segment, "weather": {**predicted, "description": risks["description"][index]},
+                                  "risk": risk})
+    return enriched_segments
+
+
+def run_dicts(predictor, coordinates, duration, departure, weather_for, held: List[int]) -> List[Dict]:
+    before = tracemalloc.get_traced_memory()[0]
+    segments = legacy_segment_route(coordinates, duration, 5000, departure)
+    held.append(tracemalloc.get_traced_memory()[0] - before)
+    weather_batch = weather_for(len(segments))
+    return asyncio.run(legacy_enrich_segments(predictor, segments, weather_batch))
+
+
+def run_table(predictor, coordinates, duration, departure, weather_for, held: List[int]) -> List[Dict]:
+    before = tracemalloc.get_traced_memory()[0]
+    segments = RouteSegmenter.segment_table(coordinates, duration, 5000, departure)
+    held.append(tracemalloc.get_traced_memory()[0] - before)
+    weather_batch = weather_for(len(segments))
+    return asyncio.run(enrich_segments(predictor, segments, departure, weather_batch)).to_dicts()
+
+
+def measure(func, repeat: int) -> Dict:
+    collections = []
+    gc.callbacks.append(lambda phase, info: collections.append(1) if phase == "start" else None)
+    try:
+        timings, held, peaks = [], [], []
+        for _ in range(repeat):
+            gc.collect()
+            collections.clear()
+            tracemalloc.start()
+            start = time.perf_counter()
+            func(held)
+            timings.append(time.perf_counter() - start)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        runs = len(collections)
+    finally:
+        gc.callbacks.pop()
+    return {
+        "count": repeat,
+        "p50_ms": round(float(np.median(timings)) * 1000, 3),
+        "held_kb": round(float(np.median(held)) / 1024, 1),
+        "peak_kb": round(float(np.median(peaks)) / 1024, 1),
+        "gc_collections": runs
+    }
+
+
+def run(vertex_counts: List[int], repeat: int) -> Dict:
+    results = {}
+    predictor = get_predictor("interpolation")
+    stubs = StubUpstreams()
+    pool = [OpenMeteoAPI._parse_location(stubs._forecast(40.0 + i * 0.05, -100.0 + i * 0.05)) for i in range(64)]
+    departure = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+    def weather_for(count: int) -> List[Dict]:
+        return [pool[i % len(pool)] for i in range(count)]
+
+    for vertices in vertex_counts:
+        # About one vertex per 20 m, at 80 km/h
+        length_km = vertices * 0.02
+        coordinates = synthetic_route(vertices, length_km)
+        duration = length_km * 45.0
+
+        legacy = run_dicts(predictor, coordinates, duration, departure, weather_for, [])
+        table = run_table(predictor, coordinates, duration, departure, weather_for, [])
+        assert legacy == table, "SegmentTable output differs from the dict pipeline"
+
+        segments = len(table)
+        for name, func in (("dicts", run_dicts), ("table", run_table)):
+            results[f"{name}[{vertices}v/{segments}seg]"] = measure(
+                lambda held: func(predictor, coordinates, duration, departure, weather_for, held), repeat
+            )
+    return results
+
+
+def print_segments(results: Dict) -> None:
+    print(f"{'benchmark':<28} {'p50 ms':>9} {'held KB':>9} {'peak KB':>9} {'gc runs':>8}")
+    for name, row in results.items():
+        print(f"{name:<28} {row['p50_ms']:>9.2f} {row['held_kb']:>9.1f} {row['peak_kb']:>9.1f} {row['gc_collections']:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-segment dicts vs SegmentTable")
+    parser.add_argument("--vertices", type=int, action="append", help="route size (repeatable); default 20k/100k/400k")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-save", action="store_true", help="print only; do not store or compare")
+    args = parser.parse_args()
+
+    vertex_counts = args.vertices or [20_000, 100_000, 400_000]
+    results = run(vertex_counts, args.repeat)
+    report("segments", results, {"vertices": vertex_counts, "repeat": args.repeat}, save=not args.no_save,
+           printer=print_segments)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Startup time and memory of the API, to catch regressions in import cost.
+
+For each configuration it measures, in fresh interpreters:
+  import_seconds  time to import app.main
+  health_seconds  uvicorn launch until /health answers
+  ready_seconds   uvicorn launch until /ready answers 200 (includes WARMUP=1)
+  rss_mb          resident memory of the server once ready
+
+Upstreams point at the local stubs, so the WARMUP_POINTS step stays offline.
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --max-health-seconds 3 --max-rss-mb 250   # exit 1 on regression
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+import httpx
+
+from benchmarks.bench_load import app_env
+from benchmarks.reporting import report
+from benchmarks.stub_upstreams import StubServer, StubUpstreams
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+CONFIGURATIONS = {
+    "full": {},
+    "geocoding_only": {"API_ROUTERS": "geocoding"},
+    "full_warmup": {"WARMUP": "1", "WARMUP_POINTS": "40.7,-74.0;51.5,-0.1"}
+}
+
+
+def rss_mb(pid: int) -> float:
+    """Resident set size of a process, from /proc (Linux)"""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return float("nan")
+
+
+def import_seconds(env: Dict[str, str]) -> float:
+    code = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return round(float(output.strip().splitlines()[-1]), 3)
+
+
+def wait_for(url: str, deadline: float, process: subprocess.Popen) -> float:
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited during startup with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.monotonic()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError(f"{url} did not answer in time")
+
+
+def measure(env: Dict[str, str], port: int) -> Dict:
+    result = {"import_seconds": import_seconds(env)}
+    launched = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = launched + 180
+        result["health_seconds"] = round(wait_for(f"http://127.0.0.1:{port}/health", deadline, process) - launched, 3)
+        result["ready_seconds"] = round(wait_for(f"http://127.0.0.1:{port}/ready", deadline, process) - launched, 3)
+        result["rss_mb"] = rss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return result
+
+
+def print_startup(results: Dict) -> None:
+    print(f"{'configuration':<18} {'import s':>9} {'health s':>9} {'ready s':>9} {'RSS MB':>8}")
+    for name, row in results.items():
+        print(f"{name:<18} {row['import_seconds']:>9.3f} {row['health_seconds']:>9.3f} "
+              f"{row['ready_seconds']:>9.3f} {row['rss_mb']:>8.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Startup time and RSS of the API")
+    parser.add_argument("--configuration", action="append", choices=list(CONFIGURATIONS))
+    parser.add_argument("--app-port", type=int, default=8101)
+    parser.add_argument("--stub-port", type=int, default=9101)
+    parser.add_argument("--max-health-seconds", type=float, help="fail if any configuration is slower to /health")
+    parser.add_argument("--max-rss-mb", type=float, help="fail if any configuration (without warmup) uses more memory")
+    parser.add_argument("--no-save", action="store_true", help="print only; do not store or compare")
+    args = parser.parse_args()
+
+    stub = StubServer(StubUpstreams(latency={name: (0.0, 0.0) for name in ("openmeteo", "openroute", "nominatim")}),
+                      port=args.stub_port).start()
+    results = {}
+    try:
+        for name, extra in CONFIGURATIONS.items():
+            if args.configuration and name not in args.configuration:
+                continue
+            results[name] = measure(app_env(stub, extra), args.app_port)
+    finally:
+        stub.stop()
+
+    report("startup", results, save=not args.no_save, printer=print_startup)
+
+    failures = []
+    for name, row in results.items():
+        if args.max_health_seconds is not None and row["health_seconds"] > args.max_health_seconds:
+            failures.append(f"{name}: /health after {row['health_seconds']}s > {args.max_health_seconds}s")
+        if args.max_rss_mb is not None and "WARMUP" not in CONFIGURATIONS[name] and row["rss_mb"] > args.max_rss_mb:
+            failures.append(f"{name}: RSS {row['rss_mb']} MB > {args.max_rss_mb} MB")
+    if failures:
+        sys.exit("Startup regression:\n  " + "\n  ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
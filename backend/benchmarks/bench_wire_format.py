@@ -0,0 +1,151 @@
+"""
+Response wire formats: JSON vs columnar MessagePack for /route/plan and
+/recommendation/departure bodies.
+
+Plan bodies are built offline the way plan_route builds them (stub route and
+forecasts, interpolation predictor), for a few route lengths. For each body
+it measures:
+  json              jsonable_encoder + JSONResponse rendering (the default)
+  msgpack_nested    MessagePack of the same nested dicts, for reference
+  msgpack_columnar  columnar_plan / columnar_recommendation + MessagePack
+with payload size (raw and gzip) and the client-side decode time (json.loads,
+or unpacking plus viewing each typed column as a NumPy array).
+
+Run from the backend directory:
+    python -m benchmarks.bench_wire_format
+    python -m benchmarks.bench_wire_format --vertices 20000 --length-km 2000 --no-save
+"""
+import argparse
+import asyncio
+import gzip
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.ml.predictor import get_predictor
+from app.routes.planner import RouteRequest, build_route_geometry, enrich_segments, plan_response
+from app.utils.openmeteo_api import OpenMeteoAPI
+from app.utils.segmenter import RouteSegmenter
+from app.utils.wire_format import columnar_plan, columnar_recommendation, msgpack_available, packb
+from benchmarks.reporting import report, sample, summarize
+from benchmarks.stub_upstreams import StubUpstreams
+
+
+def plan_body(vertices: int, length_km: float) -> Dict:
+    """A /route/plan body for a route of this many vertices and about this length"""
+    stubs = StubUpstreams(route_vertices=vertices)
+    # Due east from New York; a degree of longitude is about 84 km here
+    start = [-74.0, 40.7]
+    route = stubs._route(start, [start[0] + length_km / 84.0 / 1.25, start[1]])
+    feature = route["features"][0]
+    coordinates = feature["geometry"]["coordinates"]
+    duration = feature["properties"]["summary"]["duration"]
+
+    departure = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    segments = RouteSegmenter.segment_table(coordinates, duration, 5000, departure)
+    weather_batch = [OpenMeteoAPI._parse_location(stubs._forecast(lat, lon)) for lat, lon in segments.points()]
+    predictor = get_predictor("interpolation")
+    enriched = asyncio.run(enrich_segments(predictor, segments, departure, weather_batch))
+
+    request = RouteRequest(start_lat=start[1], start_lon=start[0], end_lat=start[1], end_lon=start[0])
+    geometry = build_route_geometry(request, coordinates, enriched)
+    return plan_response(predictor, departure, {"distance": feature["properties"]["summary"]["distance"],
+                                                "duration": duration}, geometry, enriched)
+
+
+def recommendation_body(candidates: int) -> Dict:
+    """A /recommendation/departure body ranking this many departures"""
+    rng = np.random.default_rng(0)
+    now = datetime.now()
+    ranked = sorted((
+        {
+            "departure_time": (now + timedelta(minutes=15 * i)).isoformat(),
+            "average_risk": round(float(risk), 2),
+            "risk_level": "safe" if risk < 20 else "moderate" if risk < 50 else "risky" if risk < 75 else "dangerous"
+        }
+        for i, risk in enumerate(rng.uniform(0, 90, candidates))
+    ), key=lambda item: item["average_risk"])
+    return {"route_info": {"distance": 250000.0, "duration": 11000.0}, "best_departure": ranked[0],
+            "all_recommendations": ranked}
+
+
+def render_json(content: Dict) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def decode_columnar(body: bytes) -> Dict:
+    """What a client does with a columnar body: unpack, then view typed columns as arrays"""
+    import msgpack
+
+    def view(value):
+        if isinstance(value, dict):
+            if value.get("dtype") == "category":
+                return np.frombuffer(value["data"], dtype=np.dtype(value["codes_dtype"]).newbyteorder("<"))
+            if "dtype" in value and "data" in value:
+                dtype = np.dtype(value["dtype"]).newbyteorder("<")
+                return np.frombuffer(value["data"], dtype=dtype).reshape(value["shape"])
+            return {key: view(item) for key, item in value.items()}
+        return value
+
+    return view(msgpack.unpackb(body))
+
+
+def measure(name: str, content: Dict, columnar, repeat: int, results: Dict) -> None:
+    import msgpack
+
+    runs = {
+        "json": (lambda: render_json(content), json.loads),
+        "msgpack_nested": (lambda: packb(jsonable_encoder(content)), msgpack.unpackb),
+        "msgpack_columnar": (lambda: packb(columnar(content)), decode_columnar)
+    }
+    for label, (encode, decode) in runs.items():
+        body = encode()
+        result = summarize(sample(encode, repeat))
+        result["decode_p50_ms"] = summarize(sample(lambda: decode(body), repeat))["p50_ms"]
+        result["payload_bytes"] = len(body)
+        result["gzip_bytes"] = len(gzip.compress(body, 6))
+        results[f"{label}[{name}]"] = result
+
+
+def run(routes: List[tuple], candidates: int, repeat: int) -> Dict:
+    results = {}
+    for vertices, length_km in routes:
+        content = plan_body(vertices, length_km)
+        measure(f"plan {vertices}v/{len(content['segments'])}seg", content, columnar_plan, repeat, results)
+    measure(f"recommend {candidates}", recommendation_body(candidates), columnar_recommendation, repeat, results)
+    return results
+
+
+def print_wire(results: Dict) -> None:
+    print(f"{'benchmark':<40} {'encode p50':>11} {'decode p50':>11} {'payload KB':>11} {'gzip KB':>9}")
+    for name, row in results.items():
+        print(f"{name:<40} {row['p50_ms']:>9.2f}ms {row['decode_p50_ms']:>9.2f}ms "
+              f"{row['payload_bytes'] / 1024:>11.1f} {row['gzip_bytes'] / 1024:>9.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JSON vs columnar MessagePack response bodies")
+    parser.add_argument("--vertices", type=int, action="append", help="route size (repeatable); default 2k/20k/100k")
+    parser.add_argument("--length-km", type=float, default=None, help="route length; default scales with vertices")
+    parser.add_argument("--candidates", type=int, default=672, help="departures ranked by the recommendation body")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--no-save", action="store_true", help="print only; do not store or compare")
+    args = parser.parse_args()
+
+    if not msgpack_available():
+        parser.error("the msgpack package is not installed (pip install msgpack)")
+
+    vertex_counts = args.vertices or [2_000, 20_000, 100_000]
+    # Roughly one vertex per 20 m of road unless a length is given
+    routes = [(vertices, args.length_km or max(50.0, vertices * 0.02)) for vertices in vertex_counts]
+    results = run(routes, args.candidates, args.repeat)
+    config = {"routes": routes, "candidates": args.candidates, "repeat": args.repeat}
+    report("wire_format", results, config, save=not args.no_save, printer=print_wire)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Shared helpers for the benchmark suite: latency summaries, result files
+and comparisons between runs.
+
+Results are written to benchmarks/results/<suite>-<timestamp>-<commit>.json.
+Compare two runs (or the latest two of a suite) from the backend directory:
+    python -m benchmarks.reporting load
+    python -m benchmarks.reporting benchmarks/results/a.json benchmarks/results/b.json
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Metrics compared between runs, in display order
+COMPARED_METRICS = (
+    "p50_ms", "p95_ms", "p99_ms", "throughput_rps",
+    "import_seconds", "health_seconds", "ready_seconds", "rss_mb"
+)
+
+
+def summarize(samples: List[float]) -> Dict:
+    """p50/p95/p99/mean/max in milliseconds for a list of durations in seconds"""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=float) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "max_ms": round(float(values.max()), 3)
+    }
+
+
+def sample(func, repeat: int, warmup: int = 1) -> List[float]:
+    """Time repeat calls of func after a few untimed warmup calls"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=Path(__file__).resolve().parent, capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def environment() -> Dict:
+    """Where and on what a run happened, stored next to its numbers"""
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count()
+    }
+
+
+def save_results(suite: str, results: Dict, config: Optional[Dict] = None, directory: Optional[Path] = None) -> Path:
+    """Write one run to the results directory and return its path"""
+    directory = Path(directory or RESULTS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    env = environment()
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = directory / f"{suite}-{stamp}-{env['commit']}{'-dirty' if env['dirty'] else ''}.json"
+    path.write_text(json.dumps({
+        "suite": suite,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": env,
+        "config": config or {},
+        "results": results
+    }, indent=2), encoding="utf-8")
+    return path
+
+
+def previous_results(suite: str, directory: Optional[Path] = None, skip: int = 0) -> Optional[Path]:
+    """Most recent stored run of a suite (skip=1 for the one before it)"""
+    runs = sorted(Path(directory or RESULTS_DIR).glob(f"{suite}-*.json"))
+    return runs[-1 - skip] if len(runs) > skip else None
+
+
+def compare(baseline: Dict, current: Dict) -> List[str]:
+    """Line-per-metric diff of two stored runs, matching benchmarks by name"""
+    lines = [
+        f"baseline {baseline['environment']['commit']} ({baseline['created_at']}) -> "
+        f"current {current['environment']['commit']} ({current['created_at']})"
+    ]
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            lines.append(f"  {name}: new")
+            continue
+        changes = []
+        for metric in COMPARED_METRICS:
+            if metric in old and metric in new and old[metric]:
+                delta = (new[metric] - old[metric]) / old[metric] * 100
+                changes.append(f"{metric} {old[metric]:.2f} -> {new[metric]:.2f} ({delta:+.1f}%)")
+        if old.get("upstream_calls") != new.get("upstream_calls") and "upstream_calls" in new:
+            changes.append(f"upstream_calls {old.get('upstream_calls')} -> {new['upstream_calls']}")
+        lines.append(f"  {name}: " + ("; ".join(changes) or "no comparable metrics"))
+    return lines
+
+
+def print_table(results: Dict) -> None:
+    print(f"{'benchmark':<34} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}  upstream calls")
+    for name, row in results.items():
+        throughput = f"{row['throughput_rps']:>8.1f}" if "throughput_rps" in row else f"{'':>8}"
+        calls = row.get("upstream_calls", "")
+        errors = f"  errors: {row['errors']}" if row.get("errors") else ""
+        print(f"{name:<34} {row.get('count', 0):>6} {row.get('p50_ms', 0):>9.2f} {row.get('p95_ms', 0):>9.2f} "
+              f"{row.get('p99_ms', 0):>9.2f} {throughput}  {calls}{errors}")
+
+
+def report(suite: str, results: Dict, config: Optional[Dict] = None, save: bool = True,
+           printer=print_table) -> None:
+    """Print a run, store it and show how it moved against the previous stored run"""
+    printer(results)
+    if not save:
+        return
+    baseline_path = previous_results(suite)
+    path = save_results(suite, results, config)
+    print(f"\nSaved {path}")
+    if baseline_path is not None:
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        current = json.loads(path.read_text(encoding="utf-8"))
+        print("\n".join(compare(baseline, current)))
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    if len(args) == 1:
+        newer, older = previous_results(args[0]), previous_results(args[0], skip=1)
+        if newer is None or older is None:
+            sys.exit(f"Need two stored '{args[0]}' runs in {RESULTS_DIR}")
+        paths = [older, newer]
+    elif len(args) == 2:
+        paths = [Path(p) for p in args]
+    else:
+        sys.exit("usage: python -m benchmarks.reporting <suite> | <baseline.json> <current.json>")
+    baseline, current = (json.loads(p.read_text(encoding="utf-8")) for p in paths)
+    print("\n".join(compare(baseline, current)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Local stand-ins for Open-Meteo, OpenRouteService and Nominatim, so the
+service can be benchmarked offline and repeatably.
+
+Responses are synthetic by default; a fixtures directory of recorded
+responses (openmeteo.json, openroute.json, nominatim_search.json,
+nominatim_reverse.json, any subset) is replayed instead where present.
+Each upstream gets its own latency and jitter, and every call is counted.
+
+Run standalone from the backend directory and point the app at it:
+    python -m benchmarks.stub_upstreams --port 9100 --latency openmeteo=120:40 --latency openroute=300:100
+    OPENMETEO_BASE_URL=http://127.0.0.1:9100/openmeteo/v1/forecast \\
+    OPENROUTE_BASE_URL=http://127.0.0.1:9100/ors/v2/directions/driving-car \\
+    NOMINATIM_BASE_URL=http://127.0.0.1:9100/nominatim uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.utils.osmnx_wrapper import OpenRouteServiceAPI
+
+# name -> (mean latency ms, jitter ms); observed ballpark for the public APIs
+DEFAULT_LATENCY = {
+    "openmeteo": (120.0, 40.0),
+    "openroute": (350.0, 120.0),
+    "nominatim": (150.0, 50.0)
+}
+
+
+class StubUpstreams:
+    """The stub application plus its call counters and latency settings"""
+
+    def __init__(self, latency: Optional[Dict[str, Tuple[float, float]]] = None,
+                 fixtures_dir: Optional[str] = None, route_vertices: int = 2000,
+                 forecast_hours: int = 168, seed: int = 0):
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.route_vertices = route_vertices
+        self.forecast_hours = forecast_hours
+        self.calls: Counter = Counter()
+        self.locations: Counter = Counter()
+        self._random = random.Random(seed)
+        self.fixtures = {}
+        if fixtures_dir:
+            for name in ("openmeteo", "openroute", "nominatim_search", "nominatim_reverse"):
+                path = Path(fixtures_dir) / f"{name}.json"
+                if path.exists():
+                    self.fixtures[name] = json.loads(path.read_text(encoding="utf-8"))
+        self.app = self._build_app()
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.locations.clear()
+
+    def stats(self) -> Dict:
+        return {"calls": dict(self.calls), "locations": dict(self.locations)}
+
+    async def _delay(self, name: str) -> None:
+        mean, jitter = self.latency.get(name, (0.0, 0.0))
+        delay = max(0.0, mean + self._random.uniform(-jitter, jitter)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+
+    def _forecast(self, latitude: float, longitude: float) -> Dict:
+        recorded = self.fixtures.get("openmeteo")
+        if recorded is not None:
+            location = dict(recorded[0] if isinstance(recorded, list) else recorded)
+            location.update({"latitude": latitude, "longitude": longitude})
+            return location
+
+        # Open-Meteo starts hourly series at local midnight of the current day
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        phase = (latitude * 7.0 + longitude * 3.0) % 24
+        hours = range(self.forecast_hours)
+        return {
+            "latitude": round(latitude, 4),
+            "longitude": round(longitude, 4),
+            "timezone": "GMT",
+            "utc_offset_seconds": 0,
+            "hourly": {
+                "time": [(start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in hours],
+                "temperature_2m": [round(12 + 9 * math.sin((h + phase) / 24 * 2 * math.pi), 1) for h in hours],
+                "precipitation": [round(max(0.0, 2.5 * math.sin((h + phase) / 9)), 1) for h in hours],
+                "windspeed_10m": [round(8 + 6 * abs(math.sin((h + phase) / 5)), 1) for h in hours],
+                "weathercode": [(0, 2, 3, 61, 63, 80, 95)[int(h + phase) % 7] for h in hours]
+            }
+        }
+
+    @staticmethod
+    def _window(location: Dict, start_hour: Optional[str], end_hour: Optional[str], unixtime: bool) -> Dict:
+        """Apply Open-Meteo's start_hour/end_hour (inclusive, local time) and timeformat=unixtime"""
+        hourly = location.get("hourly", {})
+        times = hourly.get("time", [])
+        keep = [i for i, t in enumerate(times)
+                if (start_hour is None or t >= start_hour) and (end_hour is None or t <= end_hour)]
+        windowed = {key: [values[i] for i in keep if i < len(values)] for key, values in hourly.items()}
+        if unixtime:
+            offset = location.get("utc_offset_seconds") or 0
+            epoch = datetime(1970, 1, 1)
+            windowed["time"] = [int((datetime.fromisoformat(t) - epoch).total_seconds()) - offset
+                                for t in windowed["time"]]
+        return {**location, "hourly": windowed}
+
+    def _route(self, start, end, variant: int = 0) -> Dict:
+        """A synthetic route; variant k > 0 is an alternative that bows away from it mid-route"""
+        recorded = self.fixtures.get("openroute")
+        if recorded is not None:
+            return recorded
+
+        count = max(2, self.route_vertices)
+        # Alternatives bulge to alternating sides, sharing the ends with the main route
+        bulge = 0.08 * ((variant + 1) // 2) * (1 if variant % 2 else -1)
+        coordinates = []
+        for i in range(count):
+            t = i / (count - 1)
+            wiggle = 0.01 * math.sin(t * 40)
+            offset = bulge * math.sin(math.pi * t)
+            coordinates.append([
+                round(start[0] + (end[0] - start[0]) * t + wiggle - offset, 6),
+                round(start[1] + (end[1] - start[1]) * t - wiggle + offset, 6)
+            ])
+        mean_lat = math.radians((start[1] + end[1]) / 2)
+        straight = math.hypot((end[0] - start[0]) * 111320 * math.cos(mean_lat), (end[1] - start[1]) * 110540)
+        distance = round(straight * (1.25 + 0.06 * variant), 1)
+        return {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": coordinates},
+                "properties": {"summary": {"distance": distance, "duration": round(distance / 22.0, 1)}}
+            }]
+        }
+
+    def _routes(self, body: Dict) -> Dict:
+        """The GeoJSON answer to an ORS request body, with any alternative_routes asked for"""
+        start, end = body["coordinates"][0], body["coordinates"][-1]
+        route = self._route(start, end)
+        target_count = (body.get("alternative_routes") or {}).get("target_count", 1)
+        if target_count > 1 and "openroute" not in self.fixtures:
+            route = {**route, "features": [self._route(start, end, k)["features"][0] for k in range(min(target_count, 3))]}
+        if body.get("elevation"):
+            route = self._with_elevation(route)
+        return route
+
+    @staticmethod
+    def _with_elevation(route: Dict) -> Dict:
+        """Add a synthetic elevation (meters) to GeoJSON coordinates that lack one"""
+        features = []
+        for feature in route["features"]:
+            coordinates = feature["geometry"]["coordinates"]
+            if coordinates and len(coordinates[0]) == 2:
+                coordinates = [[lon, lat, round(150 + 120 * math.sin(i / 300), 2)]
+                               for i, (lon, lat) in enumerate(coordinates)]
+            features.append({**feature, "geometry": {**feature["geometry"], "coordinates": coordinates}})
+        return {**route, "features": features}
+
+    def _route_json(self, route: Dict, elevation: bool) -> Dict:
+        """The same routes in ORS's /json shape: geometries as encoded polylines"""
+        if elevation:
+            route = self._with_elevation(route)
+        routes = []
+        for feature in route["features"]:
+            coordinates = np.asarray(feature["geometry"]["coordinates"], dtype=float)
+            # Polylines are [lat, lon(, elevation)]
+            coordinates[:, [0, 1]] = coordinates[:, [1, 0]]
+            geometry = OpenRouteServiceAPI.encode_polyline(
+                coordinates, elevation_precision=OpenRouteServiceAPI.ELEVATION_PRECISION if elevation else None
+            )
+            routes.append({"summary": feature["properties"]["summary"], "geometry": geometry})
+        return {"routes": routes}
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Upstream stubs")
+
+        @app.get("/openmeteo/v1/forecast")
+        async def openmeteo(latitude: str, longitude: str, start_hour: Optional[str] = None,
+                            end_hour: Optional[str] = None, timeformat: str = "iso8601"):
+            self.calls["openmeteo"] += 1
+            points = list(zip((float(v) for v in latitude.split(",")), (float(v) for v in longitude.split(","))))
+            self.locations["openmeteo"] += len(points)
+            await self._delay("openmeteo")
+            locations = [self._forecast(lat, lon) for lat, lon in points]
+            if start_hour or end_hour or timeformat == "unixtime":
+                locations = [self._window(location, start_hour, end_hour, timeformat == "unixtime")
+                             for location in locations]
+            return locations[0] if len(locations) == 1 else locations
+
+        @app.post("/ors/v2/directions/{profile}/geojson")
+        async def openroute(profile: str, request: Request):
+            self.calls["openroute"] += 1
+            body = await request.json()
+            await self._delay("openroute")
+            return self._routes(body)
+
+        @app.post("/ors/v2/directions/{profile}/json")
+        async def openroute_json(profile: str, request: Request):
+            self.calls["openroute"] += 1
+            body = await request.json()
+            await self._delay("openroute")
+            # _routes already added any elevation
+            return self._route_json(self._routes(body), False)
+
+        @app.get("/nominatim/search")
+        async def search(q: str, limit: int = 5):
+            self.calls["nominatim"] += 1
+            await self._delay("nominatim")
+            if "nominatim_search" in self.fixtures:
+                return self.fixtures["nominatim_search"][:limit]
+            return [
+                {
+                    "display_name": f"{q.title()} {i}, Region, Country",
+                    "lat": str(40 + i * 0.1),
+                    "lon": str(-74 + i * 0.1),
+                    "type": "city",
+                    "importance": round(0.9 - i * 0.1, 2)
+                }
+                for i in range(limit)
+            ]
+
+        @app.get("/nominatim/reverse")
+        async def reverse(lat: float, lon: float):
+            self.calls["nominatim"] += 1
+            await self._delay("nominatim")
+            if "nominatim_reverse" in self.fixtures:
+                return self.fixtures["nominatim_reverse"]
+            return {"display_name": f"Place near {lat:.3f}, {lon:.3f}"}
+
+        @app.get("/_stats")
+        async def stats():
+            return self.stats()
+
+        @app.post("/_reset")
+        async def reset():
+            self.reset()
+            return JSONResponse({"ok": True})
+
+        return app
+
+
+class StubServer:
+    """Serves a StubUpstreams app with uvicorn on a background thread"""
+
+    def __init__(self, stubs: StubUpstreams, host: str = "127.0.0.1", port: int = 9100):
+        import uvicorn
+        self.stubs = stubs
+        self.host = host
+        self.port = port
+        self._server = uvicorn.Server(uvicorn.Config(stubs.app, host=host, port=port, log_level="warning"))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points the app at these stubs"""
+        return {
+            "OPENMETEO_BASE_URL": f"{self.base_url}/openmeteo/v1/forecast",
+            "OPENROUTE_BASE_URL": f"{self.base_url}/ors/v2/directions/driving-car",
+            "NOMINATIM_BASE_URL": f"{self.base_url}/nominatim"
+        }
+
+    def start(self, timeout: float = 10) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"Stub upstreams did not start on {self.base_url}")
+            time.sleep(0.05)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+
+def parse_latency(values) -> Dict[str, Tuple[float, float]]:
+    """["openmeteo=120:40", ...] -> {"openmeteo": (120.0, 40.0)}"""
+    latency = {}
+    for value in values or []:
+        name, _, spec = value.partition("=")
+        mean, _, jitter = spec.partition(":")
+        latency[name.strip()] = (float(mean), float(jitter or 0))
+    return latency
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", action="append", help="name=mean_ms:jitter_ms, e.g. openroute=300:100")
+    parser.add_argument("--fixtures", help="directory of recorded responses to replay")
+    parser.add_argument("--route-vertices", type=int, default=2000)
+    args = parser.parse_args()
+
+    import uvicorn
+    stubs = StubUpstreams(parse_latency(args.latency), args.fixtures, args.route_vertices)
+    uvicorn.run(stubs.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.utils.http_client import UpstreamClients
+from app.utils.resilience import CircuitBreaker, CircuitOpenError
+
+
+def clients_with(handler) -> UpstreamClients:
+    clients = UpstreamClients()
+    clients._clients["openroute"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return clients
+
+
+def half_open_soon(breaker: CircuitBreaker) -> None:
+    """Open the breaker with its reset period already over, so the next call is the probe"""
+    breaker.state = CircuitBreaker.OPEN
+    breaker.opened_at = time.monotonic() - breaker.reset_seconds - 1
+
+
+def test_cancelled_probe_lets_the_breaker_recover():
+    slow = asyncio.Event()
+
+    async def handler(request):
+        if request.url.path == "/slow":
+            await slow.wait()
+        return httpx.Response(200, json={})
+
+    async def scenario():
+        clients = clients_with(handler)
+        breaker = clients.breakers["openroute"]
+        half_open_soon(breaker)
+
+        probe = asyncio.create_task(clients.post("openroute", "http://ors.test/slow", json={}))
+        await asyncio.sleep(0.05)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        response = await clients.post("openroute", "http://ors.test/fast", json={})
+        assert response.status_code == 200
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_probe_failing_with_an_unexpected_error_reopens_the_breaker():
+    def handler(request):
+        raise ValueError("unexpected")
+
+    async def scenario():
+        clients = clients_with(handler)
+        breaker = clients.breakers["openroute"]
+        half_open_soon(breaker)
+
+        with pytest.raises(ValueError):
+            await clients.post("openroute", "http://ors.test/route", json={})
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await clients.post("openroute", "http://ors.test/route", json={})
+
+    asyncio.run(scenario())
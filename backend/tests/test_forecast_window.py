@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.utils import openmeteo_api
+from app.utils.openmeteo_api import OpenMeteoAPI
+from app.utils.weather_cache import WeatherCache
+
+PARIS = (48.85, 2.35)
+# Central European Summer Time, as Open-Meteo reports it with timezone=auto
+PARIS_OFFSET = 2 * 3600
+
+
+def fake_open_meteo(requests):
+    """_request_locations stand-in that answers like Open-Meteo for a location at PARIS_OFFSET"""
+    async def request_locations(points, extra_params=None):
+        requests.append(extra_params)
+        # start_hour/end_hour are local wall-clock hours; unixtime answers are UTC instants
+        first = datetime.fromisoformat(extra_params["start_hour"]).replace(tzinfo=timezone.utc)
+        last = datetime.fromisoformat(extra_params["end_hour"]).replace(tzinfo=timezone.utc)
+        count = int((last - first).total_seconds() // 3600) + 1
+        times = [int(first.timestamp()) - PARIS_OFFSET + 3600 * i for i in range(count)]
+        hourly = {"time": times, **{key: [float(i) for i in range(count)] for key in OpenMeteoAPI.METRIC_KEYS.values()}}
+        return [{"hourly": hourly, "latitude": lat, "longitude": lon, "timezone": "Europe/Paris",
+                 "utc_offset_seconds": PARIS_OFFSET} for lat, lon in points]
+    return request_locations
+
+
+def fetch_window(monkeypatch, start_time, hours):
+    requests = []
+    monkeypatch.setattr(openmeteo_api, "weather_cache", WeatherCache())
+    monkeypatch.setattr(OpenMeteoAPI, "_request_locations", staticmethod(fake_open_meteo(requests)))
+    return asyncio.run(OpenMeteoAPI.fetch_forecast_window([PARIS], start_time, hours))[0], requests
+
+
+def test_aware_start_is_an_instant_at_a_location_with_an_offset(monkeypatch):
+    start = datetime(2026, 6, 1, 10, 30, tzinfo=timezone.utc)
+    payload, _ = fetch_window(monkeypatch, start, 6)
+
+    times = payload["hourly"]["time"]
+    assert len(times) == 6
+    assert times[0] == int(datetime(2026, 6, 1, 10, tzinfo=timezone.utc).timestamp())
+    assert times[-1] - times[0] == 5 * 3600
+    assert all(len(values) == 6 for values in payload["hourly"].values())
+    assert payload["utc_offset_seconds"] == PARIS_OFFSET
+
+
+def test_aware_start_with_its_own_offset(monkeypatch):
+    # 07:00 at UTC-5 is 12:00 UTC
+    start = datetime(2026, 6, 1, 7, tzinfo=timezone(timedelta(hours=-5)))
+    payload, _ = fetch_window(monkeypatch, start, 3)
+
+    assert payload["hourly"]["time"][0] == int(datetime(2026, 6, 1, 12, tzinfo=timezone.utc).timestamp())
+
+
+def test_naive_start_is_local_wall_clock(monkeypatch):
+    payload, requests = fetch_window(monkeypatch, datetime(2026, 6, 1, 10), 4)
+
+    assert requests[0]["start_hour"] == "2026-06-01T10:00"
+    assert requests[0]["end_hour"] == "2026-06-01T13:00"
+    # 10:00 in Paris is 08:00 UTC
+    assert payload["hourly"]["time"][0] == int(datetime(2026, 6, 1, 8, tzinfo=timezone.utc).timestamp())
+    assert len(payload["hourly"]["time"]) == 4
@@ -0,0 +1,93 @@
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.utils.segmenter import RouteSegmenter
+
+DEPARTURE = datetime(2026, 6, 1, 8, 0)
+
+
+def baseline_segment_route(coordinates, total_duration, segment_distance=5000, departure_time=None):
+    """RouteSegmenter.segment_route as it was before SegmentTable: one haversine call per vertex"""
+    segments = []
+    current_distance = 0
+    segment_start_idx = 0
+    total_route_distance = 0
+    for i in range(len(coordinates) - 1):
+        coord1 = (coordinates[i][1], coordinates[i][0])
+        coord2 = (coordinates[i + 1][1], coordinates[i + 1][0])
+        dist = RouteSegmenter.calculate_distance(coord1, coord2)
+        current_distance += dist
+        total_route_distance += dist
+        if current_distance >= segment_distance or i == len(coordinates) - 2:
+            progress_ratio = total_route_distance / (total_route_distance + RouteSegmenter.calculate_distance(
+                (coordinates[i][1], coordinates[i][0]),
+                (coordinates[-1][1], coordinates[-1][0])
+            )) if i < len(coordinates) - 2 else 1.0
+            eta = departure_time + timedelta(seconds=total_duration * progress_ratio)
+            segments.append({
+                "id": len(segments),
+                "start_coord": coordinates[segment_start_idx],
+                "end_coord": coordinates[i + 1],
+                "center_coord": coordinates[(segment_start_idx + i + 1) // 2],
+                "distance": current_distance,
+                "eta": eta.isoformat(),
+                "coordinates": coordinates[segment_start_idx:i + 2]
+            })
+            current_distance = 0
+            segment_start_idx = i + 1
+    return segments
+
+
+def wandering_route(count, seed, step_degrees=0.004):
+    """A [lon, lat] polyline heading roughly north-east from Paris with jittered steps"""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(step_degrees, step_degrees / 2, size=(count - 1, 2))
+    coords = np.vstack(([2.35, 48.85], [2.35, 48.85] + np.cumsum(steps, axis=0)))
+    return [[round(lon, 6), round(lat, 6)] for lon, lat in coords.tolist()]
+
+
+def with_repeated_points(route):
+    """Duplicate every fifth vertex, and the first and last, as OSRM/ORS do at waypoints"""
+    repeated = [route[0]]
+    for index, point in enumerate(route):
+        repeated.append(point)
+        if index % 5 == 0:
+            repeated.append(list(point))
+    return repeated + [list(route[-1])]
+
+
+ROUTES = {
+    "short": (wandering_route(6, seed=1), 420.0),
+    "long": (wandering_route(3000, seed=2), 4 * 3600.0),
+    "repeated_points": (with_repeated_points(wandering_route(400, seed=3)), 3600.0),
+    "zero_duration": (wandering_route(200, seed=4), 0.0),
+    # A single segment that covers no distance in no time
+    "stationary": ([[2.35, 48.85]] * 3, 0.0)
+}
+
+
+@pytest.mark.parametrize("name", ROUTES)
+def test_to_dicts_matches_the_per_vertex_loop(name):
+    coordinates, duration = ROUTES[name]
+    expected = baseline_segment_route(coordinates, duration, 5000, DEPARTURE)
+    actual = RouteSegmenter.segment_table(coordinates, duration, 5000, DEPARTURE).to_dicts()
+
+    assert len(actual) == len(expected)
+    for segment, reference in zip(actual, expected):
+        assert segment["id"] == reference["id"]
+        assert segment["start_coord"] == reference["start_coord"]
+        assert segment["end_coord"] == reference["end_coord"]
+        assert segment["center_coord"] == reference["center_coord"]
+        assert coordinates[segment["start_idx"]:segment["end_idx"] + 1] == reference["coordinates"]
+        # Cumulative sums differ from the running total only in the last bits
+        assert math.isclose(segment["distance"], reference["distance"], rel_tol=1e-9, abs_tol=1e-6)
+        eta_gap = datetime.fromisoformat(segment["eta"]) - datetime.fromisoformat(reference["eta"])
+        assert abs(eta_gap.total_seconds()) <= 1e-3
+
+
+def test_segment_route_of_a_degenerate_route_is_empty():
+    assert RouteSegmenter.segment_route([], 60.0, departure_time=DEPARTURE) == []
+    assert RouteSegmenter.segment_route([[2.35, 48.85]], 60.0, departure_time=DEPARTURE) == []
@@ -0,0 +1,76 @@
+import numpy as np
+
+from app.ml.severity_score import SeverityScorer
+
+EDGE_TEMPERATURES = [-40.0, -0.01, 0.0, 15.0, 35.0, 35.01, 50.0]
+EDGE_PRECIPITATION = [0.0, 0.005, 0.125, 9.999, 10.0, 10.5, 250.0]
+EDGE_WINDSPEED = [0.0, 0.125, 12.345, 49.99, 50.0, 120.0]
+# Every WMO code, plus codes neither table knows
+EDGE_WEATHERCODES = [float(code) for code in range(100)] + [-1.0, 2.5, 100.0, 999.0]
+EDGE_DISTANCES = [0.0, 1.0, 999.5, 5000.0, 5000.01, 1e6]
+
+
+def assert_batch_matches_scalar(temperature, precipitation, windspeed, weathercode, distance):
+    batch = SeverityScorer.calculate_risk_score_batch(temperature, precipitation, windspeed, weathercode, distance)
+    for index in range(len(temperature)):
+        weather = {
+            "temperature": float(temperature[index]),
+            "precipitation": float(precipitation[index]),
+            "windspeed": float(windspeed[index]),
+            "weathercode": float(weathercode[index])
+        }
+        expected = SeverityScorer.calculate_risk_score(weather, float(distance[index]))
+        context = (weather, distance[index])
+
+        assert not batch["missing"][index]
+        assert batch["risk_level"][index] == expected["risk_level"], context
+        assert batch["severity_score"][index].item() == expected["severity_score"], context
+        assert batch["description"][index] == SeverityScorer.get_weather_description(weather["weathercode"]), context
+        for name, value in expected["factors"].items():
+            actual = batch["factors"][name][index].item()
+            assert actual == value, (name, context)
+        # Always integral in the scalar path, so the JSON must not turn 30 into 30.0
+        for name in ("temperature", "weather_condition"):
+            assert isinstance(batch["factors"][name][index].item(), int), (name, context)
+
+
+def test_batch_matches_scalar_on_edge_cases():
+    grid = np.array(np.meshgrid(EDGE_TEMPERATURES, EDGE_PRECIPITATION, EDGE_WINDSPEED,
+                                EDGE_DISTANCES[::2], indexing="ij")).reshape(4, -1)
+    codes = np.resize(EDGE_WEATHERCODES, grid.shape[1])
+    assert_batch_matches_scalar(grid[0], grid[1], grid[2], codes, grid[3])
+
+    count = len(EDGE_WEATHERCODES) * len(EDGE_DISTANCES)
+    assert_batch_matches_scalar(np.full(count, 20.0), np.full(count, 1.0), np.full(count, 5.0),
+                                np.repeat(EDGE_WEATHERCODES, len(EDGE_DISTANCES)),
+                                np.tile(EDGE_DISTANCES, len(EDGE_WEATHERCODES)))
+
+
+def test_batch_matches_scalar_on_random_conditions():
+    rng = np.random.default_rng(20240601)
+    count = 5000
+
+    def readings(values):
+        # Forecast values come with a few decimals, which is where rounding ties turn up
+        scale = 10.0 ** rng.integers(0, 4, count)
+        return np.round(values * scale) / scale
+
+    assert_batch_matches_scalar(
+        readings(rng.uniform(-30, 45, count)),
+        readings(rng.exponential(2.0, count)),
+        readings(rng.uniform(0, 80, count)),
+        rng.choice(EDGE_WEATHERCODES, count),
+        readings(rng.uniform(0, 8000, count))
+    )
+
+
+def test_missing_weather_scores_like_an_empty_dict():
+    expected = SeverityScorer.calculate_risk_score({}, 1000.0)
+    batch = SeverityScorer.calculate_risk_score_batch(
+        np.array([np.nan, 10.0]), np.array([1.0, np.nan]), np.array([np.nan, 3.0]),
+        np.array([3.0, np.nan]), np.array([1000.0, 1000.0])
+    )
+
+    assert batch["missing"].tolist() == [True, True]
+    assert batch["risk_level"].tolist() == [expected["risk_level"]] * 2
+    assert batch["severity_score"].tolist() == [expected["severity_score"]] * 2
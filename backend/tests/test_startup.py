@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("prophet", "pandas", "sklearn")
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app.main
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [name for name in %r if name in sys.modules],
+    "routers": app.main.ENABLED_ROUTERS
+}))
+""" % (HEAVY_MODULES,)
+
+
+def import_app(**env) -> dict:
+    """Import app.main in a fresh interpreter and report what it cost"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120,
+        env={**os.environ, "RESPONSE_CACHE": "0", "PREFETCH": "0", "WARMUP": "0", **env}
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("routers", ["", "geocoding"])
+def test_import_leaves_the_ml_stack_unloaded(routers):
+    probe = import_app(API_ROUTERS=routers)
+
+    assert probe["loaded"] == []
+    # Generous bounds: a regression to importing Prophet at startup costs several seconds and ~100 MB more
+    assert probe["seconds"] < 10
+    assert probe["rss_mb"] < 400
+
+
+def test_empty_api_routers_serves_every_group():
+    assert import_app(API_ROUTERS="")["routers"] == ["route", "weather", "recommendation", "geocoding"]
+    assert import_app(API_ROUTERS="geocoding")["routers"] == ["geocoding"]
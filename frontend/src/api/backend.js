@@ -7,12 +7,33 @@ const api = axios.create({ baseURL: API_BASE_URL, timeout: 9000000000000000 });
 
 const cache = new Map();
 
+// ETag and body of the last response per request, so repeats can be revalidated
+// with If-None-Match and answered by the backend with an empty 304
+const validators = new Map();
+const MAX_VALIDATORS = 100;
+
 const request = async ({ method = 'get', url, data = null, params = null, cacheKey = null }) => {
   if (cacheKey && cache.has(cacheKey)) return cache.get(cacheKey);
+  const validatorKey = `${method} ${url} ${JSON.stringify(data ?? params)}`;
+  const previous = validators.get(validatorKey);
   try {
-    const res = await api.request({ method, url, data, params });
-    if (cacheKey) cache.set(cacheKey, res.data);
-    return res.data;
+    const res = await api.request({
+      method,
+      url,
+      data,
+      params,
+      headers: previous ? { 'If-None-Match': previous.etag } : undefined,
+      validateStatus: (status) => (status >= 200 && status < 300) || (status === 304 && !!previous)
+    });
+    const body = res.status === 304 ? previous.data : res.data;
+    const etag = res.headers?.etag;
+    if (etag) {
+      validators.delete(validatorKey);
+      validators.set(validatorKey, { etag, data: body });
+      if (validators.size > MAX_VALIDATORS) validators.delete(validators.keys().next().value);
+    }
+    if (cacheKey) cache.set(cacheKey, body);
+    return body;
   } catch (e) {
     // normalize error with more context for debugging
     const status = e?.response?.status;
@@ -29,6 +50,51 @@ const request = async ({ method = 'get', url, data = null, params = null, cacheK
 export const planRoute = (startLat, startLon, endLat, endLon, departureTime = null) =>
   request({ method: 'post', url: '/route/plan', data: { start_lat: startLat, start_lon: startLon, end_lat: endLat, end_lon: endLon, departure_time: departureTime } });
 
+// Streaming variant of planRoute: onEvent receives { event, data } for the route geometry,
+// each segment in route order, and the final summary. Resolves with the assembled plan.
+export const planRouteStream = async (startLat, startLon, endLat, endLon, departureTime = null, onEvent = () => {}) => {
+  const url = '/route/plan/stream';
+  const res = await fetch(`${API_BASE_URL}${url}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'application/x-ndjson' },
+    body: JSON.stringify({ start_lat: startLat, start_lon: startLon, end_lat: endLat, end_lon: endLon, departure_time: departureTime })
+  });
+  if (!res.ok) {
+    const respData = await res.json().catch(() => null);
+    throw new Error(`POST ${url} failed with status ${res.status}: ${JSON.stringify(respData?.detail || respData)}`);
+  }
+
+  const plan = { route: null, segments: [], overall_risk: null, predictor: null };
+  const handle = (line) => {
+    if (!line.trim()) return;
+    const message = JSON.parse(line);
+    if (message.event === 'error') throw new Error(`POST ${url} failed while streaming: ${message.data.detail}`);
+    if (message.event === 'route') {
+      plan.route = message.data.route;
+      plan.predictor = message.data.predictor;
+    } else if (message.event === 'segment') {
+      plan.segments = [...plan.segments, message.data];
+    } else if (message.event === 'summary') {
+      plan.overall_risk = message.data.overall_risk;
+    }
+    onEvent(message, { ...plan });
+  };
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split('\n');
+    buffered = lines.pop();
+    lines.forEach(handle);
+  }
+  handle(buffered);
+  return plan;
+};
+
 export const getWeatherForecast = (latitude, longitude, startTime) =>
   request({ method: 'post', url: '/weather/forecast', data: { latitude, longitude, start_time: startTime } });
 
@@ -86,7 +86,10 @@ function MapView({ routeData }) {
             )}
             
             {routeData.segments && routeData.segments.map((segment) => {
-              const coords = segment.coordinates.map(c => [c[1], c[0]]);
+              // Segments reference the shared route geometry by vertex index
+              const coords = routeData.route.coordinates
+                .slice(segment.start_idx, segment.end_idx + 1)
+                .map(c => [c[1], c[0]]);
               const color = getSegmentColor(segment.risk.risk_level);
               
               return (
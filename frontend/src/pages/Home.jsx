@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
-import { planRoute, getRecommendedDeparture, searchLocations } from '../api/backend';
+import { planRouteStream, getRecommendedDeparture, searchLocations } from '../api/backend';
 import MapView from '../components/MapView';
 import AlertsPanel from '../components/AlertsPanel';
 import Timeline from '../components/Timeline';
@@ -128,7 +128,12 @@ function Home() {
     }
     setLoading(true);
     try {
-      const data = await planRoute(startCoords.lat, startCoords.lon, endCoords.lat, endCoords.lon, departureTime || null);
+      // Show the route as soon as it arrives and fill in segments as they are scored
+      const data = await planRouteStream(startCoords.lat, startCoords.lon, endCoords.lat, endCoords.lon, departureTime || null,
+        (message, plan) => {
+          if (message.event === 'route') setLoading(false);
+          setRouteData(plan);
+        });
       setRouteData(data);
       setSuccess('Route planned successfully');
     } catch (err) {